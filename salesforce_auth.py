@@ -0,0 +1,173 @@
+import time
+import logging
+import threading
+from simple_salesforce import Salesforce
+from salesforce_http import create_http_session
+from salesforce_metrics import AUTH_SECONDS, AUTH_INVALIDATIONS, SALESFORCE_AUTH_RETRIES, count_salesforce_call
+
+logger = logging.getLogger(__name__)
+
+def is_auth_failure(e):
+    """Whether a Salesforce call failed because the access token was rejected"""
+    # simple_salesforce raises SalesforceExpiredSession; raw requests calls raise HTTPError
+    if type(e).__name__ == 'SalesforceExpiredSession':
+        return True
+    status = getattr(e, 'status', None)
+    if status is None:
+        status = getattr(getattr(e, 'response', None), 'status_code', None)
+    return status == 401
+
+class SalesforceTokenManager:
+    """Caches a JWT bearer access token and its instance_url, refreshing ahead of expiry"""
+    def __init__(self, config):
+        self.config = config
+        self.auth_url = config.get('auth_url', 'https://login.salesforce.com')
+        # The JWT bearer response carries no expiry; sessions last as long as the org's session timeout
+        self.lifetime = config.get('token_lifetime_minutes', 110) * 60
+        self.refresh_ahead = config.get('token_refresh_ahead_seconds', 300)
+        self.expiry_margin = config.get('token_expiry_margin_seconds', 60)
+        self.background_refresh = config.get('token_background_refresh', True)
+        self.token = None
+        self.lock = threading.Lock()
+        self.refresh_timer = None
+        # Token requests go to the login host, so they keep their own pooled connection
+        self.http_session = create_http_session(config)
+
+    def _request_token(self):
+        """Get Salesforce access token using JWT Bearer flow"""
+        import jwt
+
+        payload = {
+            'iss': self.config['client_id'],
+            'sub': self.config['username'],
+            'aud': self.auth_url,
+            'exp': int(time.time()) + 3600
+        }
+
+        token = jwt.encode(payload, self.config['private_key'], algorithm='RS256')
+
+        data = {
+            'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer',
+            'assertion': token
+        }
+
+        response = self.http_session.post(f"{self.auth_url}/services/oauth2/token", data=data)
+
+        if response.status_code != 200:
+            raise Exception(f'Authentication failed: {response.status_code} - {response.text}')
+
+        return response.json()
+
+    def _refresh(self):
+        """Fetch a new access token; the caller holds the lock"""
+        started = time.perf_counter()
+        try:
+            auth_response = self._request_token()
+        except Exception:
+            AUTH_SECONDS.observe(time.perf_counter() - started, outcome='error')
+            raise
+        AUTH_SECONDS.observe(time.perf_counter() - started, outcome='success')
+        self.token = {
+            'access_token': auth_response['access_token'],
+            'instance_url': auth_response['instance_url'],
+            'expires_at': time.time() + self.lifetime
+        }
+        logger.info(f"Obtained Salesforce access token for {self.token['instance_url']}, "
+                    f"reusing it for up to {self.lifetime // 60} minutes")
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        if not self.background_refresh:
+            return
+        if self.refresh_timer:
+            self.refresh_timer.cancel()
+        delay = max(self.token['expires_at'] - self.refresh_ahead - time.time(), 0)
+        self.refresh_timer = threading.Timer(delay, self._background_refresh)
+        self.refresh_timer.daemon = True
+        self.refresh_timer.start()
+
+    def _background_refresh(self):
+        try:
+            with self.lock:
+                self._refresh()
+        except Exception as e:
+            # The current token stays in use; get_token retries once it is near expiry
+            logger.warning(f"Background Salesforce token refresh failed: {e}")
+
+    def get_token(self):
+        """Return the cached token, authenticating only when there is none or it is about to expire"""
+        with self.lock:
+            if self.token is None or time.time() >= self.token['expires_at'] - self.expiry_margin:
+                self._refresh()
+            return self.token
+
+    def invalidate(self, access_token):
+        """Forget access_token after Salesforce rejected it, unless it was already replaced"""
+        with self.lock:
+            if self.token and self.token['access_token'] == access_token:
+                self.token = None
+                AUTH_INVALIDATIONS.inc()
+
+    def close(self):
+        """Stop the background refresh"""
+        if self.refresh_timer:
+            self.refresh_timer.cancel()
+            self.refresh_timer = None
+
+# One token manager per connected app user, shared by every ingester in the process
+_TOKEN_MANAGERS = {}
+_TOKEN_MANAGERS_LOCK = threading.Lock()
+
+def get_token_manager(config):
+    """Return the process-wide token manager for the credentials in config"""
+    key = (config.get('auth_url', 'https://login.salesforce.com'), config['client_id'], config['username'])
+    with _TOKEN_MANAGERS_LOCK:
+        manager = _TOKEN_MANAGERS.get(key)
+        if manager is None:
+            manager = SalesforceTokenManager(config)
+            _TOKEN_MANAGERS[key] = manager
+        return manager
+
+class SalesforceClient:
+    """Salesforce connection shared by the ingesters: the process-wide access token and a pooled HTTP session
+
+    Ingesters call init_salesforce_client from __init__ and set metrics_ingester to label their calls.
+    """
+    metrics_ingester = None
+
+    def init_salesforce_client(self, config):
+        self.sf = None
+        self.sf_lock = threading.Lock()
+        self.token_manager = get_token_manager(config)
+        self.http_session = create_http_session(config)
+
+    def connect_to_salesforce(self):
+        """Connect to Salesforce with the cached access token, reusing the connection while the token is unchanged"""
+        try:
+            with self.sf_lock:
+                token = self.token_manager.get_token()
+                if self.sf is None or self.sf.session_id != token['access_token']:
+                    self.sf = Salesforce(instance_url=token['instance_url'], session_id=token['access_token'],
+                                         session=self.http_session)
+                    logger.info(f"Connected to Salesforce instance: {token['instance_url']}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error connecting to Salesforce: {e}")
+            return False
+
+    def call_salesforce(self, call):
+        """Run a Salesforce call, re-authenticating and retrying once if the access token was rejected"""
+        session_id = self.sf.session_id
+        try:
+            return count_salesforce_call(call, self.metrics_ingester)
+        except Exception as e:
+            if not is_auth_failure(e):
+                raise
+            logger.info("Salesforce rejected the access token, re-authenticating")
+            SALESFORCE_AUTH_RETRIES.inc(ingester=self.metrics_ingester)
+            # Another worker may already have replaced the token; only drop the one that failed
+            self.token_manager.invalidate(session_id)
+            if not self.connect_to_salesforce():
+                raise
+            return count_salesforce_call(call, self.metrics_ingester)
@@ -0,0 +1,386 @@
+import json
+import asyncio
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from elasticsearch.helpers import expand_action
+
+logger = logging.getLogger(__name__)
+
+# Cap on the number of item errors kept in the stats returned by BulkIndexer.index
+MAX_REPORTED_ERRORS = 100
+
+class JsonSerializer:
+    """Standard library JSON encoding for bulk bodies"""
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+class OrjsonSerializer:
+    """orjson encoding for bulk bodies, producing UTF-8 bytes directly"""
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._dumps = orjson.dumps
+
+    def dumps(self, obj):
+        return self._dumps(obj, default=str)
+
+def create_serializer(name='auto'):
+    """Return the bulk body serializer called name; 'auto' prefers orjson when installed"""
+    if name in ('auto', 'orjson'):
+        try:
+            return OrjsonSerializer()
+        except ImportError:
+            if name == 'orjson':
+                raise
+            logger.debug("orjson not installed, using the standard library json serializer")
+    if name in ('auto', 'json'):
+        return JsonSerializer()
+    raise ValueError(f"Unknown bulk_serializer: {name}")
+
+# Action keys the pre-encoded header path understands; anything else goes through expand_action
+_FAST_ACTION_KEYS = frozenset(('_index', '_id', '_source', '_op_type'))
+
+def is_rejection(status, error_type=None):
+    """Whether a bulk item or request was pushed back by a full write thread pool"""
+    return status == 429 or error_type == 'es_rejected_execution_exception'
+
+def is_retryable_exception(e):
+    """Whether a failed bulk request is worth sending again as a whole"""
+    status = getattr(e, 'status_code', None)
+    if isinstance(status, int):
+        return is_rejection(status) or status in (502, 503, 504)
+    # Connection errors and timeouts carry no HTTP status
+    name = type(e).__name__
+    return 'Connection' in name or 'Timeout' in name
+
+class AdaptiveBulkController:
+    """Tunes chunk size and bulk concurrency from observed rejections and latency"""
+    def __init__(self, config):
+        self.min_chunk_size = config.get('bulk_min_chunk_size', 50)
+        self.max_chunk_size = config.get('bulk_max_chunk_size', 5000)
+        self.max_concurrency = config.get('bulk_max_thread_count', max(config.get('bulk_thread_count', 1), 4))
+        self.target_latency = config.get('bulk_target_latency_seconds', 5.0)
+        self.grow_after = config.get('bulk_grow_after_chunks', 5)
+        self.chunk_size = min(max(config.get('bulk_chunk_size', 500), self.min_chunk_size), self.max_chunk_size)
+        self.concurrency = min(max(config.get('bulk_thread_count', 1), 1), self.max_concurrency)
+        self.healthy_chunks = 0
+        self.lock = threading.Lock()
+
+    def record(self, docs, latency, rejected):
+        """Feed back the outcome of one bulk request"""
+        with self.lock:
+            if rejected:
+                # Multiplicative decrease on backpressure
+                self.healthy_chunks = 0
+                self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+                self.concurrency = max(1, self.concurrency - 1)
+                logger.info(f"Bulk rejections observed, backing off to chunk size {self.chunk_size} x {self.concurrency} connections")
+            elif latency > self.target_latency:
+                self.healthy_chunks = 0
+                self.chunk_size = max(self.min_chunk_size, int(self.chunk_size * 0.75))
+            else:
+                # Additive increase once enough requests went through cleanly
+                self.healthy_chunks += 1
+                if self.healthy_chunks >= self.grow_after:
+                    self.healthy_chunks = 0
+                    self.chunk_size = min(self.max_chunk_size, int(self.chunk_size * 1.25) + 1)
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+
+class BulkIndexer:
+    """Streams bulk actions to Elasticsearch in size-bounded chunks over several connections"""
+    def __init__(self, es, config):
+        self.es = es
+        self.chunk_size = config.get('bulk_chunk_size', 500)
+        self.max_chunk_bytes = config.get('bulk_max_chunk_bytes', 10 * 1024 * 1024)
+        self.thread_count = config.get('bulk_thread_count', 1)
+        self.request_timeout = config.get('bulk_request_timeout', 60)
+        self.adaptive = config.get('bulk_adaptive', False)
+        self.controller = AdaptiveBulkController(config) if self.adaptive else None
+        self.max_retries = config.get('bulk_max_retries', 5 if self.adaptive else 0)
+        self.initial_backoff = config.get('bulk_initial_backoff', 1.0)
+        self.max_backoff = config.get('bulk_max_backoff', 60.0)
+        self.serializer = create_serializer(config.get('bulk_serializer', 'auto'))
+        self.header_prefixes = {}
+
+    def _bulk_client(self):
+        """Return a client carrying the bulk request timeout"""
+        # elasticsearch-py 8 moved per-request settings to .options()
+        if hasattr(self.es, 'options'):
+            return self.es.options(request_timeout=self.request_timeout), {}
+        return self.es, {'request_timeout': self.request_timeout}
+
+    def _encode_source(self, source):
+        """Encode a document source, passing pre-encoded bytes straight through"""
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return bytes(source)
+        # Sources that know how to encode themselves (e.g. rows sharing file metadata)
+        encode_source = getattr(source, 'encode_source', None)
+        if encode_source is not None:
+            return encode_source(self.serializer)
+        return self.serializer.dumps(source)
+
+    def _header_prefix(self, op_type, index):
+        """Encoded action line up to the _id, reused for every document of an index"""
+        key = (op_type, index)
+        prefix = self.header_prefixes.get(key)
+        if prefix is None:
+            prefix = b'{"' + op_type.encode('utf-8') + b'":{"_index":' + self.serializer.dumps(index)
+            self.header_prefixes[key] = prefix
+        return prefix
+
+    def _serialize_action(self, action):
+        """Encode one action as NDJSON lines"""
+        op_type = action.get('_op_type', 'index')
+        if op_type in ('index', 'create') and '_index' in action and '_source' in action and action.keys() <= _FAST_ACTION_KEYS:
+            header = self._header_prefix(op_type, action['_index'])
+            if action.get('_id') is not None:
+                header += b',"_id":' + self.serializer.dumps(action['_id'])
+            return [header + b'}}', self._encode_source(action['_source'])]
+        
+        header, source = expand_action(action)
+        lines = [self.serializer.dumps(header)]
+        if source is not None:
+            lines.append(self._encode_source(source))
+        return lines
+
+    def _chunk_actions(self, actions):
+        """Group actions into chunks bounded by doc count and body size"""
+        chunk = []
+        chunk_bytes = 0
+        
+        for action in actions:
+            lines = self._serialize_action(action)
+            action_bytes = sum(len(line) + 1 for line in lines)
+            
+            chunk_size = self.controller.chunk_size if self.controller else self.chunk_size
+            if chunk and (len(chunk) >= chunk_size or chunk_bytes + action_bytes > self.max_chunk_bytes):
+                yield chunk
+                chunk = []
+                chunk_bytes = 0
+            
+            chunk.append(lines)
+            chunk_bytes += action_bytes
+        
+        if chunk:
+            yield chunk
+
+    def _send_chunk(self, chunk):
+        """Send one chunk with the bulk API, returning its stats and the rejected items"""
+        body, stats = self._prepare_chunk(chunk)
+        
+        client, kwargs = self._bulk_client()
+        started = time.time()
+        try:
+            response = client.bulk(body=body, **kwargs)
+        except Exception as e:
+            return self._request_failed(chunk, stats, e, started)
+        stats['latency'] = time.time() - started
+        return self._read_response(chunk, response, stats)
+
+    def _prepare_chunk(self, chunk):
+        """Join a chunk into one NDJSON body and start its stats"""
+        body = b''.join(line + b'\n' for lines in chunk for line in lines)
+        stats = {'docs': len(chunk), 'bytes': len(body), 'success': 0, 'failed': 0, 'rejected': 0, 'errors': []}
+        return body, stats
+
+    def _request_failed(self, chunk, stats, e, started):
+        """Account for a bulk request that raised; retryable failures send the whole chunk again"""
+        stats['latency'] = time.time() - started
+        stats['failed'] = len(chunk)
+        status = getattr(e, 'status_code', None)
+        stats['errors'].append({'status': status, 'type': type(e).__name__, 'reason': str(e)})
+        if is_retryable_exception(e):
+            stats['rejected'] = len(chunk)
+            logger.warning(f"Bulk request of {len(chunk)} actions was rejected: {e}")
+            return stats, list(chunk)
+        logger.error(f"Bulk request of {len(chunk)} actions failed: {e}")
+        return stats, []
+
+    def _read_response(self, chunk, response, stats):
+        """Count per-item results of a bulk response, returning the rejected items"""
+        retry_items = []
+        for lines, item in zip(chunk, response['items']):
+            op_result = next(iter(item.values()))
+            status = op_result.get('status', 500)
+            if 200 <= status < 300:
+                stats['success'] += 1
+                continue
+            
+            error = op_result.get('error') or {}
+            error_type = error.get('type') if isinstance(error, dict) else None
+            if is_rejection(status, error_type):
+                stats['rejected'] += 1
+                retry_items.append(lines)
+            stats['failed'] += 1
+            if len(stats['errors']) < MAX_REPORTED_ERRORS:
+                stats['errors'].append({
+                    'index': op_result.get('_index'),
+                    'status': status,
+                    'type': error_type,
+                    'reason': error.get('reason') if isinstance(error, dict) else str(error)
+                })
+        
+        return stats, retry_items
+
+    def _index_chunk(self, chunk):
+        """Send a chunk, retrying only rejected items with exponential backoff"""
+        stats, retry_items = self._send_chunk(chunk)
+        self._record(stats)
+        stats['retries'] = 0
+        
+        attempt = 0
+        while retry_items and attempt < self.max_retries:
+            backoff = self._backoff(attempt, retry_items)
+            attempt += 1
+            time.sleep(backoff)
+            
+            retry_stats, retry_items = self._send_chunk(retry_items)
+            self._record(retry_stats)
+            self._merge_retry(stats, retry_stats)
+        
+        return stats
+
+    def _record(self, stats):
+        if self.controller:
+            self.controller.record(stats['docs'], stats['latency'], stats['rejected'])
+
+    def _backoff(self, attempt, retry_items):
+        backoff = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+        logger.info(f"Retrying {len(retry_items)} rejected bulk items in {backoff:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+        return backoff
+
+    @staticmethod
+    def _merge_retry(stats, retry_stats):
+        # Items retried this round are no longer counted as failed unless they failed again
+        stats['failed'] -= retry_stats['docs'] - retry_stats['failed']
+        stats['success'] += retry_stats['success']
+        stats['latency'] += retry_stats['latency']
+        stats['retries'] += retry_stats['docs']
+        stats['errors'] = retry_stats['errors'] + [error for error in stats['errors'] if not is_rejection(error.get('status'), error.get('type'))]
+
+    def new_totals(self):
+        """Empty index() statistics and the function adding one chunk's stats to them"""
+        totals = {'success': 0, 'failed': 0, 'rejected': 0, 'retries': 0, 'chunks': [], 'errors': []}
+        
+        def collect(chunk_stats):
+            totals['success'] += chunk_stats['success']
+            totals['failed'] += chunk_stats['failed']
+            totals['rejected'] += chunk_stats['rejected']
+            totals['retries'] += chunk_stats['retries']
+            if len(totals['errors']) < MAX_REPORTED_ERRORS:
+                totals['errors'].extend(chunk_stats.pop('errors')[:MAX_REPORTED_ERRORS - len(totals['errors'])])
+            else:
+                chunk_stats.pop('errors')
+            totals['chunks'].append(chunk_stats)
+        
+        return totals, collect
+
+    def encode_chunks(self, actions):
+        """Encode actions into bulk chunks ahead of sending them, yielding (chunk, body bytes)"""
+        for chunk in self._chunk_actions(actions):
+            yield chunk, sum(len(line) + 1 for lines in chunk for line in lines)
+
+    def index_chunk(self, chunk):
+        """Send one chunk from encode_chunks with the same retries as index()"""
+        return self._index_chunk(chunk)
+
+    def index(self, actions):
+        """Index an iterable of bulk actions and return per-chunk statistics"""
+        totals, collect = self.new_totals()
+        
+        if self.thread_count <= 1 and not self.controller:
+            for chunk in self._chunk_actions(actions):
+                collect(self._index_chunk(chunk))
+            return totals
+        
+        max_workers = self.controller.max_concurrency if self.controller else self.thread_count
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bulk') as executor:
+            pending = set()
+            for chunk in self._chunk_actions(actions):
+                # Keep at most two chunks per connection in flight, like parallel_bulk's queue,
+                # or exactly the current adaptive concurrency
+                max_pending = self.controller.concurrency if self.controller else self.thread_count * 2
+                while len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future.result())
+                pending.add(executor.submit(self._index_chunk, chunk))
+            
+            for future in pending:
+                collect(future.result())
+        
+        return totals
+
+class AsyncBulkIndexer(BulkIndexer):
+    """BulkIndexer for an AsyncElasticsearch client, keeping bulk_thread_count requests in flight as tasks"""
+    async def _send_chunk_async(self, chunk):
+        body, stats = self._prepare_chunk(chunk)
+        
+        client, kwargs = self._bulk_client()
+        started = time.time()
+        try:
+            response = await client.bulk(body=body, **kwargs)
+        except Exception as e:
+            return self._request_failed(chunk, stats, e, started)
+        stats['latency'] = time.time() - started
+        return self._read_response(chunk, response, stats)
+
+    async def _index_chunk_async(self, chunk):
+        """Send a chunk, retrying only rejected items with exponential backoff"""
+        stats, retry_items = await self._send_chunk_async(chunk)
+        self._record(stats)
+        stats['retries'] = 0
+        
+        attempt = 0
+        while retry_items and attempt < self.max_retries:
+            backoff = self._backoff(attempt, retry_items)
+            attempt += 1
+            await asyncio.sleep(backoff)
+            
+            retry_stats, retry_items = await self._send_chunk_async(retry_items)
+            self._record(retry_stats)
+            self._merge_retry(stats, retry_stats)
+        
+        return stats
+
+    async def index(self, actions):
+        """Index an iterable of bulk actions and return per-chunk statistics"""
+        totals, collect = self.new_totals()
+        pending = set()
+        
+        try:
+            # Serializing actions is CPU work, so each chunk is encoded on a worker thread instead of the event loop
+            chunks = self._chunk_actions(actions)
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                max_pending = self.controller.concurrency if self.controller else self.thread_count
+                while len(pending) >= max(max_pending, 1):
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        collect(task.result())
+                pending.add(asyncio.ensure_future(self._index_chunk_async(chunk)))
+            
+            for task in asyncio.as_completed(pending):
+                collect(await task)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+        
+        return totals
+
+def summarize_bulk_stats(stats):
+    """Format chunk latency and rejection counts for logging"""
+    chunks = stats['chunks']
+    if not chunks:
+        return "0 chunks"
+    latencies = [chunk['latency'] for chunk in chunks]
+    return (f"{len(chunks)} chunks, avg latency {sum(latencies) / len(latencies) * 1000:.0f} ms, "
+            f"max {max(latencies) * 1000:.0f} ms, {stats['rejected']} rejected, {stats['retries']} retried")
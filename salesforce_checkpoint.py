@@ -0,0 +1,165 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+def parse_salesforce_datetime(value):
+    """Parse a Salesforce/Elasticsearch datetime string into an aware UTC datetime"""
+    try:
+        dt = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z')
+    except ValueError:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+def format_soql_datetime(dt):
+    """Format a datetime as a SOQL literal with millisecond precision"""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.') + f"{dt.microsecond // 1000:03d}Z"
+
+def eventlog_file_version(log_file_length, sequence):
+    """Version of an EventLogFile payload; a changed length or sequence means Salesforce republished it"""
+    # Salesforce returns both as floats; compare them as integers
+    return (int(float(log_file_length or 0)), int(float(sequence or 0)))
+
+def keyset_clause(field, value, record_id, after=True):
+    """SOQL condition for the rows after a (field, Id) keyset position, or at and before it"""
+    if not isinstance(value, datetime):
+        value = parse_salesforce_datetime(value)
+    literal = format_soql_datetime(value)
+    if after:
+        return f"({field} > {literal} OR ({field} = {literal} AND Id > '{record_id}'))"
+    return f"({field} < {literal} OR ({field} = {literal} AND Id <= '{record_id}'))"
+
+class KeysetFrontier:
+    """(sort key, Id) high-water mark that only moves over a contiguous prefix of settled items
+
+    Items are tracked in the order a keyset query returned them and settled as they finish, in any
+    order; the position never passes an item that is still in flight, so a restart re-queries it.
+    """
+    def __init__(self, position=None):
+        self.position = position
+        self.pending = OrderedDict()
+        self.settled = set()
+
+    def track(self, key, item_id):
+        """Add an item returned by the keyset query, in query order"""
+        self.pending[item_id] = (key, item_id)
+
+    def tracks(self, item_id):
+        return item_id in self.pending
+
+    def settle(self, item_id):
+        """Mark an item finished; True if the position moved"""
+        if item_id not in self.pending:
+            return False
+        self.settled.add(item_id)
+        moved = False
+        while self.pending:
+            first_id, first = next(iter(self.pending.items()))
+            if first_id not in self.settled:
+                break
+            self.pending.popitem(last=False)
+            self.settled.discard(first_id)
+            self.position = first
+            moved = True
+        return moved
+
+    def reset(self):
+        """Forget unsettled items so the next cycle queries them again from the position"""
+        self.pending.clear()
+        self.settled.clear()
+
+class FileCheckpointStore:
+    """Keeps ingestion checkpoints in a small local JSON file"""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def load(self, name):
+        """Return the saved state for name, or None"""
+        with self.lock:
+            return self._read().get(name)
+
+    def save(self, name, state):
+        """Atomically replace the saved state for name"""
+        with self.lock:
+            checkpoints = self._read()
+            checkpoints[name] = state
+            
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.checkpoint-')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(checkpoints, f)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+
+class ElasticsearchCheckpointStore:
+    """Keeps ingestion checkpoints as documents in a dedicated Elasticsearch index"""
+    def __init__(self, es, index):
+        self.es = es
+        self.index = index
+        self.index_ready = False
+
+    def _ensure_index(self):
+        if self.index_ready:
+            return
+        if not self.es.indices.exists(index=self.index):
+            # Checkpoint state is opaque to Elasticsearch; don't map its fields
+            self.es.indices.create(index=self.index, body={
+                "mappings": {
+                    "properties": {
+                        "state": {"type": "object", "enabled": False},
+                        "updated_at": {"type": "date"}
+                    }
+                }
+            })
+            logger.info(f"Created checkpoint index {self.index}")
+        self.index_ready = True
+
+    def load(self, name):
+        """Return the saved state for name, or None"""
+        try:
+            response = self.es.get(index=self.index, id=name)
+            return response['_source']['state']
+        except Exception as e:
+            if getattr(e, 'status_code', None) == 404 or "not_found" in str(e) or "NotFoundError" in type(e).__name__:
+                return None
+            raise
+
+    def save(self, name, state):
+        """Replace the saved state for name"""
+        self._ensure_index()
+        self.es.index(index=self.index, id=name, body={
+            'state': state,
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        })
+
+def create_checkpoint_store(config, es):
+    """Build the checkpoint store selected by checkpoint_backend, or None to keep searching ES"""
+    backend = config.get('checkpoint_backend')
+    if backend == 'file':
+        return FileCheckpointStore(config.get('checkpoint_path', 'salesforce_checkpoints.json'))
+    if backend == 'elasticsearch':
+        return ElasticsearchCheckpointStore(es, config.get('checkpoint_index', 'salesforce-ingest-checkpoints'))
+    if backend:
+        raise ValueError(f"Unknown checkpoint_backend: {backend}")
+    return None
@@ -0,0 +1,307 @@
+import time
+import asyncio
+import logging
+from collections import Counter
+from salesforce_bulk_indexer import AsyncBulkIndexer
+from salesforce_http import http_timeout
+from salesforce_metrics import (
+    start_metrics_server, observe_sync, SALESFORCE_API_CALLS, SALESFORCE_AUTH_RETRIES, DOWNLOAD_PARSE_SECONDS, BULK_INGEST_SECONDS
+)
+from salesforce_eventlog_ingester import SalesforceEventLogFileIngester, DocumentIdGenerator, DATA_STREAM_REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Queue sentinel telling a stage that no more work is coming
+_DONE = object()
+
+class AsyncInflightByteBudget:
+    """asyncio counterpart of InflightByteBudget: caps the EventLogFile bytes downloaded but not yet indexed"""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.inflight_bytes = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self, nbytes):
+        """Wait until nbytes fit in the budget"""
+        async with self.condition:
+            # A file larger than the whole budget is let through once nothing else is in flight
+            await self.condition.wait_for(lambda: self.inflight_bytes == 0 or self.inflight_bytes + nbytes <= self.max_bytes)
+            self.inflight_bytes += nbytes
+
+    async def release(self, nbytes):
+        """Return nbytes to the budget"""
+        async with self.condition:
+            self.inflight_bytes -= nbytes
+            self.condition.notify_all()
+
+class AsyncEventLogFileIngester(SalesforceEventLogFileIngester):
+    """asyncio EventLogFile ingester: discovery, downloads, parsing and bulk indexing run as tasks joined by bounded queues"""
+    def __init__(self, config):
+        # Whole files are downloaded into memory and parsed from there
+        unsupported = [key for key in ('streaming_mode', 'resumable_downloads', 'staged_pipeline') if config.get(key)]
+        if unsupported:
+            raise ValueError(f"The asyncio engine does not support {', '.join(unsupported)}")
+        super().__init__(config)
+        self.async_es = None
+        self.async_bulk_indexer = None
+        self.http = None
+
+    async def start(self):
+        """Open the async Elasticsearch client and the keep-alive HTTP client for downloads"""
+        import aiohttp
+        from elasticsearch import AsyncElasticsearch
+
+        self.async_es = AsyncElasticsearch([self.config['es_host']])
+        self.async_bulk_indexer = AsyncBulkIndexer(self.async_es, self.config)
+
+        connect_timeout, read_timeout = http_timeout(self.config)
+        self.http = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.config.get('async_download_concurrency', 16)),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        )
+
+    async def stop(self):
+        """Close the async clients, the parse workers and the token refresh"""
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
+        if self.async_es is not None:
+            await self.async_es.close()
+            self.async_es = None
+        self.close()
+
+    async def download_logfile_async(self, eventlog_record):
+        """Download an EventLogFile body, re-authenticating once if the access token was rejected"""
+        for attempt in range(2):
+            sf = self.sf
+            download_url = f"{sf.base_url}sobjects/EventLogFile/{eventlog_record['Id']}/LogFile"
+            headers = {
+                'Authorization': f'Bearer {sf.session_id}',
+                'Accept-Encoding': 'gzip'
+            }
+
+            async with self.http.get(download_url, headers=headers) as response:
+                SALESFORCE_API_CALLS.inc(ingester=self.metrics_ingester, outcome='success' if response.status < 400 else 'error')
+                if response.status == 401 and attempt == 0:
+                    logger.info("Salesforce rejected the access token, re-authenticating")
+                    SALESFORCE_AUTH_RETRIES.inc(ingester=self.metrics_ingester)
+                    self.token_manager.invalidate(sf.session_id)
+                    if await asyncio.to_thread(self.connect_to_salesforce):
+                        continue
+                response.raise_for_status()
+                return await response.read()
+
+    async def download_and_parse_async(self, eventlog_record):
+        """Download (or read from the payload cache), parse and enrich one EventLogFile"""
+        started = time.perf_counter()
+        log_file_id = eventlog_record['Id']
+        logger.info(f"Processing EventLogFile: {log_file_id} ({eventlog_record['EventType']}) from {eventlog_record['LogDate']}")
+
+        payload = None
+        if self.payload_cache:
+            payload = await asyncio.to_thread(self.payload_cache.get, eventlog_record)
+        if payload is None:
+            payload = await self.download_logfile_async(eventlog_record)
+            if self.payload_cache:
+                await asyncio.to_thread(self._cache_payload, eventlog_record, payload)
+
+        # Parsing is CPU-bound: it goes to the parse process pool, or a worker thread without one
+        failures = Counter()
+        parse_pool = self._get_parse_pool()
+        if parse_pool is None:
+            parsed_records = await asyncio.to_thread(self._parse_payload, payload, eventlog_record, failures)
+        else:
+            result = await asyncio.wrap_future(self._submit_parse(parse_pool, payload, eventlog_record))
+            # Reading the worker's batch files back is blocking file I/O
+            parsed_records = await asyncio.to_thread(self._encoded_rows, result, eventlog_record, failures)
+
+        self._log_conversion_failures(log_file_id, failures)
+        logger.info(f"Parsed {len(parsed_records)} records from EventLogFile {log_file_id}")
+        DOWNLOAD_PARSE_SECONDS.observe(time.perf_counter() - started, event_type=eventlog_record['EventType'])
+
+        # User lookups mostly hit the cache; misses are Salesforce queries on a worker thread
+        await asyncio.to_thread(self.enrich_records_with_user_details, parsed_records)
+        return parsed_records
+
+    async def bulk_ingest_async(self, records):
+        """Bulk ingest records to their data streams through the async bulk indexer"""
+        if not records:
+            return 0
+
+        try:
+            # Data stream checks are rare metadata calls, so they keep using the synchronous client
+            data_streams_used = {f"sg-salesforce-{record.get('EventType', 'unknown').lower()}" for record in records}
+            for data_stream_name in data_streams_used:
+                if not DATA_STREAM_REGISTRY.is_known(data_stream_name):
+                    await asyncio.to_thread(self._ensure_data_stream_exists, data_stream_name)
+
+            def generate_actions():
+                for i, record in enumerate(records):
+                    doc_id = getattr(record, 'doc_id', None)
+                    if doc_id is None:
+                        doc_id = DocumentIdGenerator(record['EventLogFile_Id'])(i)
+                    yield {
+                        "_index": f"sg-salesforce-{record.get('EventType', 'unknown').lower()}",
+                        "_id": doc_id,
+                        "_source": record
+                    }
+
+            with BULK_INGEST_SECONDS.time(ingester='eventlog'):
+                stats = await self.async_bulk_indexer.index(generate_actions())
+            return self._report_bulk_stats(stats, data_streams_used)
+
+        except Exception as e:
+            logger.error(f"Error during bulk ingestion: {e}")
+            return 0
+
+    async def run_single_sync_async(self):
+        """Run a single synchronization cycle as a discover -> download/parse -> index task pipeline"""
+        try:
+            if not await asyncio.to_thread(self.connect_to_salesforce):
+                logger.error("Failed to connect to Salesforce")
+                return False
+
+            downloaders = self.config.get('async_download_concurrency', 16)
+            indexers = self.config.get('async_index_concurrency', 2)
+
+            # Bounded queues make a slow stage hold back the one feeding it instead of buffering files
+            download_queue = asyncio.Queue(maxsize=self.config.get('async_download_queue_size', 64))
+            index_queue = asyncio.Queue(maxsize=self.config.get('async_index_queue_size', 8))
+            file_results = []
+            started = time.time()
+            # Bytes of EventLogFiles between the start of their download and the end of their indexing
+            budget = AsyncInflightByteBudget(self.config.get('max_inflight_bytes', 512 * 1024 * 1024))
+
+            async def discover():
+                files_found = 0
+                # Each wave's SOQL query runs on a worker thread
+                waves = self.iter_eventlog_file_waves()
+                while True:
+                    eventlog_files = await asyncio.to_thread(next, waves, None)
+                    if eventlog_files is None:
+                        break
+                    files_found += len(eventlog_files)
+                    for eventlog_file in eventlog_files:
+                        await download_queue.put(eventlog_file)
+
+                for _ in range(downloaders):
+                    await download_queue.put(_DONE)
+                return files_found
+
+            async def download():
+                while True:
+                    eventlog_record = await download_queue.get()
+                    if eventlog_record is _DONE:
+                        return
+                    nbytes = int(eventlog_record.get('LogFileLength') or 0)
+                    await budget.acquire(nbytes)
+                    file_started = time.time()
+                    try:
+                        parsed_records = await self.download_and_parse_async(eventlog_record)
+                    except Exception as e:
+                        await budget.release(nbytes)
+                        logger.error(f"Error processing EventLogFile {eventlog_record.get('Id', 'unknown')}: {e}")
+                        await asyncio.to_thread(self.mark_file_failed, eventlog_record, str(e))
+                        file_results.append(self._file_result(eventlog_record, 0, 0, time.time() - file_started, error=str(e)))
+                        continue
+                    await index_queue.put((eventlog_record, parsed_records, file_started, nbytes))
+
+            async def index():
+                while True:
+                    item = await index_queue.get()
+                    if item is _DONE:
+                        return
+                    eventlog_record, parsed_records, file_started, nbytes = item
+                    try:
+                        ingested_count = await self.bulk_ingest_async(parsed_records)
+                    finally:
+                        await budget.release(nbytes)
+
+                    # Only fully ingested files are checkpointed; anything else goes on the retry list
+                    if ingested_count == len(parsed_records):
+                        await asyncio.to_thread(self.mark_file_processed, eventlog_record)
+                    else:
+                        await asyncio.to_thread(self.mark_file_failed, eventlog_record, f"{ingested_count}/{len(parsed_records)} records ingested")
+                    file_results.append(self._file_result(eventlog_record, len(parsed_records), ingested_count, time.time() - file_started))
+
+            async def drain():
+                files_found = await discover_task
+                await asyncio.gather(*download_tasks)
+                for _ in index_tasks:
+                    await index_queue.put(_DONE)
+                await asyncio.gather(*index_tasks)
+                return files_found
+
+            discover_task = asyncio.ensure_future(discover())
+            download_tasks = [asyncio.ensure_future(download()) for _ in range(downloaders)]
+            index_tasks = [asyncio.ensure_future(index()) for _ in range(indexers)]
+            drain_task = asyncio.ensure_future(drain())
+            tasks = [drain_task, discover_task] + download_tasks + index_tasks
+            try:
+                # A stage that dies would leave the others blocked on its queue, so fail as soon as any task raises
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    if not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+                files_found = drain_task.result()
+            finally:
+                # On errors or cancellation, stop every stage still running
+                for task in tasks:
+                    task.cancel()
+
+            if file_results:
+                self.summarize_sync(file_results, files_found, started)
+                await asyncio.to_thread(self.get_index_stats)
+            else:
+                logger.info("No new EventLogFiles to sync")
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error during sync cycle: {e}")
+            return False
+
+    async def run_continuous_async(self):
+        """Run continuous ingestion until cancelled"""
+        logger.info("Starting continuous Salesforce EventLogFile ingestion (asyncio engine)...")
+        start_metrics_server(self.config)
+
+        # Initial setup
+        if not await asyncio.to_thread(self.setup_elasticsearch):
+            logger.error("Failed to setup Elasticsearch. Exiting.")
+            return
+        await self.start()
+
+        sync_interval = self.config.get('sync_interval_minutes', 60)
+        max_retries = self.config.get('max_retries', 3)
+
+        try:
+            while True:
+                logger.info(f"Starting sync cycle...")
+
+                retry_count = 0
+                success = False
+
+                while retry_count < max_retries and not success:
+                    success = await self.run_single_sync_async()
+                    observe_sync('eventlog', success)
+                    if not success:
+                        retry_count += 1
+                        if retry_count < max_retries:
+                            logger.warning(f"Sync failed, retrying in 10 minutes... (attempt {retry_count}/{max_retries})")
+                            await asyncio.sleep(600)
+
+                if not success:
+                    logger.error(f"Sync failed after {max_retries} attempts")
+                elif not self.caught_up:
+                    logger.info("EventLogFile backlog remaining, starting next sync cycle immediately")
+                    continue
+
+                logger.info(f"Waiting {sync_interval} minutes until next sync...")
+                await asyncio.sleep(sync_interval * 60)
+
+        except asyncio.CancelledError:
+            logger.info("Ingestion cancelled. Stopping continuous ingestion...")
+            raise
+        finally:
+            await self.stop()
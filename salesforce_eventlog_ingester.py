@@ -5,9 +5,31 @@ import csv
 import gzip
 import io
 import hashlib
-from datetime import datetime, timedelta
+import codecs
+import zlib
+import os
+import mmap
+import pickle
+import tempfile
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from elasticsearch import Elasticsearch
-from simple_salesforce import Salesforce
+from salesforce_bulk_indexer import BulkIndexer, summarize_bulk_stats, create_serializer
+from salesforce_checkpoint import (
+    create_checkpoint_store, parse_salesforce_datetime, format_soql_datetime, keyset_clause, eventlog_file_version, KeysetFrontier
+)
+from salesforce_auth import SalesforceClient
+from salesforce_payload_cache import create_payload_cache
+from salesforce_user_cache import get_user_cache, query_user_details
+from salesforce_pipeline import Pipeline
+from salesforce_metrics import (
+    start_metrics_server, observe_bulk_stats, observe_sync,
+    EVENTLOG_FILES, EVENTLOG_BYTES, EVENTLOG_RECORDS, DOWNLOAD_PARSE_SECONDS, TIMESTAMP_CONVERSION_SECONDS,
+    CONVERSION_FAILURES, BULK_INGEST_SECONDS, USER_LOOKUP_SECONDS, LAST_EVENT_TIMESTAMP
+)
 
 # Setup logging
 logging.basicConfig(
@@ -20,53 +42,688 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class SalesforceEventLogFileIngester:
-    def __init__(self, config):
-        self.config = config
-        self.sf = None
-        self.es = None
-        
-    def get_access_token(self):
-        """Get Salesforce access token using JWT Bearer flow"""
-        import jwt
-        import time
-        
-        payload = {
-            'iss': self.config['client_id'],
-            'sub': self.config['username'],
-            'aud': self.config.get('auth_url', 'https://login.salesforce.com'),
-            'exp': int(time.time()) + 3600
-        }
-        
-        token = jwt.encode(payload, self.config['private_key'], algorithm='RS256')
-        
-        data = {
-            'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer',
-            'assertion': token
-        }
-        
-        response = requests.post(f"{self.config.get('auth_url', 'https://login.salesforce.com')}/services/oauth2/token", data=data)
-        
-        if response.status_code != 200:
-            raise Exception(f'Authentication failed: {response.status_code} - {response.text}')
-        
-        return response.json()
+# EventLogFile columns holding Salesforce timestamps
+TIMESTAMP_FIELDS = ('TIMESTAMP', 'LOGIN_TIME', 'LOGOUT_TIME', 'TIMESTAMP_DERIVED')
+
+# Explicit date mapping for those columns, so dynamic mapping never types them from the first value it sees
+TIMESTAMP_FIELD_MAPPING = {
+    "type": "date",
+    "format": "yyyy-MM-dd'T'HH:mm:ss.SSS'Z'||yyyy-MM-dd'T'HH:mm:ss'Z'||strict_date_optional_time||epoch_millis",
+    "ignore_malformed": True
+}
 
-    def connect_to_salesforce(self):
-        """Establish connection to Salesforce"""
+# EventLogFile fields selected by every discovery query
+EVENTLOG_FILE_FIELDS = "Id, EventType, LogDate, CreatedDate, LogFile, LogFileLength, LogFileFieldNames, LogFileFieldTypes, Sequence, Interval"
+
+def normalize_sf_timestamp(value):
+    """Convert a Salesforce log timestamp to ISO 8601 UTC, or return None if it is malformed"""
+    # Salesforce timestamps are typically in format: 20231201123045.123 (UTC)
+    head = value[:14]
+    if len(head) == 14 and head.isdigit() and head.isascii():
+        millis = ''
+        if len(value) > 15 and value[14] == '.':
+            millis = '.' + value[15:18].ljust(3, '0')
+        return f"{head[0:4]}-{head[4:6]}-{head[6:8]}T{head[8:10]}:{head[10:12]}:{head[12:14]}{millis}Z"
+    
+    # TIMESTAMP_DERIVED and some newer columns are already ISO 8601
+    if len(value) >= 19 and value[4] == '-' and value[10] == 'T':
+        if value[-1] == 'Z':
+            return value
+        # Offsets other than UTC take the slow path
         try:
-            auth_response = self.get_access_token()
-            access_token = auth_response['access_token']
-            instance_url = auth_response['instance_url']
-            
-            self.sf = Salesforce(instance_url=instance_url, session_id=access_token)
-            logger.info(f"Connected to Salesforce instance: {instance_url}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error connecting to Salesforce: {e}")
+            dt = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        dt = dt.astimezone(timezone.utc)
+        return dt.strftime('%Y-%m-%dT%H:%M:%S.') + f"{dt.microsecond // 1000:03d}Z"
+    return None
+
+def normalize_timestamp_column(values, field, failures):
+    """Normalize a whole column of timestamps, counting malformed values in failures"""
+    normalized = []
+    append = normalized.append
+    for value in values:
+        if value:
+            converted = normalize_sf_timestamp(value)
+            if converted is None:
+                failures[field] += 1
+                converted = value
+            append(converted)
+        else:
+            append(value)
+    return normalized
+
+def parse_field_types(eventlog_record):
+    """Map each column to its declared LogFileFieldTypes entry"""
+    names = (eventlog_record.get('LogFileFieldNames') or '').split(',')
+    types = (eventlog_record.get('LogFileFieldTypes') or '').split(',')
+    return {name.strip(): field_type.strip() for name, field_type in zip(names, types) if name.strip()}
+
+def timestamp_fields(field_types):
+    """Columns normalized as timestamps: TIMESTAMP_FIELDS plus every column LogFileFieldTypes declares DateTime"""
+    return set(TIMESTAMP_FIELDS).union(field for field, field_type in field_types.items() if field_type == 'DateTime')
+
+# Converters applied to whole columns according to LogFileFieldTypes; other types stay keyword strings.
+# DateTime columns go through normalize_timestamp_column like in the dict engine, so both index the same values
+COLUMN_CONVERTERS = {
+    'Number': float,
+    'Double': float,
+    'Boolean': lambda value: value.lower() in ('true', '1')
+}
+
+def convert_column(values, field, field_type, failures):
+    """Convert one column of raw CSV strings to its declared type (empty values become None)"""
+    if field_type == 'DateTime' or field in TIMESTAMP_FIELDS:
+        return [value or None for value in normalize_timestamp_column(values, field, failures)]
+    converter = COLUMN_CONVERTERS.get(field_type)
+    if converter is None:
+        return [value or None for value in values]
+    
+    converted = []
+    append = converted.append
+    for value in values:
+        if value is None or value == '':
+            append(None)
+            continue
+        try:
+            append(converter(value))
+        except ValueError:
+            failures[field] += 1
+            append(None)
+    return converted
+
+def iter_column_batches(rows, field_types, batch_rows, failures, timings=None):
+    """Group csv.reader rows into typed column batches of at most batch_rows rows"""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    
+    batch = []
+    for row in rows:
+        # Blank lines come through as empty rows
+        if not row:
+            continue
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            yield header, _columns_from_rows(header, batch, field_types, failures, timings)
+            batch = []
+    if batch:
+        yield header, _columns_from_rows(header, batch, field_types, failures, timings)
+
+def _columns_from_rows(header, rows, field_types, failures, timings=None):
+    # Short rows are padded so every column has one value per row
+    width = len(header)
+    columns = list(zip(*[row if len(row) == width else (row + [''] * width)[:width] for row in rows]))
+    started = time.perf_counter()
+    converted = [convert_column(column, field, field_types.get(field, 'String'), failures)
+                 for field, column in zip(header, columns)]
+    if timings is not None:
+        timings['conversion'] += time.perf_counter() - started
+    return converted
+
+def pyarrow_available():
+    """Whether the optional pyarrow dependency can be imported"""
+    try:
+        import pyarrow.csv
+        return True
+    except ImportError:
+        return False
+
+def iter_arrow_column_batches(raw_bytes, field_types, batch_rows, failures, timings=None):
+    """Read typed column batches from an in-memory CSV with pyarrow"""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    
+    # Let Arrow convert numbers natively; everything else is read as strings and converted per column
+    column_types = {field: pa.string() for field in TIMESTAMP_FIELDS}
+    column_types.update({
+        field: (pa.float64() if field_type in ('Number', 'Double') else pa.string())
+        for field, field_type in field_types.items()
+    })
+    # Quoted values such as URI can span lines
+    reader = pacsv.open_csv(
+        pa.BufferReader(raw_bytes),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(column_types=column_types, null_values=[''], strings_can_be_null=True)
+    )
+    
+    for record_batch in reader:
+        header = record_batch.schema.names
+        for offset in range(0, record_batch.num_rows, batch_rows):
+            chunk = record_batch.slice(offset, batch_rows)
+            columns = []
+            for field, column in zip(header, chunk.columns):
+                field_type = field_types.get(field, 'String')
+                values = column.to_pylist()
+                if field_type not in ('Number', 'Double'):
+                    started = time.perf_counter()
+                    values = convert_column(values, field, field_type, failures)
+                    if timings is not None:
+                        timings['conversion'] += time.perf_counter() - started
+                columns.append(values)
+            yield header, columns
+
+def build_file_metadata(eventlog_record):
+    """File-level fields added to every row of an EventLogFile, computed once per file"""
+    log_file_id = eventlog_record['Id']
+    event_type = eventlog_record['EventType']
+    return {
+        'EventLogFile_Id': log_file_id,
+        'EventType': event_type,
+        'LogDate': eventlog_record['LogDate'],
+        'LogFileLength': eventlog_record.get('LogFileLength'),
+        'Sequence': eventlog_record.get('Sequence'),
+        'Interval': eventlog_record.get('Interval'),
+        'ingestion_timestamp': datetime.now().isoformat(),
+        'log_file_processed': f"{log_file_id}_{event_type}"
+    }
+
+class DocumentIdGenerator:
+    """Stable 128-bit document ids from the EventLogFile Id and the row ordinal within the file"""
+    __slots__ = ('base',)
+
+    def __init__(self, log_file_id):
+        # The file Id prefix is hashed once; each id only hashes its ordinal on top of a copy
+        self.base = hashlib.blake2b(f"{log_file_id}:".encode('utf-8'), digest_size=16)
+
+    def __call__(self, ordinal):
+        digest = self.base.copy()
+        digest.update(str(ordinal).encode('ascii'))
+        return digest.hexdigest()
+
+    def batch(self, start, count):
+        """Ids for count consecutive rows starting at ordinal start"""
+        return [self(ordinal) for ordinal in range(start, start + count)]
+
+class EventLogFileContext:
+    """File-level metadata and CSV layout shared by every row of one EventLogFile"""
+    __slots__ = ('metadata', 'header', 'positions', 'timestamp_positions', 'metadata_overlaps', 'encoded_metadata')
+
+    def __init__(self, metadata, header, timestamp_columns=TIMESTAMP_FIELDS):
+        self.metadata = metadata
+        self.header = tuple(header)
+        self.positions = {field: position for position, field in enumerate(self.header)}
+        self.timestamp_positions = [(field, position) for position, field in enumerate(self.header) if field in timestamp_columns]
+        self.metadata_overlaps = bool(self.positions.keys() & metadata.keys())
+        self.encoded_metadata = None
+
+    def encode_metadata(self, serializer):
+        """Encode the file metadata once per file and serializer"""
+        if self.encoded_metadata is None or self.encoded_metadata[0] != serializer.name:
+            self.encoded_metadata = (serializer.name, serializer.dumps(self.metadata))
+        return self.encoded_metadata[1]
+
+_MISSING = object()
+
+class EventLogRow:
+    """One CSV row of an EventLogFile; file-level fields are only merged in when serialized"""
+    __slots__ = ('context', 'values', 'extra', 'doc_id')
+
+    def __init__(self, context, values, doc_id=None):
+        self.context = context
+        self.values = values
+        self.extra = None
+        self.doc_id = doc_id
+
+    def get(self, field, default=None):
+        if self.extra and field in self.extra:
+            return self.extra[field]
+        position = self.context.positions.get(field)
+        if position is not None:
+            value = self.values[position] if position < len(self.values) else None
+            return default if value is None else value
+        return self.context.metadata.get(field, default)
+
+    def __getitem__(self, field):
+        value = self.get(field, _MISSING)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+
+    def __setitem__(self, field, value):
+        # Fields added after parsing (e.g. enrichment) live beside the CSV values
+        if self.extra is None:
+            self.extra = {}
+        self.extra[field] = value
+
+    def __contains__(self, field):
+        return self.get(field, _MISSING) is not _MISSING
+
+    def encode_source(self, serializer):
+        """Encode the document, splicing in the file metadata encoded once per file"""
+        context = self.context
+        if context.metadata_overlaps or (self.extra and self.extra.keys() & context.metadata.keys()):
+            # Duplicate keys would be rejected by Elasticsearch, so merge them the slow way
+            return serializer.dumps(self.to_dict())
+        
+        fields = {field: value for field, value in zip(context.header, self.values) if value is not None}
+        if self.extra:
+            fields.update(self.extra)
+        metadata = context.encode_metadata(serializer)
+        if not fields:
+            return metadata
+        return metadata[:-1] + b',' + serializer.dumps(fields)[1:]
+
+    def to_dict(self):
+        """Build the document source: file metadata, then CSV values, then added fields"""
+        record = dict(self.context.metadata)
+        record.update((field, value) for field, value in zip(self.context.header, self.values) if value is not None)
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+class EncodedEventLogRow:
+    """A row encoded by a parse worker process; fields added in this process are spliced in when indexed"""
+    __slots__ = ('doc_id', 'source', 'event_type', 'user_id', 'user_name', 'extra')
+
+    def __init__(self, doc_id, source, event_type, user_id=None, user_name=None):
+        self.doc_id = doc_id
+        self.source = source
+        self.event_type = event_type
+        self.user_id = user_id
+        self.user_name = user_name
+        self.extra = None
+
+    def get(self, field, default=None):
+        # Only the fields routing and enrichment look at are kept outside the encoded source
+        if self.extra and field in self.extra:
+            return self.extra[field]
+        if field == 'EventType':
+            return self.event_type
+        if field == 'USER_ID':
+            return default if self.user_id is None else self.user_id
+        if field == 'USER_NAME':
+            return default if self.user_name is None else self.user_name
+        return default
+
+    def __setitem__(self, field, value):
+        if self.extra is None:
+            self.extra = {}
+        self.extra[field] = value
+
+    def encode_source(self, serializer):
+        if not self.extra:
+            return self.source
+        return self.source[:-1] + b',' + serializer.dumps(self.extra)[1:]
+
+# Config keys a parse worker needs; credentials are never sent to the worker processes
+PARSE_CONFIG_KEYS = ('parse_engine', 'columnar_backend', 'columnar_batch_rows', 'bulk_serializer', 'stream_batch_records', 'spool_dir')
+
+def convert_timestamp_fields(record, failures=None):
+    """Convert timestamp fields to proper datetime format"""
+    if isinstance(record, EventLogRow):
+        # Only the timestamp columns present in this file's header are visited
+        values = record.values
+        for field, position in record.context.timestamp_positions:
+            value = values[position] if position < len(values) else None
+            if value:
+                converted = normalize_sf_timestamp(value)
+                if converted is not None:
+                    values[position] = converted
+                elif failures is not None:
+                    # Counted per file and logged once instead of warning on every row
+                    failures[field] += 1
+        return
+    
+    for field in TIMESTAMP_FIELDS:
+        value = record.get(field)
+        if value:
+            converted = normalize_sf_timestamp(value)
+            if converted is not None:
+                record[field] = converted
+            elif failures is not None:
+                failures[field] += 1
+
+def iter_parsed_records(lines, eventlog_record, config, failures, raw_bytes=None, timings=None):
+    """Yield EventLogRows from CSV lines with the configured parse engine
+
+    Seconds spent converting values are added to timings['conversion'] when timings is given (parse
+    workers send them back to the parent), and otherwise recorded per file once parsing ends.
+    """
+    observe = timings is None
+    if observe:
+        timings = Counter()
+    try:
+        yield from _iter_parsed_rows(lines, eventlog_record, config, failures, raw_bytes, timings)
+    finally:
+        if observe:
+            TIMESTAMP_CONVERSION_SECONDS.observe(timings['conversion'], event_type=eventlog_record.get('EventType', 'unknown'))
+
+def _iter_parsed_rows(lines, eventlog_record, config, failures, raw_bytes, timings):
+    metadata = build_file_metadata(eventlog_record)
+    make_doc_id = DocumentIdGenerator(eventlog_record['Id'])
+    
+    if config.get('parse_engine', 'dict') != 'columnar':
+        csv_reader = csv.reader(lines)
+        header = next(csv_reader, None)
+        if header is None:
+            return
+        context = EventLogFileContext(metadata, header, timestamp_fields(parse_field_types(eventlog_record)))
+        perf_counter = time.perf_counter
+        ordinal = 0
+        for values in csv_reader:
+            # csv.reader yields [] for blank lines; skip them like the columnar readers so ordinals match
+            if not values:
+                continue
+            row = EventLogRow(context, values, make_doc_id(ordinal))
+            ordinal += 1
+            # Convert timestamp fields to proper format
+            started = perf_counter()
+            convert_timestamp_fields(row, failures)
+            timings['conversion'] += perf_counter() - started
+            yield row
+        return
+    
+    field_types = parse_field_types(eventlog_record)
+    batch_rows = config.get('columnar_batch_rows', 10000)
+    
+    # pyarrow needs the whole file in memory; streaming always uses the pure Python reader
+    if raw_bytes is not None and config.get('columnar_backend', 'pyarrow') == 'pyarrow' and pyarrow_available():
+        column_batches = iter_arrow_column_batches(raw_bytes, field_types, batch_rows, failures, timings)
+    else:
+        column_batches = iter_column_batches(csv.reader(lines), field_types, batch_rows, failures, timings)
+    
+    context = None
+    ordinal = 0
+    for header, columns in column_batches:
+        if context is None or context.header != tuple(header):
+            context = EventLogFileContext(metadata, header)
+        batch_size = len(columns[0]) if columns else 0
+        doc_ids = make_doc_id.batch(ordinal, batch_size)
+        ordinal += batch_size
+        # Empty values are None in column batches and left out when serialized
+        for values, doc_id in zip(zip(*columns), doc_ids):
+            yield EventLogRow(context, values, doc_id)
+
+def iter_payload_records(payload, eventlog_record, config, failures, timings=None):
+    """Yield EventLogRows from an in-memory EventLogFile body, decompressing it first if it is gzipped"""
+    # Check if content is gzipped and decompress if needed
+    if payload.startswith(b'\x1f\x8b'):  # gzip magic number
+        payload = gzip.decompress(payload)
+    csv_content = payload.decode('utf-8')
+    
+    # Parse CSV content
+    return iter_parsed_records(io.StringIO(csv_content), eventlog_record, config, failures, raw_bytes=payload, timings=timings)
+
+def iter_spooled_records(spool_path, eventlog_record, config, failures, timings=None):
+    """Yield EventLogRows from a spooled EventLogFile through a read-only memory map"""
+    with open(spool_path, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        # Not closed explicitly: pyarrow may still hold a buffer export, so it is unmapped once unreferenced
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    raw_bytes = source = mapped
+    if mapped[:2] == b'\x1f\x8b':
+        raw_bytes = gzip.decompress(mapped)
+        source = io.BytesIO(raw_bytes)
+    lines = (line.decode('utf-8') for line in iter(source.readline, b''))
+    yield from iter_parsed_records(lines, eventlog_record, config, failures, raw_bytes=raw_bytes, timings=timings)
+
+def iter_record_batches(records, batch_records):
+    """Group parsed records into lists of at most batch_records"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_records:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def parse_in_worker(source, eventlog_record, config):
+    """Parse-pool entry point: parse payload bytes or a spooled file into encoded row batches on disk
+
+    Each batch of at most stream_batch_records rows is pickled to its own file in spool_dir as soon as
+    it is full, so neither process holds a whole file of rows; returns [(path, rows)], the failures and
+    the conversion timings, which the parent records since metrics live in the parent process.
+    """
+    serializer = create_serializer(config.get('bulk_serializer', 'auto'))
+    failures = Counter()
+    timings = Counter()
+    if isinstance(source, str):
+        records = iter_spooled_records(source, eventlog_record, config, failures, timings)
+    else:
+        records = iter_payload_records(source, eventlog_record, config, failures, timings)
+    
+    batches = []
+    try:
+        for batch in iter_record_batches(records, config.get('stream_batch_records', 5000)):
+            # Plain tuples of bytes and strings pickle compactly
+            rows = [(row.doc_id, row.encode_source(serializer), row.get('USER_ID'), row.get('USER_NAME')) for row in batch]
+            fd, path = tempfile.mkstemp(dir=config.get('spool_dir'), prefix=f"{eventlog_record['Id']}-rows-", suffix='.pickle')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+            batches.append((path, len(rows)))
+    except BaseException:
+        for path, _ in batches:
+            os.unlink(path)
+        raise
+    return batches, failures, timings
+
+class InflightByteBudget:
+    """Caps the number of EventLogFile bytes being downloaded and processed at once"""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.inflight_bytes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, nbytes):
+        """Block until nbytes fit in the budget"""
+        with self.condition:
+            # A file larger than the whole budget is let through once nothing else is in flight
+            while self.inflight_bytes > 0 and self.inflight_bytes + nbytes > self.max_bytes:
+                self.condition.wait()
+            self.inflight_bytes += nbytes
+
+    def release(self, nbytes):
+        """Return nbytes to the budget"""
+        with self.condition:
+            self.inflight_bytes -= nbytes
+            self.condition.notify_all()
+
+class FileProgress:
+    """Tracks one EventLogFile through the staged pipeline until every parsed record has been sent"""
+    def __init__(self, eventlog_record):
+        self.eventlog_record = eventlog_record
+        self.started = time.time()
+        self.parsed = 0
+        self.attempted = 0
+        self.ingested = 0
+        self.parse_done = False
+        self.finished = False
+        self.error = None
+        self.lock = threading.Lock()
+
+    def add_parsed(self, count):
+        with self.lock:
+            self.parsed += count
+
+    def finish_parsing(self):
+        """Mark the file fully parsed; True if that completes it"""
+        with self.lock:
+            self.parse_done = True
+            return self._complete()
+
+    def add_indexed(self, attempted, ingested):
+        """Count records sent to Elasticsearch; True if that completes the file"""
+        with self.lock:
+            self.attempted += attempted
+            self.ingested += ingested
+            return self._complete()
+
+    def _complete(self):
+        if self.finished or not self.parse_done or self.attempted < self.parsed:
             return False
+        self.finished = True
+        return True
+
+class DataStreamRegistry:
+    """Process-wide record of the data streams and index templates known to exist"""
+    def __init__(self):
+        self.data_streams = set()
+        self.templates = set()
+        self.lock = threading.Lock()
+
+    def is_known(self, data_stream_name):
+        return data_stream_name in self.data_streams
+
+    def add(self, data_stream_name, template_name=None):
+        with self.lock:
+            self.data_streams.add(data_stream_name)
+            if template_name:
+                self.templates.add(template_name)
+
+    def invalidate(self, data_stream_name):
+        """Forget a data stream so the next write checks for it again"""
+        with self.lock:
+            self.data_streams.discard(data_stream_name)
+
+    def warm(self, es, pattern):
+        """Load the existing data streams matching pattern in one request"""
+        response = es.indices.get_data_stream(name=pattern)
+        with self.lock:
+            for data_stream in response.get('data_streams', []):
+                self.data_streams.add(data_stream['name'])
+                if data_stream.get('template'):
+                    self.templates.add(data_stream['template'])
+        return len(self.data_streams)
 
+# Shared by every ingester in the process so metadata checks happen once per data stream
+DATA_STREAM_REGISTRY = DataStreamRegistry()
+
+class ProcessedFileIndex:
+    """In-memory index of ingested EventLogFiles used to skip unchanged files before download"""
+    def __init__(self):
+        # EventLogFile Id -> (version, LogDate, CreatedDate); the dates are None when unknown
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def add(self, log_file_id, log_file_length, sequence, log_date=None, created_date=None):
+        log_date = parse_salesforce_datetime(log_date) if log_date else None
+        created_date = parse_salesforce_datetime(created_date) if created_date else None
+        with self.lock:
+            self.files[log_file_id] = (eventlog_file_version(log_file_length, sequence), log_date, created_date)
+
+    def is_current(self, eventlog_record):
+        """Whether this exact version of the file has already been ingested"""
+        entry = self.files.get(eventlog_record['Id'])
+        return entry is not None and entry[0] == eventlog_file_version(eventlog_record.get('LogFileLength'), eventlog_record.get('Sequence'))
+
+    def prune(self, log_date_position, created_position, before):
+        """Forget the files no discovery query can return again; returns how many were dropped
+
+        That is the files at or before both (LogDate, Id) and (CreatedDate, Id) keyset positions. Files
+        whose CreatedDate is unknown, and every file without a checkpoint, are kept until their LogDate
+        is older than before, the window the warm step loads.
+        """
+        def behind(date, log_file_id, position):
+            return position is not None and date is not None and (date, log_file_id) <= position
+        
+        if log_date_position:
+            log_date_position = (parse_salesforce_datetime(log_date_position[0]), log_date_position[1])
+        if created_position:
+            created_position = (parse_salesforce_datetime(created_position[0]), created_position[1])
+        with self.lock:
+            stale = [
+                log_file_id for log_file_id, (_, log_date, created_date) in self.files.items()
+                if (behind(log_date, log_file_id, log_date_position) and behind(created_date, log_file_id, created_position))
+                or ((created_date is None or log_date_position is None) and log_date is not None and log_date < before)
+            ]
+            for log_file_id in stale:
+                del self.files[log_file_id]
+        return len(stale)
+
+    def __len__(self):
+        return len(self.files)
+
+    def warm_from_elasticsearch(self, es, since, until, exclude=()):
+        """Load the files ingested from since up to a (LogDate, Id) keyset position with a composite aggregation
+
+        Having documents in Elasticsearch does not make a file complete: a crash can stop it part way. Only
+        files the checkpoint keyset has moved past were settled, so files after until and the excluded Ids
+        (the retry list) are left out and get downloaded again.
+        """
+        until_date, until_id = parse_salesforce_datetime(until[0]), until[1]
+        exclude = set(exclude)
+        loaded = 0
+        # Older backing indices mapped log_file_processed dynamically as text with a keyword sub-field
+        for field in ('log_file_processed', 'log_file_processed.keyword'):
+            after_key = None
+            try:
+                while True:
+                    composite = {
+                        "size": 1000,
+                        "sources": [{"file": {"terms": {"field": field}}}]
+                    }
+                    if after_key:
+                        composite["after"] = after_key
+                    
+                    response = es.search(
+                        index="sg-salesforce-*",
+                        body={
+                            "size": 0,
+                            "query": {"range": {"LogDate": {"gte": since, "lte": until_date.isoformat()}}},
+                            "aggs": {
+                                "files": {
+                                    "composite": composite,
+                                    "aggs": {
+                                        "length": {"max": {"field": "LogFileLength"}},
+                                        "sequence": {"max": {"field": "Sequence"}},
+                                        "log_date": {"max": {"field": "LogDate"}}
+                                    }
+                                }
+                            }
+                        }
+                    )
+                    
+                    files = response['aggregations']['files']
+                    for bucket in files['buckets']:
+                        # log_file_processed is "<EventLogFile Id>_<EventType>"
+                        log_file_id = bucket['key']['file'].split('_', 1)[0]
+                        log_date = datetime.fromtimestamp(bucket['log_date']['value'] / 1000, timezone.utc)
+                        if log_file_id in exclude or (log_date, log_file_id) > (until_date, until_id):
+                            continue
+                        self.add(log_file_id, bucket['length']['value'], bucket['sequence']['value'], log_date.isoformat())
+                        loaded += 1
+                    
+                    after_key = files.get('after_key')
+                    if not after_key or not files['buckets']:
+                        break
+            except Exception as e:
+                logger.debug(f"Could not aggregate processed files on {field}: {e}")
+        return loaded
+
+class SalesforceEventLogFileIngester(SalesforceClient):
+    metrics_ingester = 'eventlog'
+
+    def __init__(self, config):
+        self.config = config
+        self.es = None
+        self.bulk_indexer = None
+        self.checkpoint_store = None
+        self.checkpoint = None
+        self.checkpoint_lock = threading.Lock()
+        # Saves happen outside checkpoint_lock; the version keeps an older state from replacing a newer one
+        self.checkpoint_save_lock = threading.Lock()
+        self.checkpoint_version = 0
+        self.checkpoint_saved_version = 0
+        self.log_date_frontier = KeysetFrontier()
+        self.created_frontier = KeysetFrontier()
+        self.processed_files = ProcessedFileIndex()
+        self.last_sync_summary = None
+        self.caught_up = True
+        self.init_salesforce_client(config)
+        self.payload_cache = create_payload_cache(config)
+        self.user_cache = get_user_cache(config)
+        self.organization_name = None
+        self.parse_pool = None
+        self.parse_pool_lock = threading.Lock()
+        
     def setup_elasticsearch(self):
         """Setup Elasticsearch connection"""
         try:
@@ -75,6 +732,12 @@ class SalesforceEventLogFileIngester:
             if not self.es.ping():
                 raise Exception("Cannot connect to Elasticsearch")
             
+            self.bulk_indexer = BulkIndexer(self.es, self.config)
+            self.checkpoint_store = create_checkpoint_store(self.config, self.es)
+            self.load_checkpoint()
+            if self.config.get('skip_ingested_files', True):
+                self.warm_processed_files()
+            
             # Create index mapping for EventLogFile data
             mapping = {
                 "mappings": {
@@ -94,6 +757,8 @@ class SalesforceEventLogFileIngester:
                         "ORGANIZATION_ID": {"type": "keyword"},
                         "USER_ID": {"type": "keyword"},
                         "USER_NAME": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+                        "USER_FULL_NAME": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+                        "ORGANIZATION_NAME": {"type": "keyword"},
                         "RUN_TIME": {"type": "float"},
                         "CPU_TIME": {"type": "float"},
                         "URI": {"type": "text"},
@@ -139,6 +804,16 @@ class SalesforceEventLogFileIngester:
                 }
             }
             
+            # Remember which data streams already exist so bulk requests skip the metadata checks
+            try:
+                known = DATA_STREAM_REGISTRY.warm(self.es, "sg-salesforce-*")
+                logger.info(f"Found {known} existing Salesforce data streams")
+            except Exception as e:
+                logger.info(f"No existing Salesforce data streams found: {e}")
+            
+            if self.config.get('precreate_data_streams', False):
+                self.precreate_data_streams()
+            
             # Data streams are created automatically when needed
             logger.info("Elasticsearch connection established - data streams will be created automatically")
             return True
@@ -194,42 +869,190 @@ class SalesforceEventLogFileIngester:
         logger.info(f"Using fallback timestamp: {fallback_time} ({fallback_hours} hours ago)")
         return fallback_time
 
-    def fetch_eventlog_files(self):
-        """Fetch EventLogFile records since last sync"""
-        try:
-            # Get the latest timestamp from Elasticsearch
-            last_sync = self.get_latest_sync_timestamp_from_es()
+    def load_checkpoint(self):
+        """Load the EventLogFile keyset positions and retry list, if a checkpoint store is configured"""
+        if not self.checkpoint_store:
+            return
+        
+        state = self.checkpoint_store.load('eventlogfile') or {}
+        lookback = timedelta(hours=self.config.get('checkpoint_lookback_hours', 24))
+        legacy_processed = state.pop('processed', None)
+        if legacy_processed is not None and state.get('high_water'):
+            # Older checkpoints excluded every recent file by Id; restart the keysets at the start of that
+            # window and let the processed-file index skip the files they listed
+            for log_file_id, entry in legacy_processed.items():
+                self.processed_files.add(log_file_id, entry.get('LogFileLength'), entry.get('Sequence'), entry.get('LogDate'))
+            window_start = format_soql_datetime(parse_salesforce_datetime(state['high_water']) - lookback)
+            state = {'high_water': window_start, 'created_high_water': window_start}
+        
+        self.checkpoint = {
+            'high_water': state.get('high_water'),
+            'high_water_id': state.get('high_water_id', ''),
+            # Late files are looked for from a little before the first run onwards
+            'created_high_water': state.get('created_high_water') or format_soql_datetime(datetime.now(timezone.utc) - lookback),
+            'created_high_water_id': state.get('created_high_water_id', ''),
+            'retry': state.get('retry', {})
+        }
+        if self.checkpoint['high_water']:
+            self.log_date_frontier = KeysetFrontier((self.checkpoint['high_water'], self.checkpoint['high_water_id']))
+        self.created_frontier = KeysetFrontier((self.checkpoint['created_high_water'], self.checkpoint['created_high_water_id']))
+        logger.info(f"Loaded EventLogFile checkpoint: high water {self.checkpoint['high_water']} / {self.checkpoint['high_water_id']}, "
+                    f"created high water {self.checkpoint['created_high_water']}, {len(self.checkpoint['retry'])} files to retry")
+
+    def _checkpoint_snapshot(self):
+        """Copy the keyset positions and retry list for _save_checkpoint; called with checkpoint_lock held"""
+        if self.log_date_frontier.position:
+            self.checkpoint['high_water'], self.checkpoint['high_water_id'] = self.log_date_frontier.position
+        self.checkpoint['created_high_water'], self.checkpoint['created_high_water_id'] = self.created_frontier.position
+        self.checkpoint_version += 1
+        return self.checkpoint_version, dict(self.checkpoint, retry=dict(self.checkpoint['retry']))
+
+    def _save_checkpoint(self, snapshot):
+        """Save a checkpoint snapshot without holding checkpoint_lock, skipping it if a newer one was saved"""
+        version, state = snapshot
+        with self.checkpoint_save_lock:
+            if version <= self.checkpoint_saved_version:
+                return
+            try:
+                self.checkpoint_store.save('eventlogfile', state)
+                self.checkpoint_saved_version = version
+            except Exception as e:
+                logger.error(f"Error saving EventLogFile checkpoint: {e}")
+
+    def prune_processed_files(self):
+        """Drop processed-file index entries the keysets have moved past, so the index stays bounded"""
+        before = datetime.now(timezone.utc) - timedelta(hours=self.config.get('dedup_lookback_hours', 48))
+        with self.checkpoint_lock:
+            log_date_position = self.log_date_frontier.position if self.checkpoint_store else None
+            created_position = self.created_frontier.position if self.checkpoint_store else None
+        pruned = self.processed_files.prune(log_date_position, created_position, before)
+        if pruned:
+            logger.info(f"Dropped {pruned} EventLogFiles behind the checkpoint from the processed-file index")
+
+    def warm_processed_files(self):
+        """Fill the processed-file index from the data already in Elasticsearch, for the files the checkpoint settled"""
+        if not self.checkpoint_store or not self.log_date_frontier.position:
+            # Without a checkpoint nothing says which files were completely ingested
+            logger.info("No EventLogFile checkpoint yet, not loading processed files from Elasticsearch")
+            return
+        
+        since = datetime.now(timezone.utc) - timedelta(hours=self.config.get('dedup_lookback_hours', 48))
+        with self.checkpoint_lock:
+            retry_ids = list(self.checkpoint['retry'])
+        loaded = self.processed_files.warm_from_elasticsearch(self.es, since.isoformat(), self.log_date_frontier.position, retry_ids)
+        logger.info(f"Processed-file index holds {len(self.processed_files)} EventLogFiles ({loaded} found in Elasticsearch)")
+
+    def skip_ingested_files(self, eventlog_files):
+        """Drop EventLogFiles whose Id, LogFileLength and Sequence were already ingested"""
+        with self.checkpoint_lock:
+            retry_ids = set(self.checkpoint['retry']) if self.checkpoint else set()
+        # Files on the retry list were not completely ingested whatever the index says
+        new_files = [eventlog_file for eventlog_file in eventlog_files
+                     if eventlog_file['Id'] in retry_ids or not self.processed_files.is_current(eventlog_file)]
+        skipped = len(eventlog_files) - len(new_files)
+        if skipped:
+            logger.info(f"Skipping {skipped} already ingested EventLogFiles before download")
+            new_ids = {eventlog_file['Id'] for eventlog_file in new_files}
+            self._settle_files([eventlog_file['Id'] for eventlog_file in eventlog_files if eventlog_file['Id'] not in new_ids])
+        return new_files
+
+    def _settle_files(self, log_file_ids, ingested=True):
+        """Let the keysets move past finished files; ingested files also leave the retry list"""
+        if not self.checkpoint_store:
+            return
+        
+        with self.checkpoint_lock:
+            changed = False
+            for log_file_id in log_file_ids:
+                if ingested and self.checkpoint['retry'].pop(log_file_id, None) is not None:
+                    changed = True
+                if self.log_date_frontier.settle(log_file_id):
+                    changed = True
+                if self.created_frontier.settle(log_file_id):
+                    changed = True
+            snapshot = self._checkpoint_snapshot() if changed else None
+        if snapshot:
+            self._save_checkpoint(snapshot)
+
+    def mark_file_processed(self, eventlog_record):
+        """Record a fully ingested EventLogFile in the processed-file index and the checkpoint"""
+        self.processed_files.add(eventlog_record['Id'], eventlog_record.get('LogFileLength'), eventlog_record.get('Sequence'),
+                                 eventlog_record.get('LogDate'), eventlog_record.get('CreatedDate'))
+        LAST_EVENT_TIMESTAMP.set_max(parse_salesforce_datetime(eventlog_record['LogDate']).timestamp(),
+                                     ingester='eventlog', event_type=eventlog_record.get('EventType', 'unknown'))
+        self._settle_files([eventlog_record['Id']])
+
+    def mark_file_failed(self, eventlog_record, error=None):
+        """Put a file that was not fully ingested on the retry list so the keysets can move past it"""
+        if not self.checkpoint_store:
+            return
+        
+        log_file_id = eventlog_record['Id']
+        with self.checkpoint_lock:
+            retry = self.checkpoint['retry']
+            if not (self.log_date_frontier.tracks(log_file_id) or self.created_frontier.tracks(log_file_id) or log_file_id in retry):
+                # Replayed files are not part of a discovery cycle
+                return
             
-            # If no records exist, use fallback
-            if last_sync is None:
-                last_sync = self.get_fallback_timestamp()
+            attempts = retry.get(log_file_id, {}).get('attempts', 0) + 1
+            if attempts >= self.config.get('max_file_attempts', 5):
+                retry.pop(log_file_id, None)
+                logger.error(f"Giving up on EventLogFile {log_file_id} after {attempts} attempts: {error}")
+            elif log_file_id not in retry and len(retry) >= self.config.get('max_retry_files', 200):
+                logger.error(f"Retry list is full, giving up on EventLogFile {log_file_id}: {error}")
             else:
-                # Add a small buffer (1 hour) to avoid missing records
-                last_sync = last_sync + timedelta(hours=1)
-            
-            # Format datetime for SOQL query (Salesforce expects UTC)
-            last_sync_str = last_sync.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-            
-            # Get event types to process
-            event_types = self.config.get('event_types', ['API', 'Login', 'Logout', 'URI'])
-            event_types_str = "', '".join(event_types)
-            
-            query = f"""
-            SELECT Id, EventType, LogDate, LogFile, LogFileLength, 
-                   LogFileFieldNames, LogFileFieldTypes, Sequence, Interval
-            FROM EventLogFile 
-            WHERE LogDate >= {last_sync_str}
-            AND EventType IN ('{event_types_str}')
-            ORDER BY LogDate ASC, EventType ASC
-            LIMIT {self.config.get('batch_size', 100)}
-            """
+                retry[log_file_id] = {'LogDate': eventlog_record['LogDate'], 'attempts': attempts}
             
-            logger.info(f"Fetching EventLogFile records since: {last_sync_str}")
-            logger.info(f"Event types: {event_types}")
-            
-            result = self.sf.query_all(query)
-            records = result['records']
+            self.log_date_frontier.settle(log_file_id)
+            self.created_frontier.settle(log_file_id)
+            snapshot = self._checkpoint_snapshot()
+        self._save_checkpoint(snapshot)
+
+    def get_resume_point(self):
+        """Return the (LogDate, Id) keyset position to query after"""
+        if self.checkpoint_store and self.log_date_frontier.position:
+            log_date, log_file_id = self.log_date_frontier.position
+            return parse_salesforce_datetime(log_date), log_file_id
+        
+        # Get the latest timestamp from Elasticsearch
+        last_sync = self.get_latest_sync_timestamp_from_es()
+        
+        # If no records exist, use fallback
+        if last_sync is None:
+            last_sync = self.get_fallback_timestamp()
+        elif not self.config.get('skip_ingested_files', True):
+            # Add a small buffer (1 hour) to avoid missing records
+            last_sync = last_sync + timedelta(hours=1)
+        
+        # With the processed-file index the last LogDate can be re-queried safely; '' sorts before every Id
+        return last_sync, ''
+
+    def _query_eventlog_files(self, where_clause, order_clause, limit=None):
+        """Run an EventLogFile query for the configured event types"""
+        event_types_str = "', '".join(self.config.get('event_types', ['API', 'Login', 'Logout', 'URI']))
+        query = f"""
+        SELECT {EVENTLOG_FILE_FIELDS}
+        FROM EventLogFile 
+        WHERE EventType IN ('{event_types_str}')
+        AND {where_clause}
+        ORDER BY {order_clause}
+        LIMIT {limit or self.config.get('batch_size', 100)}
+        """
+        return self.call_salesforce(lambda: self.sf.query_all(query))['records']
+
+    def fetch_eventlog_files(self, after=None):
+        """Fetch EventLogFile records after the checkpoint's (LogDate, Id) keyset position, or after a cursor"""
+        try:
+            if after:
+                log_date, log_file_id = after
+                logger.info(f"Fetching next EventLogFile page after {after[0]} / {after[1]}")
+            else:
+                log_date, log_file_id = self.get_resume_point()
+                logger.info(f"Fetching EventLogFile records after: {format_soql_datetime(log_date)} / {log_file_id or '-'}")
+            logger.info(f"Event types: {self.config.get('event_types', ['API', 'Login', 'Logout', 'URI'])}")
             
+            # Sorting by Id within a LogDate gives the total order keyset pagination needs
+            records = self._query_eventlog_files(keyset_clause('LogDate', log_date, log_file_id), "LogDate ASC, Id ASC")
             logger.info(f"Retrieved {len(records)} EventLogFile records")
             return records
             
@@ -237,9 +1060,51 @@ class SalesforceEventLogFileIngester:
             logger.error(f"Error fetching EventLogFile data: {e}")
             return []
 
-    def download_and_parse_logfile(self, eventlog_record):
+    def fetch_late_eventlog_files(self, log_date_position, after=None):
+        """Fetch files behind a LogDate keyset position created after the CreatedDate high-water mark"""
+        try:
+            created_date, log_file_id = after or self.created_frontier.position
+            log_date, log_date_id = log_date_position
+            # Salesforce can publish files for an earlier LogDate late; the LogDate keyset has already passed them
+            where_clause = (f"{keyset_clause('CreatedDate', created_date, log_file_id)} "
+                            f"AND {keyset_clause('LogDate', log_date, log_date_id, after=False)}")
+            records = self._query_eventlog_files(where_clause, "CreatedDate ASC, Id ASC")
+            logger.info(f"Retrieved {len(records)} EventLogFile records created after {created_date} / {log_file_id or '-'}")
+            return records
+            
+        except Exception as e:
+            logger.error(f"Error fetching late EventLogFile data: {e}")
+            return []
+
+    def fetch_retry_eventlog_files(self):
+        """Fetch the files on the retry list, dropping the ones Salesforce no longer returns"""
+        with self.checkpoint_lock:
+            retry_ids = list(self.checkpoint['retry'])
+        if not retry_ids:
+            return []
+        
+        try:
+            retry_ids_str = "', '".join(retry_ids)
+            records = self._query_eventlog_files(f"Id IN ('{retry_ids_str}')", "LogDate ASC, Id ASC", limit=len(retry_ids))
+        except Exception as e:
+            logger.error(f"Error fetching EventLogFiles to retry: {e}")
+            return []
+        
+        found = {record['Id'] for record in records}
+        missing = [log_file_id for log_file_id in retry_ids if log_file_id not in found]
+        if missing:
+            logger.warning(f"{len(missing)} EventLogFiles to retry no longer exist: {', '.join(missing)}")
+            with self.checkpoint_lock:
+                for log_file_id in missing:
+                    self.checkpoint['retry'].pop(log_file_id, None)
+                snapshot = self._checkpoint_snapshot()
+            self._save_checkpoint(snapshot)
+        return records
+
+    def download_and_parse_logfile(self, eventlog_record, raise_errors=False):
         """Download and parse the CSV content from EventLogFile"""
         try:
+            started = time.perf_counter()
             log_file_id = eventlog_record['Id']
             event_type = eventlog_record['EventType']
             log_date = eventlog_record['LogDate']
@@ -252,136 +1117,707 @@ class SalesforceEventLogFileIngester:
                 logger.warning(f"No LogFile URL for {log_file_id}")
                 return []
             
-            # Download the actual log file content using REST API
-            # Construct the full URL for downloading the log file
-            download_url = f"{self.sf.base_url}sobjects/EventLogFile/{log_file_id}/LogFile"
-            
-            # Make authenticated request to download the file
-            headers = {
-                'Authorization': f'Bearer {self.sf.session_id}',
-                'Accept-Encoding': 'gzip'
-            }
-            
-            response = requests.get(download_url, headers=headers)
-            response.raise_for_status()
+            failures = Counter()
+            source = self._fetch_logfile_source(eventlog_record)
+            try:
+                parsed_records = self._parse(source, eventlog_record, failures)
+            finally:
+                if isinstance(source, str):
+                    os.unlink(source)
             
-            # The response content is gzipped CSV data
-            decoded_content = response.content
+            self._log_conversion_failures(log_file_id, failures)
+            logger.info(f"Parsed {len(parsed_records)} records from EventLogFile {log_file_id}")
+            DOWNLOAD_PARSE_SECONDS.observe(time.perf_counter() - started, event_type=event_type)
+            self.enrich_records_with_user_details(parsed_records)
+            return parsed_records
             
-            # Check if content is gzipped and decompress if needed
-            if decoded_content.startswith(b'\x1f\x8b'):  # gzip magic number
-                csv_content = gzip.decompress(decoded_content).decode('utf-8')
+        except Exception as e:
+            logger.error(f"Error processing EventLogFile {eventlog_record.get('Id', 'unknown')}: {e}")
+            if raise_errors:
+                raise
+            return []
+
+    def _fetch_logfile_source(self, eventlog_record):
+        """Return the file's payload bytes from the cache or a download, or the path of a spooled download
+
+        The caller deletes a returned spool path once it is parsed.
+        """
+        log_file_id = eventlog_record['Id']
+        payload = self.payload_cache.get(eventlog_record) if self.payload_cache else None
+        if payload is not None:
+            logger.info(f"Using cached payload for EventLogFile {log_file_id}")
+            return payload
+        
+        if self.config.get('resumable_downloads', False):
+            # Spool to local disk first so a dropped connection only costs the missing bytes
+            spool_path = self._spool_logfile(eventlog_record)
+            self._cache_payload(eventlog_record, path=spool_path)
+            return spool_path
+        
+        # The response content is gzipped CSV data
+        payload = self.call_salesforce(lambda: self._download_logfile(log_file_id)).content
+        self._cache_payload(eventlog_record, payload=payload)
+        return payload
+
+    def _cache_payload(self, eventlog_record, payload=None, path=None):
+        """Keep a downloaded payload in the payload cache; a failed write only costs the cache entry"""
+        if not self.payload_cache:
+            return
+        try:
+            if path is not None:
+                self.payload_cache.put_file(eventlog_record, path)
             else:
-                csv_content = decoded_content.decode('utf-8')
-            
-            # Parse CSV content
-            csv_reader = csv.DictReader(io.StringIO(csv_content))
-            parsed_records = []
-            
-            for row in csv_reader:
-                # Add EventLogFile metadata to each record
-                enriched_record = {
-                    'EventLogFile_Id': log_file_id,
-                    'EventType': event_type,
-                    'LogDate': log_date,
-                    'LogFileLength': eventlog_record.get('LogFileLength'),
-                    'Sequence': eventlog_record.get('Sequence'),
-                    'Interval': eventlog_record.get('Interval'),
-                    'ingestion_timestamp': datetime.now().isoformat(),
-                    'log_file_processed': f"{log_file_id}_{event_type}"
-                }
-                
-                # Add all CSV fields to the record
-                enriched_record.update(row)
+                self.payload_cache.put(eventlog_record, payload)
+        except Exception as e:
+            logger.warning(f"Could not cache the payload of EventLogFile {eventlog_record['Id']}: {e}")
+
+    def _parse_payload(self, payload, eventlog_record, failures):
+        """Parse an in-memory EventLogFile body, in a parse worker process when parse_workers is set"""
+        return self._parse(payload, eventlog_record, failures)
+
+    def _download_logfile(self, log_file_id):
+        """Download the EventLogFile body with the current access token"""
+        # Construct the full URL for downloading the log file
+        download_url = f"{self.sf.base_url}sobjects/EventLogFile/{log_file_id}/LogFile"
+        
+        # Make authenticated request to download the file
+        headers = {
+            'Authorization': f'Bearer {self.sf.session_id}',
+            'Accept-Encoding': 'gzip'
+        }
+        
+        # Shares the pooled keep-alive session simple_salesforce uses for queries
+        response = self.sf.session.get(download_url, headers=headers)
+        response.raise_for_status()
+        return response
+
+    def _open_logfile_range(self, log_file_id, offset):
+        """Open a streaming download of the uncompressed EventLogFile body from byte offset"""
+        download_url = f"{self.sf.base_url}sobjects/EventLogFile/{log_file_id}/LogFile"
+        
+        # Byte ranges only line up with LogFileLength on the uncompressed body
+        headers = {
+            'Authorization': f'Bearer {self.sf.session_id}',
+            'Accept-Encoding': 'identity'
+        }
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+        
+        response = self.sf.session.get(download_url, headers=headers, stream=True)
+        if response.status_code == 416:
+            # Nothing left past offset: the previous attempt already received the whole file
+            return response
+        response.raise_for_status()
+        return response
+
+    def _spool_logfile(self, eventlog_record):
+        """Download an EventLogFile to a temporary file, resuming with HTTP Range after dropped connections"""
+        log_file_id = eventlog_record['Id']
+        expected_bytes = int(float(eventlog_record.get('LogFileLength') or 0))
+        chunk_size = self.config.get('stream_chunk_bytes', 1024 * 1024)
+        max_resumes = self.config.get('download_max_resumes', 5)
+        
+        fd, spool_path = tempfile.mkstemp(dir=self.config.get('spool_dir'), prefix=f'{log_file_id}-', suffix='.csv')
+        try:
+            with os.fdopen(fd, 'wb') as spool:
+                for attempt in range(max_resumes + 1):
+                    offset = spool.tell()
+                    try:
+                        response = self.call_salesforce(lambda: self._open_logfile_range(log_file_id, offset))
+                        with response:
+                            if response.status_code == 416:
+                                break
+                            if offset and response.status_code != 206:
+                                # The server ignored the Range header and sent the whole file again
+                                logger.info(f"Range requests not honoured for EventLogFile {log_file_id}, restarting download")
+                                spool.seek(0)
+                                spool.truncate()
+                            for chunk in response.iter_content(chunk_size=chunk_size):
+                                spool.write(chunk)
+                        break
+                    except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                            requests.exceptions.Timeout) as e:
+                        if attempt >= max_resumes:
+                            raise
+                        logger.warning(f"Download of EventLogFile {log_file_id} interrupted at {spool.tell()} bytes, "
+                                       f"resuming (attempt {attempt + 1}/{max_resumes}): {e}")
                 
-                # Convert timestamp fields to proper format
-                self._convert_timestamp_fields(enriched_record)
+                spooled_bytes = spool.tell()
+            
+            if expected_bytes and spooled_bytes != expected_bytes:
+                raise Exception(f"Spooled {spooled_bytes} bytes for EventLogFile {log_file_id}, expected LogFileLength {expected_bytes}")
+            return spool_path
+        except Exception:
+            os.unlink(spool_path)
+            raise
+
+    def _parse(self, source, eventlog_record, failures):
+        """Parse payload bytes or a spooled file path here or in the parse process pool"""
+        return [record for batch in self._iter_parsed_batches(source, eventlog_record, failures) for record in batch]
+
+    def _iter_parsed_batches(self, source, eventlog_record, failures):
+        """Yield parsed records in batches of stream_batch_records, parsing here or in the parse process pool"""
+        parse_pool = self._get_parse_pool()
+        if parse_pool is None:
+            if isinstance(source, str):
+                records = iter_spooled_records(source, eventlog_record, self.config, failures)
+            else:
+                records = iter_payload_records(source, eventlog_record, self.config, failures)
+            return iter_record_batches(records, self.config.get('stream_batch_records', 5000))
+        
+        future = self._submit_parse(parse_pool, source, eventlog_record)
+        return self._encoded_batches(future.result(), eventlog_record, failures)
+
+    def _submit_parse(self, parse_pool, source, eventlog_record):
+        """Hand a payload or spooled file to a parse worker process"""
+        parse_config = {key: self.config[key] for key in PARSE_CONFIG_KEYS if key in self.config}
+        return parse_pool.submit(parse_in_worker, source, dict(eventlog_record), parse_config)
+
+    def _encoded_batches(self, result, eventlog_record, failures):
+        """Load a parse worker's batch files one at a time as EncodedEventLogRows, deleting each once read"""
+        batches, worker_failures, timings = result
+        failures.update(worker_failures)
+        event_type = eventlog_record['EventType']
+        TIMESTAMP_CONVERSION_SECONDS.observe(timings['conversion'], event_type=event_type)
+        
+        def load():
+            try:
+                for index, (path, _) in enumerate(batches):
+                    with open(path, 'rb') as f:
+                        rows = pickle.load(f)
+                    os.unlink(path)
+                    batches[index] = None
+                    yield [EncodedEventLogRow(doc_id, encoded, event_type, user_id, user_name) for doc_id, encoded, user_id, user_name in rows]
+            finally:
+                # Batches left unread when the consumer stops early
+                for batch in batches:
+                    if batch is not None:
+                        os.unlink(batch[0])
+        
+        return load()
+
+    def _encoded_rows(self, result, eventlog_record, failures):
+        """Wrap a parse worker's result in a list of EncodedEventLogRows"""
+        return [record for batch in self._encoded_batches(result, eventlog_record, failures) for record in batch]
+
+    def _get_parse_pool(self):
+        """Start the parse process pool on first use when parse_workers is set"""
+        workers = self.config.get('parse_workers', 0)
+        if workers <= 0:
+            return None
+        with self.parse_pool_lock:
+            if self.parse_pool is None:
+                # The pool is started from a download thread; forking a threaded process can copy held locks
+                start_method = self.config.get('parse_start_method')
+                if start_method is None:
+                    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                logger.info(f"Starting {workers} EventLogFile parse worker processes ({start_method})")
+                self.parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+            return self.parse_pool
+
+    def close(self):
+        """Stop the parse worker processes and the token refresh"""
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown()
+            self.parse_pool = None
+        self.token_manager.close()
+
+    def _iter_parsed_records(self, lines, eventlog_record, failures, raw_bytes=None):
+        """Yield EventLogRows from CSV lines with the configured parse engine"""
+        return iter_parsed_records(lines, eventlog_record, self.config, failures, raw_bytes=raw_bytes)
+
+    def _open_logfile_stream(self, log_file_id):
+        """Open a streaming download of the EventLogFile body"""
+        download_url = f"{self.sf.base_url}sobjects/EventLogFile/{log_file_id}/LogFile"
+        
+        headers = {
+            'Authorization': f'Bearer {self.sf.session_id}',
+            'Accept-Encoding': 'gzip'
+        }
+        
+        response = self.sf.session.get(download_url, headers=headers, stream=True)
+        response.raise_for_status()
+        return response
+
+    def _iter_logfile_lines(self, response, tee=None):
+        """Yield decoded CSV lines from a streaming EventLogFile response, copying the raw body to tee if given"""
+        chunk_size = self.config.get('stream_chunk_bytes', 1024 * 1024)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        decompressor = None
+        head = b''
+        pending = ''
+        
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if not chunk:
+                continue
+            if tee is not None:
+                tee.write(chunk)
+            
+            # Sniff the gzip magic number before deciding how to decode
+            if head is not None:
+                head += chunk
+                if len(head) < 2:
+                    continue
+                if head.startswith(b'\x1f\x8b'):
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                chunk, head = head, None
+            
+            if decompressor is not None:
+                data = decompressor.decompress(chunk)
+                # Concatenated gzip members: start a new decompressor on the leftovers
+                while decompressor.eof and decompressor.unused_data:
+                    leftover = decompressor.unused_data
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    data += decompressor.decompress(leftover)
+                chunk = data
+            
+            pending += decoder.decode(chunk)
+            lines = pending.split('\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        
+        # Flush whatever is left in the decompressor and decoder
+        tail = head or b''
+        if decompressor is not None:
+            tail = decompressor.decompress(tail) + decompressor.flush()
+        pending += decoder.decode(tail, final=True)
+        for line in pending.split('\n'):
+            if line:
+                yield line + '\n'
+
+    def stream_and_ingest_logfile(self, eventlog_record, raise_errors=False):
+        """Stream an EventLogFile into Elasticsearch in bounded batches"""
+        log_file_id = eventlog_record.get('Id', 'unknown')
+        batch_records = self.config.get('stream_batch_records', 5000)
+        total_parsed = 0
+        total_ingested = 0
+        response = None
+        tee = None
+        started = time.perf_counter()
+        # Enrichment and bulk requests interleave with the download; they are left out of the download/parse time
+        ingest_seconds = 0.0
+        
+        try:
+            logger.info(f"Streaming EventLogFile: {log_file_id} ({eventlog_record['EventType']}) from {eventlog_record['LogDate']}")
+            
+            if not eventlog_record.get('LogFile'):
+                logger.warning(f"No LogFile URL for {log_file_id}")
+                return 0, 0
+            
+            response = self.call_salesforce(lambda: self._open_logfile_stream(log_file_id))
+            if self.payload_cache:
+                # Copy the raw body aside while streaming so it can be cached once complete
+                tee = tempfile.NamedTemporaryFile(dir=self.config.get('spool_dir'), prefix=f'{log_file_id}-', suffix='.csv')
+            
+            batch = []
+            failures = Counter()
+            for record in self._iter_parsed_records(self._iter_logfile_lines(response, tee), eventlog_record, failures):
+                batch.append(record)
                 
-                parsed_records.append(enriched_record)
+                if len(batch) >= batch_records:
+                    ingest_started = time.perf_counter()
+                    self.enrich_records_with_user_details(batch)
+                    total_ingested += self.bulk_ingest_to_elasticsearch(batch, start_index=total_parsed)
+                    ingest_seconds += time.perf_counter() - ingest_started
+                    total_parsed += len(batch)
+                    batch = []
             
-            logger.info(f"Parsed {len(parsed_records)} records from EventLogFile {log_file_id}")
-            return parsed_records
+            if batch:
+                ingest_started = time.perf_counter()
+                self.enrich_records_with_user_details(batch)
+                total_ingested += self.bulk_ingest_to_elasticsearch(batch, start_index=total_parsed)
+                ingest_seconds += time.perf_counter() - ingest_started
+                total_parsed += len(batch)
+            
+            if tee is not None:
+                tee.flush()
+                self._cache_payload(eventlog_record, path=tee.name)
+            
+            self._log_conversion_failures(log_file_id, failures)
+            logger.info(f"Streamed {total_parsed} records from EventLogFile {log_file_id}, {total_ingested} ingested")
+            DOWNLOAD_PARSE_SECONDS.observe(time.perf_counter() - started - ingest_seconds, event_type=eventlog_record['EventType'])
             
         except Exception as e:
-            logger.error(f"Error processing EventLogFile {eventlog_record.get('Id', 'unknown')}: {e}")
-            return []
+            logger.error(f"Error streaming EventLogFile {log_file_id} after {total_parsed} records: {e}")
+            if raise_errors:
+                raise
+            
+        finally:
+            if response is not None:
+                response.close()
+            if tee is not None:
+                tee.close()
+        
+        return total_parsed, total_ingested
 
-    def _convert_timestamp_fields(self, record):
-        """Convert timestamp fields to proper datetime format"""
-        timestamp_fields = ['TIMESTAMP', 'LOGIN_TIME', 'LOGOUT_TIME']
+    def process_eventlog_file(self, eventlog_record):
+        """Download, parse and ingest a single EventLogFile and report the result"""
+        started = time.time()
         
-        for field in timestamp_fields:
-            if field in record and record[field]:
+        try:
+            # Cached payloads are parsed from disk even in streaming mode
+            if self.config.get('streaming_mode', False) and not (self.payload_cache and self.payload_cache.contains(eventlog_record)):
+                # Stream rows straight into Elasticsearch in bounded batches
+                parsed_count, ingested_count = self.stream_and_ingest_logfile(eventlog_record, raise_errors=True)
+            else:
+                parsed_records = self.download_and_parse_logfile(eventlog_record, raise_errors=True)
+                parsed_count = len(parsed_records)
+                ingested_count = self.bulk_ingest_to_elasticsearch(parsed_records) if parsed_records else 0
+        except Exception as e:
+            self.mark_file_failed(eventlog_record, str(e))
+            return self._file_result(eventlog_record, 0, 0, time.time() - started, error=str(e))
+        
+        # Only fully ingested files are checkpointed; anything else goes on the retry list
+        if ingested_count == parsed_count:
+            self.mark_file_processed(eventlog_record)
+        else:
+            self.mark_file_failed(eventlog_record, f"{ingested_count}/{parsed_count} records ingested")
+        
+        return self._file_result(eventlog_record, parsed_count, ingested_count, time.time() - started)
+
+    def _file_result(self, eventlog_record, parsed_count, ingested_count, seconds, error=None):
+        """Build the per-file entry reported in the sync summary and count the file in the metrics"""
+        result = {
+            'Id': eventlog_record.get('Id'),
+            'EventType': eventlog_record.get('EventType'),
+            'LogDate': eventlog_record.get('LogDate'),
+            'bytes': int(eventlog_record.get('LogFileLength') or 0),
+            'parsed': parsed_count,
+            'ingested': ingested_count,
+            'seconds': round(seconds, 3)
+        }
+        if error:
+            result['error'] = error
+        
+        event_type = result['EventType'] or 'unknown'
+        EVENTLOG_FILES.inc(event_type=event_type, outcome='error' if error else 'ingested' if ingested_count == parsed_count else 'partial')
+        EVENTLOG_BYTES.inc(result['bytes'], event_type=event_type)
+        EVENTLOG_RECORDS.inc(parsed_count, event_type=event_type, stage='parsed')
+        EVENTLOG_RECORDS.inc(ingested_count, event_type=event_type, stage='ingested')
+        return result
+
+    def process_eventlog_files(self, eventlog_files):
+        """Process EventLogFiles, concurrently when download_workers > 1"""
+        workers = self.config.get('download_workers', 1)
+        
+        if workers <= 1:
+            return [self.process_eventlog_file(eventlog_file) for eventlog_file in eventlog_files]
+        
+        budget = InflightByteBudget(self.config.get('max_inflight_bytes', 512 * 1024 * 1024))
+        results = []
+        
+        def worker(eventlog_file, nbytes):
+            try:
+                return self.process_eventlog_file(eventlog_file)
+            finally:
+                budget.release(nbytes)
+        
+        logger.info(f"Processing {len(eventlog_files)} EventLogFiles with {workers} workers")
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='eventlog') as executor:
+            futures = {}
+            for eventlog_file in eventlog_files:
+                # Wait for room in the byte budget before starting the next download
+                nbytes = int(eventlog_file.get('LogFileLength') or 0)
+                budget.acquire(nbytes)
+                futures[executor.submit(worker, eventlog_file, nbytes)] = eventlog_file
+            
+            for future in as_completed(futures):
+                eventlog_file = futures[future]
                 try:
-                    # Salesforce timestamps are typically in format: 20231201123045.123
-                    timestamp_str = record[field]
-                    if len(timestamp_str) >= 14:  # YYYYMMDDHHMMSS
-                        # Parse the timestamp
-                        dt = datetime.strptime(timestamp_str[:14], '%Y%m%d%H%M%S')
-                        # Add milliseconds if present
-                        if len(timestamp_str) > 15 and '.' in timestamp_str:
-                            ms_part = timestamp_str.split('.')[1][:3]  # Take first 3 digits
-                            dt = dt.replace(microsecond=int(ms_part.ljust(6, '0')))
-                        
-                        record[field] = dt.isoformat()
+                    results.append(future.result())
                 except Exception as e:
-                    logger.warning(f"Could not parse timestamp field {field}: {record[field]} - {e}")
+                    logger.error(f"Worker failed on EventLogFile {eventlog_file.get('Id', 'unknown')}: {e}")
+                    self.mark_file_failed(eventlog_file, str(e))
+                    results.append(self._file_result(eventlog_file, 0, 0, 0, error=str(e)))
+        
+        return results
 
-    def bulk_ingest_to_elasticsearch(self, records):
-        """Bulk ingest records to Elasticsearch data streams based on event type"""
-        if not records:
-            return 0
+    def process_eventlog_files_staged(self, waves):
+        """Run discover -> download -> parse -> serialize -> index as stages joined by bounded queues"""
+        file_results = []
+        files_found = 0
+        data_streams_used = set()
+        totals, collect = self.bulk_indexer.new_totals()
+        results_lock = threading.Lock()
+        batch_records = self.config.get('stream_batch_records', 5000)
+        
+        def discard_payload(item):
+            # Spooled payloads dropped by a cancelled pipeline are deleted instead of left in spool_dir
+            _, source = item
+            if isinstance(source, str):
+                os.unlink(source)
+        
+        # Each queue is bounded in the unit that costs memory at that point of the pipeline
+        pipeline = Pipeline('eventlog')
+        files = pipeline.queue('files', max_items=self.config.get('pipeline_file_queue_size', 64))
+        payloads = pipeline.queue('payloads', max_bytes=self.config.get('pipeline_payload_queue_bytes', 256 * 1024 * 1024),
+                                  discard=discard_payload)
+        batches = pipeline.queue('batches', max_records=self.config.get('pipeline_batch_queue_records', 50000))
+        chunks = pipeline.queue('chunks', max_bytes=self.config.get('pipeline_chunk_queue_bytes', 64 * 1024 * 1024))
+        
+        def finish(progress, error=None):
+            # Only fully ingested files are checkpointed; anything else goes on the retry list
+            eventlog_record = progress.eventlog_record
+            error = error or progress.error
+            if error is None and progress.ingested == progress.parsed:
+                self.mark_file_processed(eventlog_record)
+            else:
+                self.mark_file_failed(eventlog_record, error or f"{progress.ingested}/{progress.parsed} records ingested")
+            with results_lock:
+                file_results.append(self._file_result(eventlog_record, progress.parsed, progress.ingested, time.time() - progress.started, error=error))
+        
+        def discover(emit):
+            nonlocal files_found
+            for eventlog_files in waves:
+                files_found += len(eventlog_files)
+                for eventlog_file in eventlog_files:
+                    if not emit(eventlog_file):
+                        return
+        
+        def download(eventlog_record, emit):
+            progress = FileProgress(eventlog_record)
+            log_file_id = eventlog_record['Id']
+            logger.info(f"Processing EventLogFile: {log_file_id} ({eventlog_record['EventType']}) from {eventlog_record['LogDate']}")
             
-        try:
-            from elasticsearch.helpers import bulk
+            if not eventlog_record.get('LogFile'):
+                logger.warning(f"No LogFile URL for {log_file_id}")
+                if progress.finish_parsing():
+                    finish(progress)
+                return
             
-            actions = []
-            data_streams_used = set()
+            try:
+                # Spooled files are handed on by path and parsed straight from disk
+                source = self._fetch_logfile_source(eventlog_record)
+            except Exception as e:
+                logger.error(f"Error downloading EventLogFile {log_file_id}: {e}")
+                finish(progress, error=str(e))
+                return
             
-            # Process each record directly
-            for i, record in enumerate(records):
-                # Generate data stream name based on event type
-                event_type = record.get('EventType', 'unknown').lower()
-                data_stream_name = f"sg-salesforce-{event_type}"
-                
-                # Track data streams used
-                data_streams_used.add(data_stream_name)
+            nbytes = os.path.getsize(source) if isinstance(source, str) else len(source)
+            if not emit((progress, source), records=1, nbytes=nbytes) and isinstance(source, str):
+                os.unlink(source)
+        
+        def parse(item, emit):
+            progress, source = item
+            eventlog_record = progress.eventlog_record
+            log_file_id = eventlog_record['Id']
+            failures = Counter()
+            blocked = 0.0
+            start = 0
+            parsed_batches = None
+            try:
+                # Each batch is sent on as soon as it fills, so a file is never held whole in memory
+                parsed_batches = self._iter_parsed_batches(source, eventlog_record, failures)
+                for batch in parsed_batches:
+                    self.enrich_records_with_user_details(batch)
+                    progress.add_parsed(len(batch))
+                    emit_started = time.time()
+                    if not emit((progress, batch, start), records=len(batch)):
+                        return
+                    blocked += time.time() - emit_started
+                    start += len(batch)
+            except Exception as e:
+                # Batches already sent are still indexed; the file is reported with the error and not checkpointed
+                logger.error(f"Error processing EventLogFile {log_file_id}: {e}")
+                progress.error = str(e)
+            finally:
+                if parsed_batches is not None:
+                    parsed_batches.close()
+                if isinstance(source, str):
+                    os.unlink(source)
+            
+            self._log_conversion_failures(log_file_id, failures)
+            logger.info(f"Parsed {progress.parsed} records from EventLogFile {log_file_id}")
+            DOWNLOAD_PARSE_SECONDS.observe(time.time() - progress.started - blocked, event_type=eventlog_record['EventType'])
+            if progress.finish_parsing():
+                finish(progress)
+        
+        def serialize(item, emit):
+            progress, batch, start_index = item
+            emitted = 0
+            try:
+                batch_data_streams = {f"sg-salesforce-{record.get('EventType', 'unknown').lower()}" for record in batch}
+                for data_stream_name in batch_data_streams:
+                    self._ensure_data_stream_exists(data_stream_name)
+                with results_lock:
+                    data_streams_used.update(batch_data_streams)
                 
-                # Create unique hash-based document ID
-                hash_input = f"{record['EventLogFile_Id']}_{record.get('REQUEST_ID', '')}_{record.get('TIMESTAMP', '')}_{i}"
-                doc_id = hashlib.sha256(hash_input.encode('utf-8')).hexdigest()[:16]
+                def generate_actions():
+                    for i, record in enumerate(batch, start_index):
+                        doc_id = getattr(record, 'doc_id', None)
+                        if doc_id is None:
+                            doc_id = DocumentIdGenerator(record['EventLogFile_Id'])(i)
+                        yield {
+                            "_index": f"sg-salesforce-{record.get('EventType', 'unknown').lower()}",
+                            "_id": doc_id,
+                            "_source": record
+                        }
                 
-                action = {
-                    "_index": data_stream_name,
-                    "_id": doc_id,
-                    "_source": record
-                }
-                actions.append(action)
+                for chunk, nbytes in self.bulk_indexer.encode_chunks(generate_actions()):
+                    if not emit((progress, chunk), records=len(chunk), nbytes=nbytes):
+                        return
+                    emitted += len(chunk)
+            except Exception as e:
+                logger.error(f"Error serializing records of EventLogFile {progress.eventlog_record.get('Id', 'unknown')}: {e}")
+                # The rest of the batch counts as sent and failed, so the file is reported and not checkpointed
+                if progress.add_indexed(len(batch) - emitted, 0):
+                    finish(progress)
+        
+        def index(item, emit):
+            progress, chunk = item
+            stats = self.bulk_indexer.index_chunk(chunk)
+            with results_lock:
+                collect(stats)
+            if progress.add_indexed(stats['docs'], stats['success']):
+                finish(progress)
+        
+        pipeline.stage('discover', discover, outbox=files)
+        pipeline.stage('download', download, workers=self.config.get('download_workers', 1), inbox=files, outbox=payloads)
+        pipeline.stage('parse', parse, workers=self.config.get('pipeline_parse_workers', max(self.config.get('parse_workers', 0), 1)), inbox=payloads, outbox=batches)
+        pipeline.stage('serialize', serialize, workers=self.config.get('pipeline_serialize_workers', 1), inbox=batches, outbox=chunks)
+        pipeline.stage('index', index, workers=self.config.get('pipeline_index_workers', self.config.get('bulk_thread_count', 1)), inbox=chunks)
+        pipeline.run()
+        
+        if totals['chunks']:
+            self._report_bulk_stats(totals, data_streams_used)
+        return file_results, files_found, pipeline
+
+    def _log_conversion_failures(self, log_file_id, failures):
+        """Log the timestamp and typed values that could not be converted in a file"""
+        if failures:
+            for field, count in failures.items():
+                CONVERSION_FAILURES.inc(count, field=field)
+            details = ', '.join(f"{field}: {count}" for field, count in sorted(failures.items()))
+            logger.warning(f"Could not convert values in EventLogFile {log_file_id} ({details})")
+
+    def get_organization_name(self):
+        """Name of the connected org, queried once per ingester"""
+        if self.organization_name is None:
+            try:
+                result = self.call_salesforce(lambda: self.sf.query("SELECT Name FROM Organization LIMIT 1"))
+                self.organization_name = result['records'][0]['Name'] if result['records'] else ''
+            except Exception as e:
+                # Not worth retrying on every batch; the rows just go without an org name
+                logger.warning(f"Could not look up the organization name: {e}")
+                self.organization_name = ''
+        return self.organization_name
+
+    def enrich_records_with_user_details(self, records):
+        """Join cached Salesforce User and org names onto EventLogFile rows, one lookup per batch of rows"""
+        if not records or not self.config.get('enrich_user_details', False):
+            return records
+        
+        try:
+            user_ids = {record.get('USER_ID') for record in records}
+            user_ids.discard(None)
+            if self.sf is None:
+                # Replaying from cache never calls Salesforce, so only cached users are joined
+                user_details, _ = self.user_cache.get_many(user_ids)
+                organization_name = self.organization_name
+            else:
+                with USER_LOOKUP_SECONDS.time(ingester='eventlog'):
+                    user_details = self.user_cache.lookup(user_ids, lambda chunk: query_user_details(self, chunk))
+                organization_name = self.get_organization_name()
+            
+            for record in records:
+                details = user_details.get(record.get('USER_ID'))
+                if details:
+                    record['USER_FULL_NAME'] = details['UserName']
+                    # Some event types already log the username themselves
+                    if not record.get('USER_NAME'):
+                        record['USER_NAME'] = details['Username']
+                if organization_name:
+                    record['ORGANIZATION_NAME'] = organization_name
             
-            # Ensure all required data streams exist
-            for data_stream_name in data_streams_used:
-                self._ensure_data_stream_exists(data_stream_name)
+        except Exception as e:
+            logger.error(f"Error enriching EventLogFile records with user details: {e}")
+        return records
+
+    def bulk_ingest_to_elasticsearch(self, records, start_index=0):
+        """Bulk ingest records to Elasticsearch data streams based on event type"""
+        if not records:
+            return 0
             
-            # Perform bulk insert for all records
-            success, failed = bulk(self.es, actions, chunk_size=500, request_timeout=60)
-            failed_count = len(failed) if failed else 0
+        try:
+            data_streams_used = set()
             
-            logger.info(f"Bulk ingested {success} records across {len(data_streams_used)} data streams: {', '.join(sorted(data_streams_used))}")
-            if failed_count > 0:
-                logger.warning(f"Failed to ingest {failed_count} records")
+            def generate_actions():
+                for i, record in enumerate(records, start_index):
+                    # Generate data stream name based on event type
+                    event_type = record.get('EventType', 'unknown').lower()
+                    data_stream_name = f"sg-salesforce-{event_type}"
+                    
+                    # Ensure each data stream exists before its first document is sent
+                    if data_stream_name not in data_streams_used:
+                        data_streams_used.add(data_stream_name)
+                        self._ensure_data_stream_exists(data_stream_name)
+                    
+                    # Parsed rows carry an id derived from the file Id and their ordinal in the file,
+                    # so re-ingesting a file in any batch size overwrites the same documents
+                    doc_id = getattr(record, 'doc_id', None)
+                    if doc_id is None:
+                        doc_id = DocumentIdGenerator(record['EventLogFile_Id'])(i)
+                    
+                    # Rows are encoded by the bulk serializer with their file metadata spliced in
+                    yield {
+                        "_index": data_stream_name,
+                        "_id": doc_id,
+                        "_source": record
+                    }
             
-            return success
+            # Stream the actions through the bulk indexer
+            with BULK_INGEST_SECONDS.time(ingester='eventlog'):
+                stats = self.bulk_indexer.index(generate_actions())
+            return self._report_bulk_stats(stats, data_streams_used)
             
         except Exception as e:
             logger.error(f"Error during bulk ingestion: {e}")
             return 0
 
+    def _report_bulk_stats(self, stats, data_streams_used):
+        """Log a bulk ingestion and return the number of documents indexed"""
+        success = stats['success']
+        observe_bulk_stats('eventlog', stats)
+        
+        # A data stream deleted behind our back has to be checked (and recreated) again
+        for error in stats['errors']:
+            if error.get('type') == 'index_not_found_exception' and error.get('index'):
+                DATA_STREAM_REGISTRY.invalidate(error['index'])
+        
+        logger.info(f"Bulk ingested {success} records across {len(data_streams_used)} data streams: {', '.join(sorted(data_streams_used))} ({summarize_bulk_stats(stats)})")
+        if stats['failed'] > 0:
+            logger.warning(f"Failed to ingest {stats['failed']} records")
+        
+        return success
+
+    def precreate_data_streams(self):
+        """Create the data streams for the configured event types ahead of the first sync"""
+        event_types = self.config.get('event_types', ['API', 'Login', 'Logout', 'URI'])
+        for event_type in event_types:
+            self._ensure_data_stream_exists(f"sg-salesforce-{event_type.lower()}")
+
+    def _data_stream_exists(self, data_stream_name):
+        """Check Elasticsearch for a data stream"""
+        try:
+            response = self.es.indices.get_data_stream(name=data_stream_name)
+            return bool(response.get('data_streams'))
+        except Exception as e:
+            if "index_not_found_exception" in str(e) or getattr(e, 'status_code', None) == 404:
+                return False
+            raise
+
     def _ensure_data_stream_exists(self, data_stream_name):
         """Ensure data stream exists, create if it doesn't"""
+        if DATA_STREAM_REGISTRY.is_known(data_stream_name):
+            return True
+        
         try:
             # Check if data stream exists
-            if self.es.indices.exists_data_stream(name=data_stream_name):
+            if self._data_stream_exists(data_stream_name):
                 logger.debug(f"Data stream {data_stream_name} already exists")
+                DATA_STREAM_REGISTRY.add(data_stream_name)
                 return True
             
             # Create data stream with basic template
@@ -401,10 +1837,7 @@ class SalesforceEventLogFileIngester:
                             "@timestamp": {
                                 "type": "date"
                             },
-                            "TIMESTAMP": {
-                                "type": "date",
-                                "format": "yyyy-MM-dd'T'HH:mm:ss.SSS'Z'||yyyy-MM-dd'T'HH:mm:ss'Z'||epoch_millis"
-                            },
+                            **{field: TIMESTAMP_FIELD_MAPPING for field in TIMESTAMP_FIELDS},
                             "EventType": {
                                 "type": "keyword"
                             },
@@ -416,6 +1849,25 @@ class SalesforceEventLogFileIngester:
                             },
                             "ORGANIZATION_ID": {
                                 "type": "keyword"
+                            },
+                            "USER_FULL_NAME": {
+                                "type": "text",
+                                "fields": {"keyword": {"type": "keyword"}}
+                            },
+                            "ORGANIZATION_NAME": {
+                                "type": "keyword"
+                            },
+                            "EventLogFile_Id": {
+                                "type": "keyword"
+                            },
+                            "log_file_processed": {
+                                "type": "keyword"
+                            },
+                            "LogFileLength": {
+                                "type": "long"
+                            },
+                            "Sequence": {
+                                "type": "long"
                             }
                         }
                     }
@@ -424,13 +1876,20 @@ class SalesforceEventLogFileIngester:
             }
             
             # Create the index template
-            self.es.indices.put_index_template(name=template_name, body=template_body)
-            logger.info(f"Created index template {template_name}")
+            if template_name not in DATA_STREAM_REGISTRY.templates:
+                self.es.indices.put_index_template(name=template_name, body=template_body)
+                logger.info(f"Created index template {template_name}")
             
             # Create the data stream
-            self.es.indices.create_data_stream(name=data_stream_name)
-            logger.info(f"Created data stream {data_stream_name}")
+            try:
+                self.es.indices.create_data_stream(name=data_stream_name)
+                logger.info(f"Created data stream {data_stream_name}")
+            except Exception as e:
+                # Another worker may have created it first
+                if "resource_already_exists_exception" not in str(e):
+                    raise
             
+            DATA_STREAM_REGISTRY.add(data_stream_name, template_name)
             return True
             
         except Exception as e:
@@ -472,30 +1931,134 @@ class SalesforceEventLogFileIngester:
         except Exception as e:
             logger.warning(f"Could not retrieve data stream stats: {e}")
 
+    def summarize_sync(self, file_results, files_found, started):
+        """Record and log the totals of a sync cycle"""
+        total_ingested = sum(result['ingested'] for result in file_results)
+        total_parsed = sum(result['parsed'] for result in file_results)
+        total_bytes = sum(result['bytes'] for result in file_results)
+        elapsed = time.time() - started
+        
+        self.last_sync_summary = {
+            'files': files_found,
+            'parsed': total_parsed,
+            'ingested': total_ingested,
+            'bytes': total_bytes,
+            'seconds': round(elapsed, 3),
+            'file_results': file_results
+        }
+        
+        for result in file_results:
+            if result.get('error') or result['ingested'] < result['parsed']:
+                logger.warning(f"EventLogFile {result['Id']} ({result['EventType']}): {result['ingested']}/{result['parsed']} records ingested {result.get('error', '')}")
+        
+        logger.info(f"Sync completed: {total_ingested} total records ingested from {files_found} EventLogFiles "
+                    f"({total_bytes / (1024 * 1024):.2f} MB in {elapsed:.1f}s)")
+
+    def iter_eventlog_file_waves(self):
+        """Yield the new EventLogFiles of each discovery wave, setting caught_up once discovery stops"""
+        batch_size = self.config.get('batch_size', 100)
+        backlog_mode = self.config.get('backlog_mode', False)
+        max_waves = self.config.get('max_waves_per_cycle', 24) if backlog_mode else 1
+        self.caught_up = True
+        
+        if self.checkpoint_store:
+            # Files still in flight when the last cycle stopped are queried again from the keyset positions
+            with self.checkpoint_lock:
+                self.log_date_frontier.reset()
+                self.created_frontier.reset()
+        self.prune_processed_files()
+        
+        if self.checkpoint_store:
+            # Never skipped: these files are on the retry list because they were not completely ingested
+            retry_files = self.fetch_retry_eventlog_files()
+            if retry_files:
+                logger.info(f"Retrying {len(retry_files)} EventLogFiles that were not fully ingested")
+                yield retry_files
+            
+            log_date_position = self.log_date_frontier.position
+            if log_date_position:
+                for eventlog_files in self._iter_late_eventlog_files(log_date_position, batch_size, max_waves):
+                    yield eventlog_files
+        
+        cursor = None
+        for wave in range(max_waves):
+            # Fetch EventLogFile records
+            eventlog_files = self.fetch_eventlog_files(after=cursor)
+            page_full = len(eventlog_files) >= batch_size
+            if eventlog_files:
+                cursor = (eventlog_files[-1]['LogDate'], eventlog_files[-1]['Id'])
+            if self.checkpoint_store:
+                with self.checkpoint_lock:
+                    for eventlog_file in eventlog_files:
+                        self.log_date_frontier.track(eventlog_file['LogDate'], eventlog_file['Id'])
+            
+            if self.config.get('skip_ingested_files', True):
+                eventlog_files = self.skip_ingested_files(eventlog_files)
+            
+            if eventlog_files:
+                if backlog_mode:
+                    logger.info(f"Backlog wave {wave + 1}: processing {len(eventlog_files)} EventLogFiles")
+                yield eventlog_files
+            
+            # A short page means everything pending has been seen
+            if not page_full:
+                break
+        else:
+            self.caught_up = not backlog_mode
+            if backlog_mode:
+                logger.info(f"Backlog not drained after {max_waves} waves")
+
+    def _iter_late_eventlog_files(self, log_date_position, batch_size, max_waves):
+        """Yield the late files behind the LogDate keyset, paging by (CreatedDate, Id)"""
+        cursor = None
+        for wave in range(max_waves):
+            late_files = self.fetch_late_eventlog_files(log_date_position, after=cursor)
+            page_full = len(late_files) >= batch_size
+            if late_files:
+                cursor = (late_files[-1]['CreatedDate'], late_files[-1]['Id'])
+            
+            with self.checkpoint_lock:
+                retry_ids = set(self.checkpoint['retry'])
+                for eventlog_file in late_files:
+                    self.created_frontier.track(eventlog_file['CreatedDate'], eventlog_file['Id'])
+            # Files on the retry list are fetched by Id
+            self._settle_files([eventlog_file['Id'] for eventlog_file in late_files if eventlog_file['Id'] in retry_ids], ingested=False)
+            
+            # Most rows are files the LogDate keyset already ingested, so these are always skipped
+            late_files = self.skip_ingested_files([eventlog_file for eventlog_file in late_files if eventlog_file['Id'] not in retry_ids])
+            if late_files:
+                logger.info(f"Processing {len(late_files)} EventLogFiles published after their LogDate was ingested")
+                yield late_files
+            
+            if not page_full:
+                return
+        self.caught_up = False
+
     def run_single_sync(self):
         """Run a single synchronization cycle"""
         try:
-            # Reconnect to Salesforce if needed (token might expire)
-            if not self.sf or not self.connect_to_salesforce():
+            # Reuses the cached access token; only re-authenticates when it is missing or near expiry
+            if not self.connect_to_salesforce():
                 logger.error("Failed to connect to Salesforce")
                 return False
             
-            # Fetch EventLogFile records
-            eventlog_files = self.fetch_eventlog_files()
+            started = time.time()
+            pipeline = None
             
-            if eventlog_files:
-                total_ingested = 0
-                
-                for eventlog_file in eventlog_files:
-                    # Download and parse each EventLogFile
-                    parsed_records = self.download_and_parse_logfile(eventlog_file)
-                    
-                    if parsed_records:
-                        # Ingest to Elasticsearch
-                        ingested_count = self.bulk_ingest_to_elasticsearch(parsed_records)
-                        total_ingested += ingested_count
-                
-                logger.info(f"Sync completed: {total_ingested} total records ingested from {len(eventlog_files)} EventLogFiles")
+            if self.config.get('staged_pipeline', False):
+                # Discovery, downloads, parsing, serialization and indexing overlap across files
+                file_results, files_found, pipeline = self.process_eventlog_files_staged(self.iter_eventlog_file_waves())
+            else:
+                file_results = []
+                files_found = 0
+                for eventlog_files in self.iter_eventlog_file_waves():
+                    files_found += len(eventlog_files)
+                    file_results.extend(self.process_eventlog_files(eventlog_files))
+            
+            if file_results:
+                self.summarize_sync(file_results, files_found, started)
+                if pipeline is not None:
+                    self.last_sync_summary['pipeline'] = pipeline.log_report()
                 
                 # Show index stats after ingestion
                 self.get_index_stats()
@@ -508,9 +2071,37 @@ class SalesforceEventLogFileIngester:
             logger.error(f"Error during sync cycle: {e}")
             return False
 
+    def run_replay(self):
+        """Re-ingest the EventLogFiles in the payload cache without calling Salesforce"""
+        if not self.payload_cache:
+            logger.error("Replay from cache needs payload_cache_dir to be configured")
+            return False
+        
+        if not self.setup_elasticsearch():
+            logger.error("Failed to setup Elasticsearch. Exiting.")
+            return False
+        
+        eventlog_files = self.payload_cache.records(
+            event_types=self.config.get('event_types', ['API', 'Login', 'Logout', 'URI']),
+            since=self.config.get('replay_since'),
+            until=self.config.get('replay_until')
+        )
+        logger.info(f"Replaying {len(eventlog_files)} cached EventLogFiles")
+        
+        started = time.time()
+        try:
+            file_results = self.process_eventlog_files(eventlog_files)
+        finally:
+            self.close()
+        if file_results:
+            self.summarize_sync(file_results, len(eventlog_files), started)
+            self.get_index_stats()
+        return True
+
     def run_continuous(self):
         """Run continuous ingestion"""
         logger.info("Starting continuous Salesforce EventLogFile ingestion...")
+        start_metrics_server(self.config)
         
         # Initial setup
         if not self.setup_elasticsearch():
@@ -532,6 +2123,7 @@ class SalesforceEventLogFileIngester:
                 
                 while retry_count < max_retries and not success:
                     success = self.run_single_sync()
+                    observe_sync('eventlog', success)
                     if not success:
                         retry_count += 1
                         if retry_count < max_retries:
@@ -540,12 +2132,17 @@ class SalesforceEventLogFileIngester:
                 
                 if not success:
                     logger.error(f"Sync failed after {max_retries} attempts")
+                elif not self.caught_up:
+                    # Keep draining the backlog instead of waiting for the next interval
+                    logger.info("EventLogFile backlog remaining, starting next sync cycle immediately")
+                    continue
                 
                 logger.info(f"Waiting {sync_interval} minutes until next sync...")
                 time.sleep(sync_interval * 60)
                 
             except KeyboardInterrupt:
                 logger.info("Received interrupt signal. Stopping continuous ingestion...")
+                self.close()
                 break
             except Exception as e:
                 logger.error(f"Unexpected error in continuous loop: {e}")
@@ -568,12 +2165,83 @@ YOUR_PRIVATE_KEY_CONTENT_HERE
         'batch_size': 100,                      # Max EventLogFiles per sync
         'max_retries': 3,                       # Max retry attempts per sync
         'initial_lookback_hours': 24,           # How far back to look on first run (hours)
-        'event_types': ['API', 'Login', 'Logout', 'URI']  # EventLogFile types to process
+        'event_types': ['API', 'Login', 'Logout', 'URI'],  # EventLogFile types to process
+        'streaming_mode': False,                # Stream large files instead of loading them into memory
+        'stream_chunk_bytes': 1024 * 1024,      # HTTP read size when streaming
+        'stream_batch_records': 5000,           # Records per bulk request when streaming
+        'download_workers': 1,                  # EventLogFiles processed concurrently
+        'max_inflight_bytes': 512 * 1024 * 1024,  # Cap on LogFileLength bytes being processed at once
+        'bulk_chunk_size': 500,                 # Max documents per bulk request
+        'bulk_max_chunk_bytes': 10 * 1024 * 1024,  # Max bytes per bulk request
+        'bulk_thread_count': 4,                 # Bulk requests sent concurrently
+        'bulk_adaptive': True,                  # Retry 429s and tune chunk size/concurrency to backpressure
+        'bulk_max_retries': 5,                  # Retries for rejected bulk items
+        'bulk_max_thread_count': 8,             # Upper bound for adaptive bulk concurrency
+        'bulk_serializer': 'auto',              # 'orjson', 'json' or 'auto' (orjson when installed)
+        'precreate_data_streams': True,         # Create data streams for event_types at startup
+        'checkpoint_backend': 'elasticsearch',  # 'file', 'elasticsearch' or None to resume from max(LogDate)
+        'checkpoint_path': 'salesforce_checkpoints.json',  # Used by the 'file' backend
+        'checkpoint_index': 'salesforce-ingest-checkpoints',  # Used by the 'elasticsearch' backend
+        'checkpoint_lookback_hours': 24,        # CreatedDate window searched for late EventLogFiles on the first run
+        'max_file_attempts': 5,                 # Cycles a failing EventLogFile is retried before it is given up
+        'max_retry_files': 200,                 # Cap on EventLogFiles kept on the checkpoint's retry list
+        'skip_ingested_files': True,            # Skip files whose Id/LogFileLength/Sequence were already ingested
+        'dedup_lookback_hours': 48,             # LogDate window loaded into the processed-file index at startup
+        'backlog_mode': False,                  # Page through all pending EventLogFiles each cycle
+        'max_waves_per_cycle': 24,              # Pages of batch_size files processed per cycle in backlog mode
+        'parse_engine': 'dict',                 # 'dict' (csv.reader rows, strings) or 'columnar' (typed by LogFileFieldTypes)
+        'columnar_backend': 'pyarrow',          # Used for in-memory files when pyarrow is installed
+        'columnar_batch_rows': 10000,           # Rows per typed column batch
+        'parse_workers': 0,                     # Parse worker processes (0 parses in the download threads); e.g. vCPUs - 1
+        'parse_start_method': None,             # Parse worker start method; 'forkserver' where available, else 'spawn'
+        'async_engine': False,                  # Run the asyncio engine (needs aiohttp and elasticsearch[async])
+        'async_download_concurrency': 16,       # Downloads in flight in the asyncio engine
+        'async_index_concurrency': 2,           # Files bulk indexed concurrently in the asyncio engine
+        'async_download_queue_size': 64,        # Discovered EventLogFiles waiting for a download slot
+        'async_index_queue_size': 8,            # Parsed files waiting to be bulk indexed
+        'staged_pipeline': False,               # Run cycles as discover/download/parse/serialize/index stages joined by bounded queues
+        'pipeline_file_queue_size': 64,         # Discovered EventLogFiles waiting for a download worker
+        'pipeline_payload_queue_bytes': 256 * 1024 * 1024,  # Downloaded payload bytes waiting to be parsed
+        'pipeline_batch_queue_records': 50000,  # Parsed records waiting to be serialized (in batches of stream_batch_records)
+        'pipeline_chunk_queue_bytes': 64 * 1024 * 1024,  # Encoded bulk bodies waiting to be sent
+        'pipeline_parse_workers': 1,            # Parse stage threads (each hands files to the parse worker processes)
+        'pipeline_serialize_workers': 1,        # Bulk body encoding threads
+        'pipeline_index_workers': 4,            # Bulk requests in flight from the index stage
+        'token_lifetime_minutes': 110,          # Reuse an access token this long (keep below the org session timeout)
+        'token_refresh_ahead_seconds': 300,     # Refresh the token in the background this long before it expires
+        'token_background_refresh': True,       # Refresh ahead in a background thread instead of on the next call
+        'http_pool_size': 10,                   # Keep-alive connections per Salesforce host (at least download_workers)
+        'http_max_retries': 3,                  # Retries for connection errors and 5xx responses on GETs
+        'http_connect_timeout_seconds': 10,     # Timeout for opening a connection
+        'http_read_timeout_seconds': 300,       # Timeout between bytes received from Salesforce
+        'resumable_downloads': False,           # Spool files to disk and resume dropped downloads with HTTP Range
+        'spool_dir': None,                      # Directory for spooled downloads and parse worker batches (system temp dir by default)
+        'download_max_resumes': 5,              # Range resumes attempted per file before giving up
+        'payload_cache_dir': None,              # Keep raw gzipped payloads here for re-indexing (None disables the cache)
+        'payload_cache_max_bytes': 20 * 1024 * 1024 * 1024,  # Least recently used payloads are evicted beyond this
+        'replay_from_cache': False,             # Re-ingest cached payloads once instead of syncing from Salesforce
+        'replay_since': None,                   # Optional LogDate range replayed, e.g. '2024-01-01' to '2024-01-02'
+        'replay_until': None,
+        'enrich_user_details': True,            # Add USER_FULL_NAME/USER_NAME and ORGANIZATION_NAME from cached lookups
+        'user_cache_ttl_minutes': 24 * 60,      # How long looked-up User names are reused
+        'user_cache_path': None,                # Optional JSON file keeping the user cache across restarts
+        'user_lookup_chunk_size': 200,          # User Ids per SOQL IN-list
+        'metrics_port': None,                   # Serve Prometheus metrics on this port at /metrics with prometheus_client (None disables metrics)
+        'metrics_host': '0.0.0.0'               # Interface the metrics endpoint listens on
     }
     
     # Create and run ingester
+    if CONFIG['async_engine']:
+        import asyncio
+        from salesforce_eventlog_async import AsyncEventLogFileIngester
+        asyncio.run(AsyncEventLogFileIngester(CONFIG).run_continuous_async())
+        return
+    
     ingester = SalesforceEventLogFileIngester(CONFIG)
-    ingester.run_continuous()
+    if CONFIG['replay_from_cache']:
+        ingester.run_replay()
+    else:
+        ingester.run_continuous()
 
 if __name__ == "__main__":
     main()
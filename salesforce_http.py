@@ -0,0 +1,49 @@
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """Connection-pooling adapter that applies a default timeout to every request"""
+    def __init__(self, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        # simple_salesforce never passes a timeout, so fill in ours when the caller didn't
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+def http_timeout(config):
+    """(connect, read) timeout in seconds for Salesforce HTTP requests"""
+    return (config.get('http_connect_timeout_seconds', 10), config.get('http_read_timeout_seconds', 300))
+
+def create_http_session(config):
+    """Build a keep-alive requests.Session with a bounded connection pool, retries and timeouts"""
+    # Every concurrent download needs its own connection to the instance to avoid new handshakes
+    pool_size = config.get('http_pool_size', max(config.get('download_workers', 1), 10))
+    retries = Retry(
+        total=config.get('http_max_retries', 3),
+        backoff_factor=config.get('http_retry_backoff_seconds', 1.0),
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(('GET', 'HEAD')),
+        raise_on_status=False
+    )
+    adapter = TimeoutHTTPAdapter(
+        timeout=http_timeout(config),
+        pool_connections=config.get('http_pool_connections', 4),
+        pool_maxsize=pool_size,
+        pool_block=config.get('http_pool_block', True),
+        max_retries=retries
+    )
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not config.get('http_keep_alive', True):
+        session.headers['Connection'] = 'close'
+    logger.debug(f"Created Salesforce HTTP session with a pool of {pool_size} connections per host")
+    return session
@@ -0,0 +1,198 @@
+import time
+import logging
+import threading
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+# Recording is a single attribute check until a metrics server is started
+_NULL_TIMER = contextlib.nullcontext()
+
+# Seconds, from a fast bulk request up to a multi-minute EventLogFile download
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+class MetricsRegistry:
+    """Process-wide metric declarations, backed by prometheus_client collectors once enabled"""
+    def __init__(self):
+        self.enabled = False
+        self.metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def bind(self, prometheus_client):
+        """Create the prometheus_client collectors in a registry of their own and return it"""
+        collector_registry = prometheus_client.CollectorRegistry()
+        for metric in self.metrics:
+            metric.bind(prometheus_client, collector_registry)
+        return collector_registry
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames, **options):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.options = options
+        self.collector = None
+
+    def bind(self, prometheus_client, collector_registry):
+        factory = getattr(prometheus_client, self.kind)
+        self.collector = factory(self.name, self.documentation, self.labelnames, registry=collector_registry, **self.options)
+
+    def _child(self, labels):
+        return self.collector.labels(**labels) if self.labelnames else self.collector
+
+class Counter(Metric):
+    kind = 'Counter'
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        self._child(labels).inc(amount)
+
+class Gauge(Metric):
+    kind = 'Gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.highest = {}
+        self.lock = threading.Lock()
+
+    def set(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        self._child(labels).set(value)
+
+    def set_max(self, value, **labels):
+        """Raise the gauge to value, never lowering it"""
+        if not self.registry.enabled:
+            return
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            if value > self.highest.get(key, float('-inf')):
+                self.highest[key] = value
+                self._child(labels).set(value)
+
+class Histogram(Metric):
+    kind = 'Histogram'
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        self._child(labels).observe(value)
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block"""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return self._child(labels).time()
+
+REGISTRY = MetricsRegistry()
+
+# Salesforce API and authentication
+SALESFORCE_API_CALLS = REGISTRY.counter('salesforce_api_calls_total', 'Salesforce REST calls made through call_salesforce', ('ingester', 'outcome'))
+SALESFORCE_AUTH_RETRIES = REGISTRY.counter('salesforce_auth_retries_total', 'Salesforce calls retried after the access token was rejected', ('ingester',))
+AUTH_SECONDS = REGISTRY.histogram('salesforce_auth_seconds', 'Time to obtain an access token with the JWT bearer flow', ('outcome',))
+AUTH_INVALIDATIONS = REGISTRY.counter('salesforce_auth_invalidations_total', 'Access tokens discarded after Salesforce rejected them')
+
+# EventLogFile downloads and parsing
+EVENTLOG_FILES = REGISTRY.counter('salesforce_eventlog_files_total', 'EventLogFiles processed', ('event_type', 'outcome'))
+EVENTLOG_BYTES = REGISTRY.counter('salesforce_eventlog_bytes_total', 'LogFileLength bytes of processed EventLogFiles', ('event_type',))
+EVENTLOG_RECORDS = REGISTRY.counter('salesforce_eventlog_records_total', 'EventLogFile rows parsed and ingested', ('event_type', 'stage'))
+DOWNLOAD_PARSE_SECONDS = REGISTRY.histogram('salesforce_eventlog_download_parse_seconds', 'Time to download and parse one EventLogFile', ('event_type',))
+TIMESTAMP_CONVERSION_SECONDS = REGISTRY.histogram('salesforce_timestamp_conversion_seconds', 'Time to convert the timestamp and typed fields of one EventLogFile', ('event_type',))
+CONVERSION_FAILURES = REGISTRY.counter('salesforce_conversion_failures_total', 'EventLogFile values that could not be converted', ('field',))
+
+# Elasticsearch bulk ingestion
+BULK_INGEST_SECONDS = REGISTRY.histogram('salesforce_bulk_ingest_seconds', 'Time to bulk ingest one batch of records', ('ingester',))
+BULK_REQUEST_SECONDS = REGISTRY.histogram('salesforce_bulk_request_seconds', 'Latency of bulk requests including retries of rejected items', ('ingester',))
+BULK_DOCUMENTS = REGISTRY.counter('salesforce_bulk_documents_total', 'Bulk items by outcome; rejected items were pushed back by Elasticsearch', ('ingester', 'outcome'))
+
+# User enrichment
+USER_LOOKUP_SECONDS = REGISTRY.histogram('salesforce_user_lookup_seconds', 'Time to resolve the user details of one batch of records', ('ingester',))
+USER_CACHE_LOOKUPS = REGISTRY.counter('salesforce_user_cache_lookups_total', 'User Ids resolved from the cache or Salesforce', ('outcome',))
+
+# Progress; lag behind Salesforce is time() minus the last ingested event timestamp
+LAST_EVENT_TIMESTAMP = REGISTRY.gauge('salesforce_last_ingested_event_timestamp_seconds', 'LogDate of the newest fully ingested EventLogFile, or the LoginHistory high-water LoginTime', ('ingester', 'event_type'))
+SYNC_CYCLES = REGISTRY.counter('salesforce_sync_cycles_total', 'Sync cycles run', ('ingester', 'outcome'))
+LAST_SUCCESSFUL_SYNC = REGISTRY.gauge('salesforce_last_successful_sync_timestamp_seconds', 'When the last sync cycle succeeded', ('ingester',))
+
+# Staged pipeline
+PIPELINE_STAGE_RECORDS = REGISTRY.counter('salesforce_pipeline_stage_records_total', 'Records emitted by each pipeline stage', ('pipeline', 'stage'))
+PIPELINE_STAGE_WAIT_SECONDS = REGISTRY.counter('salesforce_pipeline_stage_wait_seconds_total', 'Time pipeline stages spent waiting for input or blocked on output', ('pipeline', 'stage', 'direction'))
+PIPELINE_QUEUE_PEAK_ITEMS = REGISTRY.gauge('salesforce_pipeline_queue_peak_items', 'Peak depth of each pipeline queue in the last cycle', ('pipeline', 'queue'))
+
+def observe_bulk_stats(ingester, stats):
+    """Record the request latencies and item outcomes of one BulkIndexer.index() result"""
+    if not REGISTRY.enabled:
+        return
+    for chunk in stats['chunks']:
+        BULK_REQUEST_SECONDS.observe(chunk['latency'], ingester=ingester)
+    BULK_DOCUMENTS.inc(stats['success'], ingester=ingester, outcome='success')
+    BULK_DOCUMENTS.inc(stats['failed'], ingester=ingester, outcome='failed')
+    BULK_DOCUMENTS.inc(stats['rejected'], ingester=ingester, outcome='rejected')
+    BULK_DOCUMENTS.inc(stats['retries'], ingester=ingester, outcome='retried')
+
+def count_salesforce_call(call, ingester):
+    """Run a Salesforce call, counting it by outcome"""
+    if not REGISTRY.enabled:
+        return call()
+    try:
+        result = call()
+    except Exception:
+        SALESFORCE_API_CALLS.inc(ingester=ingester, outcome='error')
+        raise
+    SALESFORCE_API_CALLS.inc(ingester=ingester, outcome='success')
+    return result
+
+def observe_sync(ingester, success):
+    """Count a sync cycle and remember when one last succeeded"""
+    SYNC_CYCLES.inc(ingester=ingester, outcome='success' if success else 'failure')
+    if success:
+        LAST_SUCCESSFUL_SYNC.set(time.time(), ingester=ingester)
+
+def observe_pipeline_report(name, report):
+    """Record the stage throughput and queue depth of one Pipeline.report()"""
+    if not REGISTRY.enabled:
+        return
+    for stage_name, stage in report['stages'].items():
+        PIPELINE_STAGE_RECORDS.inc(stage['records_out'], pipeline=name, stage=stage_name)
+        PIPELINE_STAGE_WAIT_SECONDS.inc(stage['wait_in_seconds'], pipeline=name, stage=stage_name, direction='input')
+        PIPELINE_STAGE_WAIT_SECONDS.inc(stage['wait_out_seconds'], pipeline=name, stage=stage_name, direction='output')
+    for queue_name, stage_queue in report['queues'].items():
+        PIPELINE_QUEUE_PEAK_ITEMS.set(stage_queue['peak_items'], pipeline=name, queue=queue_name)
+
+_SERVER = None
+_SERVER_LOCK = threading.Lock()
+
+def start_metrics_server(config):
+    """Enable recording and serve /metrics on metrics_port, once per process; None when metrics_port is unset"""
+    global _SERVER
+    port = config.get('metrics_port')
+    if not port:
+        return None
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            try:
+                import prometheus_client
+            except ImportError:
+                logger.error("metrics_port is set but prometheus_client is not installed; metrics are disabled")
+                return None
+            host = config.get('metrics_host', '0.0.0.0')
+            _SERVER, _ = prometheus_client.start_http_server(port, addr=host, registry=REGISTRY.bind(prometheus_client))
+            REGISTRY.enabled = True
+            logger.info(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+        return _SERVER
@@ -0,0 +1,199 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from salesforce_checkpoint import eventlog_file_version
+
+logger = logging.getLogger(__name__)
+
+class PayloadCache:
+    """Local cache of raw gzipped EventLogFile payloads keyed by EventLogFile Id, evicted LRU by size"""
+    def __init__(self, directory, max_bytes, compress_level=6):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        # EventLogFile Id -> cache entry, least recently used first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _payload_path(self, log_file_id):
+        return os.path.join(self.directory, f"{log_file_id}.csv.gz")
+
+    def _entry_path(self, log_file_id):
+        return os.path.join(self.directory, f"{log_file_id}.json")
+
+    def _load_index(self):
+        """Rebuild the in-memory index from the entry files left by earlier runs"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                entry['size'] = os.path.getsize(self._payload_path(entry['record']['Id']))
+                entries.append(entry)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable payload cache entry {name}: {e}")
+
+        for entry in sorted(entries, key=lambda entry: entry['last_used']):
+            self.entries[entry['record']['Id']] = entry
+            self.total_bytes += entry['size']
+        logger.info(f"Payload cache holds {len(self.entries)} EventLogFiles ({self.total_bytes / (1024 * 1024):.2f} MB)")
+
+    def contains(self, eventlog_record):
+        """Whether this exact version of the file is cached"""
+        entry = self.entries.get(eventlog_record['Id'])
+        return entry is not None and tuple(entry['version']) == eventlog_file_version(eventlog_record.get('LogFileLength'), eventlog_record.get('Sequence'))
+
+    def get(self, eventlog_record):
+        """Return the cached gzipped payload for this version of the file, or None"""
+        log_file_id = eventlog_record['Id']
+        with self.lock:
+            if not self.contains(eventlog_record):
+                return None
+            entry = self.entries[log_file_id]
+            self.entries.move_to_end(log_file_id)
+            entry['last_used'] = time.time()
+
+        try:
+            with open(self._payload_path(log_file_id), 'rb') as f:
+                payload = f.read()
+        except OSError as e:
+            logger.warning(f"Cached payload for EventLogFile {log_file_id} is unreadable: {e}")
+            self.remove(log_file_id)
+            return None
+
+        if hashlib.sha256(payload).hexdigest() != entry['sha256']:
+            logger.warning(f"Cached payload for EventLogFile {log_file_id} is corrupt, discarding it")
+            self.remove(log_file_id)
+            return None
+
+        # Only the recency changes; losing it on a crash just makes the entry look older
+        self._write_entry(entry)
+        return payload
+
+    def put(self, eventlog_record, payload):
+        """Cache a downloaded payload, gzipping it first if Salesforce sent it uncompressed"""
+        if payload[:2] != b'\x1f\x8b':
+            payload = gzip.compress(payload, compresslevel=self.compress_level)
+        self._store(eventlog_record, lambda f: f.write(payload))
+
+    def put_file(self, eventlog_record, path):
+        """Cache a payload spooled to disk without reading it into memory"""
+        with open(path, 'rb') as source:
+            gzipped = source.read(2) == b'\x1f\x8b'
+
+        def write(f):
+            with open(path, 'rb') as source:
+                if gzipped:
+                    shutil.copyfileobj(source, f)
+                else:
+                    with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=self.compress_level) as compressed:
+                        shutil.copyfileobj(source, compressed)
+
+        self._store(eventlog_record, write)
+
+    def _store(self, eventlog_record, write):
+        log_file_id = eventlog_record['Id']
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.payload-')
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as f:
+                write(_DigestWriter(f, digest))
+            os.replace(tmp_path, self._payload_path(log_file_id))
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+        entry = {
+            'record': {key: value for key, value in eventlog_record.items() if key != 'attributes'},
+            'version': eventlog_file_version(eventlog_record.get('LogFileLength'), eventlog_record.get('Sequence')),
+            'sha256': digest.hexdigest(),
+            'size': os.path.getsize(self._payload_path(log_file_id)),
+            'last_used': time.time()
+        }
+        try:
+            self._write_entry(entry)
+        except Exception:
+            # A payload without its entry would never be found or evicted
+            self.remove(log_file_id)
+            raise
+
+        with self.lock:
+            previous = self.entries.pop(log_file_id, None)
+            if previous:
+                self.total_bytes -= previous['size']
+            self.entries[log_file_id] = entry
+            self.total_bytes += entry['size']
+        self._evict()
+
+    def _write_entry(self, entry):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.entry-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._entry_path(entry['record']['Id']))
+
+    def _evict(self):
+        """Drop least recently used payloads until the cache fits in max_bytes"""
+        while True:
+            with self.lock:
+                # The newest entry is kept even when it alone exceeds the limit
+                if self.total_bytes <= self.max_bytes or len(self.entries) <= 1:
+                    return
+                log_file_id = next(iter(self.entries))
+            logger.debug(f"Evicting EventLogFile {log_file_id} from the payload cache")
+            self.remove(log_file_id)
+
+    def remove(self, log_file_id):
+        with self.lock:
+            entry = self.entries.pop(log_file_id, None)
+            if entry:
+                self.total_bytes -= entry['size']
+        for path in (self._entry_path(log_file_id), self._payload_path(log_file_id)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def records(self, event_types=None, since=None, until=None):
+        """Cached EventLogFile records in LogDate order, optionally limited to event types and a LogDate range"""
+        with self.lock:
+            records = [entry['record'] for entry in self.entries.values()]
+        if event_types:
+            records = [record for record in records if record['EventType'] in event_types]
+        if since:
+            records = [record for record in records if record['LogDate'] >= since]
+        if until:
+            records = [record for record in records if record['LogDate'] < until]
+        return sorted(records, key=lambda record: (record['LogDate'], record['Id']))
+
+class _DigestWriter:
+    """File wrapper hashing everything written through it"""
+    def __init__(self, f, digest):
+        self.f = f
+        self.digest = digest
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+def create_payload_cache(config):
+    """Build the payload cache when payload_cache_dir is configured, otherwise None"""
+    directory = config.get('payload_cache_dir')
+    if not directory:
+        return None
+    max_bytes = config.get('payload_cache_max_bytes', 20 * 1024 * 1024 * 1024)
+    return PayloadCache(directory, max_bytes, config.get('payload_cache_compress_level', 6))
@@ -0,0 +1,274 @@
+import time
+import logging
+import threading
+from collections import deque
+from salesforce_metrics import observe_pipeline_report
+
+logger = logging.getLogger(__name__)
+
+class StageQueue:
+    """FIFO between two pipeline stages, bounded by item count, record count and bytes
+
+    discard(item) is called for every item dropped by abort, to release what it holds outside memory.
+    """
+    def __init__(self, name, max_items=None, max_records=None, max_bytes=None, discard=None):
+        self.name = name
+        self.max_items = max_items
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.discard = discard
+        self.items = deque()
+        self.records = 0
+        self.nbytes = 0
+        self.closed = False
+        self.aborted = False
+        self.condition = threading.Condition()
+        # Depth and wait metrics; put_wait is backpressure on the producers, get_wait is consumer starvation
+        self.puts = 0
+        self.peak_items = 0
+        self.peak_records = 0
+        self.peak_bytes = 0
+        self.depth_total = 0
+        self.put_wait = 0.0
+        self.get_wait = 0.0
+
+    def _full(self, records, nbytes):
+        # An item larger than the whole capacity is let through once the queue is empty
+        if not self.items:
+            return False
+        return ((self.max_items and len(self.items) >= self.max_items)
+                or (self.max_records and self.records + records > self.max_records)
+                or (self.max_bytes and self.nbytes + nbytes > self.max_bytes))
+
+    def put(self, item, records=1, nbytes=0):
+        """Block until the item fits, then enqueue it; False if the pipeline was aborted"""
+        with self.condition:
+            if self._full(records, nbytes) and not self.aborted:
+                started = time.monotonic()
+                while self._full(records, nbytes) and not self.aborted:
+                    self.condition.wait()
+                self.put_wait += time.monotonic() - started
+            if self.aborted:
+                return False
+
+            self.items.append((item, records, nbytes))
+            self.records += records
+            self.nbytes += nbytes
+            self.puts += 1
+            self.depth_total += len(self.items)
+            self.peak_items = max(self.peak_items, len(self.items))
+            self.peak_records = max(self.peak_records, self.records)
+            self.peak_bytes = max(self.peak_bytes, self.nbytes)
+            self.condition.notify_all()
+            return True
+
+    def get(self):
+        """Block until an item is available; None once the queue is closed and drained, or aborted"""
+        with self.condition:
+            if not self.items and not self.closed and not self.aborted:
+                started = time.monotonic()
+                while not self.items and not self.closed and not self.aborted:
+                    self.condition.wait()
+                self.get_wait += time.monotonic() - started
+            if self.aborted or not self.items:
+                return None
+
+            item, records, nbytes = self.items.popleft()
+            self.records -= records
+            self.nbytes -= nbytes
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        """No more items will be put; consumers drain what is left"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def abort(self):
+        """Drop queued items and wake every blocked producer and consumer"""
+        with self.condition:
+            self.aborted = True
+            if self.discard is not None:
+                for item, _, _ in self.items:
+                    try:
+                        self.discard(item)
+                    except Exception as e:
+                        logger.warning(f"Could not discard an item of queue {self.name}: {e}")
+            self.items.clear()
+            self.records = 0
+            self.nbytes = 0
+            self.condition.notify_all()
+
+    def snapshot(self):
+        """Current and peak depth plus the time producers and consumers spent blocked"""
+        with self.condition:
+            return {
+                'depth_items': len(self.items),
+                'depth_records': self.records,
+                'depth_bytes': self.nbytes,
+                'peak_items': self.peak_items,
+                'peak_records': self.peak_records,
+                'peak_bytes': self.peak_bytes,
+                'avg_depth_items': round(self.depth_total / self.puts, 1) if self.puts else 0,
+                'puts': self.puts,
+                'put_wait_seconds': round(self.put_wait, 3),
+                'get_wait_seconds': round(self.get_wait, 3)
+            }
+
+class Stage:
+    """A pipeline stage run by one or more worker threads, with its throughput counters"""
+    def __init__(self, name, func, workers, inbox, outbox):
+        self.name = name
+        self.func = func
+        self.workers = max(workers, 1)
+        self.inbox = inbox
+        self.outbox = outbox
+        self.running = self.workers
+        self.lock = threading.Lock()
+        self.items = 0
+        self.records_out = 0
+        self.bytes_out = 0
+        self.busy = 0.0
+        self.wait_in = 0.0
+        self.wait_out = 0.0
+
+    def snapshot(self, seconds):
+        with self.lock:
+            # Time spent blocked on a full outbox is backpressure, not work
+            active = max(self.busy - self.wait_out, 0.0)
+            return {
+                'workers': self.workers,
+                'items': self.items,
+                'records_out': self.records_out,
+                'bytes_out': self.bytes_out,
+                'records_per_second': round(self.records_out / seconds, 1) if seconds else 0,
+                'mb_per_second': round(self.bytes_out / seconds / (1024 * 1024), 2) if seconds else 0,
+                'utilization': round(active / (seconds * self.workers), 3) if seconds else 0,
+                'wait_in_seconds': round(self.wait_in, 3),
+                'wait_out_seconds': round(self.wait_out, 3)
+            }
+
+class Pipeline:
+    """Stages run as thread groups joined by bounded StageQueues
+
+    A source stage is called as func(emit); every other stage as func(item, emit) for each item of its
+    inbox. emit(item, records=1, nbytes=0) blocks while the outbox is full and returns False once the
+    pipeline is cancelled, which tells sources to stop.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.stages = []
+        self.queues = []
+        self.error = None
+        self.cancelled = False
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def queue(self, name, max_items=None, max_records=None, max_bytes=None, discard=None):
+        stage_queue = StageQueue(name, max_items, max_records, max_bytes, discard)
+        self.queues.append(stage_queue)
+        return stage_queue
+
+    def stage(self, name, func, workers=1, inbox=None, outbox=None):
+        stage = Stage(name, func, workers, inbox, outbox)
+        self.stages.append(stage)
+        return stage
+
+    def cancel(self):
+        """Stop the pipeline early, dropping queued items through their queue's discard"""
+        self.cancelled = True
+        for stage_queue in self.queues:
+            stage_queue.abort()
+
+    def _fail(self, e):
+        with self.lock:
+            if self.error is None:
+                self.error = e
+        self.cancel()
+
+    def _work(self, stage):
+        def emit(item, records=1, nbytes=0):
+            started = time.monotonic()
+            accepted = stage.outbox.put(item, records, nbytes)
+            with stage.lock:
+                stage.wait_out += time.monotonic() - started
+                if accepted:
+                    stage.records_out += records
+                    stage.bytes_out += nbytes
+            return accepted
+
+        try:
+            if stage.inbox is None:
+                started = time.monotonic()
+                stage.func(emit)
+                with stage.lock:
+                    stage.busy += time.monotonic() - started
+            else:
+                while True:
+                    started = time.monotonic()
+                    item = stage.inbox.get()
+                    got = time.monotonic()
+                    if item is None:
+                        break
+                    stage.func(item, emit)
+                    with stage.lock:
+                        stage.items += 1
+                        stage.wait_in += got - started
+                        stage.busy += time.monotonic() - got
+        except BaseException as e:
+            logger.error(f"Pipeline {self.name} stage {stage.name} failed: {e}")
+            self._fail(e)
+        finally:
+            with stage.lock:
+                stage.running -= 1
+                last_worker = stage.running == 0
+            # The next stage drains its inbox once every worker feeding it is done
+            if last_worker and stage.outbox is not None:
+                stage.outbox.close()
+
+    def run(self):
+        """Run every stage to completion, re-raising the first worker failure"""
+        self.started = time.monotonic()
+        threads = []
+        for stage in self.stages:
+            for i in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(stage,), name=f"{self.name}-{stage.name}-{i}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for thread in threads:
+                thread.join()
+        except BaseException:
+            self.cancel()
+            raise
+        finally:
+            self.finished = time.monotonic()
+
+        if self.error is not None:
+            raise self.error
+
+    def report(self):
+        """Per-stage throughput and per-queue depth and wait metrics"""
+        seconds = ((self.finished or time.monotonic()) - self.started) if self.started else 0
+        return {
+            'seconds': round(seconds, 3),
+            'stages': {stage.name: stage.snapshot(seconds) for stage in self.stages},
+            'queues': {stage_queue.name: stage_queue.snapshot() for stage_queue in self.queues}
+        }
+
+    def log_report(self):
+        """Log the report and add it to the pipeline metrics"""
+        report = self.report()
+        observe_pipeline_report(self.name, report)
+        for name, stage in report['stages'].items():
+            logger.info(f"Pipeline {self.name} stage {name}: {stage['items']} items, {stage['records_per_second']} records/s, "
+                        f"{stage['mb_per_second']} MB/s, {stage['utilization'] * 100:.0f}% busy x {stage['workers']} workers, "
+                        f"waited {stage['wait_in_seconds']}s for input and {stage['wait_out_seconds']}s on output")
+        for name, stage_queue in report['queues'].items():
+            logger.info(f"Pipeline {self.name} queue {name}: peak {stage_queue['peak_items']} items / {stage_queue['peak_records']} records / "
+                        f"{stage_queue['peak_bytes'] / (1024 * 1024):.2f} MB, avg {stage_queue['avg_depth_items']} items, "
+                        f"producers blocked {stage_queue['put_wait_seconds']}s, consumers starved {stage_queue['get_wait_seconds']}s")
+        return report
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from salesforce_metrics import USER_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+class UserCache:
+    """In-memory Salesforce User lookup cache with a TTL and LRU eviction, optionally persisted to disk"""
+    def __init__(self, ttl_seconds, max_entries, path=None, chunk_size=200, workers=4):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path = path
+        # Long IN-lists can exceed the SOQL statement length limit
+        self.chunk_size = chunk_size
+        self.workers = workers
+        # UserId -> (details or None when the user does not exist, expires_at), least recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable user cache {self.path}: {e}")
+            return
+
+        now = time.time()
+        for user_id, (details, expires_at) in saved.items():
+            if expires_at > now:
+                self.entries[user_id] = (details, expires_at)
+        logger.info(f"Loaded {len(self.entries)} cached Salesforce users from {self.path}")
+
+    def save(self):
+        """Atomically write the cache to its path, if one is configured"""
+        if not self.path:
+            return
+        with self.lock:
+            snapshot = dict(self.entries)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.users-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def get_many(self, user_ids):
+        """Split user_ids into cached details and the ids that are missing or expired"""
+        found = {}
+        missing = []
+        now = time.time()
+        with self.lock:
+            for user_id in user_ids:
+                entry = self.entries.get(user_id)
+                if entry is None or entry[1] <= now:
+                    missing.append(user_id)
+                    continue
+                self.entries.move_to_end(user_id)
+                if entry[0] is not None:
+                    found[user_id] = entry[0]
+        return found, missing
+
+    def put_many(self, user_ids, details):
+        """Cache the details fetched for user_ids; ids without details are cached as unknown users"""
+        expires_at = time.time() + self.ttl_seconds
+        with self.lock:
+            for user_id in user_ids:
+                self.entries[user_id] = (details.get(user_id), expires_at)
+                self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def lookup(self, user_ids, fetch_chunk):
+        """Return details for user_ids, calling fetch_chunk(ids) -> {id: details} only for misses"""
+        unique_user_ids = list({user_id for user_id in user_ids if user_id})
+        found, missing = self.get_many(unique_user_ids)
+        USER_CACHE_LOOKUPS.inc(len(unique_user_ids) - len(missing), outcome='hit')
+        USER_CACHE_LOOKUPS.inc(len(missing), outcome='miss')
+        if not missing:
+            return found
+
+        chunks = [missing[start:start + self.chunk_size] for start in range(0, len(missing), self.chunk_size)]
+        logger.info(f"Looking up {len(missing)} of {len(unique_user_ids)} users in Salesforce ({len(chunks)} queries)")
+
+        def fetch(chunk):
+            details = fetch_chunk(chunk)
+            self.put_many(chunk, details)
+            return details
+
+        if len(chunks) == 1 or self.workers <= 1:
+            results = [fetch(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(chunks)), thread_name_prefix='users') as executor:
+                results = list(executor.map(fetch, chunks))
+
+        for details in results:
+            found.update(details)
+
+        try:
+            self.save()
+        except Exception as e:
+            logger.warning(f"Could not save user cache: {e}")
+        return found
+
+def query_user_details(ingester, user_ids):
+    """Query Salesforce for one bounded IN-list of user IDs through an ingester's call_salesforce"""
+    user_ids_str = ','.join(f"'{uid}'" for uid in user_ids)
+    query = f"SELECT Id, Name, Username FROM User WHERE Id IN ({user_ids_str})"
+    # ingester.sf is read inside the call so a re-authenticated connection is used on retry
+    result = ingester.call_salesforce(lambda: ingester.sf.query_all(query))
+
+    user_details = {}
+    for user in result['records']:
+        details = {'UserName': user.get('Name', ''), 'Username': user.get('Username', '')}
+        # EventLogFile columns carry 15-character Ids; SOQL returns the 18-character form
+        user_details[user['Id']] = user_details[user['Id'][:15]] = details
+    return user_details
+
+# One user cache per org, shared by every ingester in the process
+_USER_CACHES = {}
+_USER_CACHES_LOCK = threading.Lock()
+
+def get_user_cache(config):
+    """Return the process-wide user cache for the org in config"""
+    key = (config.get('auth_url', 'https://login.salesforce.com'), config['username'])
+    with _USER_CACHES_LOCK:
+        cache = _USER_CACHES.get(key)
+        if cache is None:
+            cache = UserCache(
+                ttl_seconds=config.get('user_cache_ttl_minutes', 24 * 60) * 60,
+                max_entries=config.get('user_cache_max_entries', 100000),
+                path=config.get('user_cache_path'),
+                chunk_size=config.get('user_lookup_chunk_size', 200),
+                workers=config.get('user_lookup_workers', 4)
+            )
+            _USER_CACHES[key] = cache
+        return cache
@@ -1,9 +1,20 @@
-import requests
+import io
+import csv
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from elasticsearch import Elasticsearch
-from simple_salesforce import Salesforce
+from salesforce_bulk_indexer import BulkIndexer, summarize_bulk_stats
+from salesforce_checkpoint import create_checkpoint_store, parse_salesforce_datetime, format_soql_datetime
+from salesforce_auth import SalesforceClient
+from salesforce_user_cache import get_user_cache, query_user_details
+from salesforce_pipeline import Pipeline
+from salesforce_metrics import (
+    start_metrics_server, observe_bulk_stats, observe_sync,
+    BULK_INGEST_SECONDS, USER_LOOKUP_SECONDS, LAST_EVENT_TIMESTAMP, REGISTRY
+)
 
 # Setup logging
 logging.basicConfig(
@@ -16,53 +27,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class SalesforceLoginHistoryIngester:
+# LoginHistory fields extracted by both the REST and the Bulk API 2.0 paths
+LOGINHISTORY_FIELDS = """Id, UserId, LoginTime, LoginType, SourceIp, Status, 
+                   Platform, Application, Browser, ApiType, ApiVersion,
+                   ClientVersion, CountryIso, LoginGeoId, LoginUrl,
+                   NetworkId, AuthenticationMethodReference"""
+
+class SalesforceLoginHistoryIngester(SalesforceClient):
+    metrics_ingester = 'loginhistory'
+
     def __init__(self, config):
         self.config = config
-        self.sf = None
         self.es = None
+        self.bulk_indexer = None
+        self.checkpoint_store = None
+        self.checkpoint = None
+        self.init_salesforce_client(config)
+        self.user_cache = get_user_cache(config)
+        self.last_pipeline_report = None
         
-    def get_access_token(self):
-        """Get Salesforce access token using JWT Bearer flow"""
-        import jwt
-        import time
-        
-        payload = {
-            'iss': self.config['client_id'],
-            'sub': self.config['username'],
-            'aud': self.config.get('auth_url', 'https://login.salesforce.com'),
-            'exp': int(time.time()) + 3600
-        }
-        
-        token = jwt.encode(payload, self.config['private_key'], algorithm='RS256')
-        
-        data = {
-            'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer',
-            'assertion': token
-        }
-        
-        response = requests.post(f"{self.config.get('auth_url', 'https://login.salesforce.com')}/services/oauth2/token", data=data)
-        
-        if response.status_code != 200:
-            raise Exception(f'Authentication failed: {response.status_code} - {response.text}')
-        
-        return response.json()
-
-    def connect_to_salesforce(self):
-        """Establish connection to Salesforce"""
-        try:
-            auth_response = self.get_access_token()
-            access_token = auth_response['access_token']
-            instance_url = auth_response['instance_url']
-            
-            self.sf = Salesforce(instance_url=instance_url, session_id=access_token)
-            logger.info(f"Connected to Salesforce instance: {instance_url}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error connecting to Salesforce: {e}")
-            return False
-
     def setup_elasticsearch(self):
         """Setup Elasticsearch connection"""
         try:
@@ -71,6 +54,10 @@ class SalesforceLoginHistoryIngester:
             if not self.es.ping():
                 raise Exception("Cannot connect to Elasticsearch")
             
+            self.bulk_indexer = BulkIndexer(self.es, self.config)
+            self.checkpoint_store = create_checkpoint_store(self.config, self.es)
+            self.load_checkpoint()
+            
             # Create index mapping - Added Name and Username fields
             mapping = {
                 "mappings": {
@@ -157,35 +144,13 @@ class SalesforceLoginHistoryIngester:
         return fallback_time
 
     def fetch_user_details(self, user_ids):
-        """Fetch user details (Name and Username) for given user IDs"""
+        """Fetch user details (Name and Username) for given user IDs, querying only uncached users"""
         if not user_ids:
             return {}
         
         try:
-            # Remove duplicates and filter out None values
-            unique_user_ids = list(set([uid for uid in user_ids if uid]))
-            
-            if not unique_user_ids:
-                return {}
-            
-            # Build the SOQL query with IN clause
-            user_ids_quoted = [f"'{uid}'" for uid in unique_user_ids]
-            user_ids_str = ','.join(user_ids_quoted)
-            
-            query = f"SELECT Id, Name, Username FROM User WHERE Id IN ({user_ids_str})"
-            
-            logger.info(f"Fetching user details for {len(unique_user_ids)} unique users")
-            result = self.sf.query_all(query)
-            user_records = result['records']
-            
-            # Create a dictionary mapping UserId to user details
-            user_details = {}
-            for user in user_records:
-                user_details[user['Id']] = {
-                    'UserName': user.get('Name', ''),
-                    'Username': user.get('Username', '')
-                }
-            
+            with USER_LOOKUP_SECONDS.time(ingester='loginhistory'):
+                user_details = self.user_cache.lookup(user_ids, lambda chunk: query_user_details(self, chunk))
             logger.info(f"Retrieved details for {len(user_details)} users")
             return user_details
             
@@ -193,35 +158,113 @@ class SalesforceLoginHistoryIngester:
             logger.error(f"Error fetching user details: {e}")
             return {}
 
-    def fetch_incremental_data(self):
-        """Fetch incremental LoginHistory data since last record in ES"""
+    def load_checkpoint(self):
+        """Load the LoginHistory high-water mark, if a checkpoint store is configured"""
+        if not self.checkpoint_store:
+            return
+        
+        self.checkpoint = self.checkpoint_store.load('loginhistory') or {'high_water': None, 'ids_at_high_water': []}
+        logger.info(f"Loaded LoginHistory checkpoint: high water {self.checkpoint['high_water']}, "
+                    f"{len(self.checkpoint['ids_at_high_water'])} records at that time")
+
+    def advance_checkpoint(self, records, save=True):
+        """Move the high-water mark past a batch of fully ingested records"""
+        if records and REGISTRY.enabled:
+            LAST_EVENT_TIMESTAMP.set_max(max(parse_salesforce_datetime(record['LoginTime']) for record in records).timestamp(),
+                                         ingester='loginhistory', event_type='LoginHistory')
+        if not self.checkpoint_store or not records:
+            return
+        
+        high_water = self.checkpoint['high_water']
+        high_water_dt = parse_salesforce_datetime(high_water) if high_water else None
+        ids_at_high_water = set(self.checkpoint['ids_at_high_water'])
+        
+        for record in records:
+            login_time = parse_salesforce_datetime(record['LoginTime'])
+            if high_water_dt is None or login_time > high_water_dt:
+                high_water, high_water_dt = record['LoginTime'], login_time
+                ids_at_high_water = {record['Id']}
+            elif login_time == high_water_dt:
+                ids_at_high_water.add(record['Id'])
+        
+        self.checkpoint = {'high_water': high_water, 'ids_at_high_water': sorted(ids_at_high_water)}
+        if save:
+            self.save_checkpoint()
+
+    def save_checkpoint(self):
+        """Persist the current high-water mark"""
+        if not self.checkpoint_store:
+            return
         try:
-            # Get the latest timestamp from Elasticsearch
-            last_sync = self.get_latest_sync_timestamp_from_es()
-            
-            # If no records exist, use fallback
-            if last_sync is None:
-                last_sync = self.get_fallback_timestamp()
+            self.checkpoint_store.save('loginhistory', self.checkpoint)
+        except Exception as e:
+            logger.error(f"Error saving LoginHistory checkpoint: {e}")
+
+    def get_ingested_ids_at(self, login_time):
+        """Ids of the records already in Elasticsearch with exactly this LoginTime"""
+        try:
+            response = self.es.search(
+                index=self.config['es_index'],
+                body={
+                    "size": 10000,
+                    "query": {"range": {"LoginTime": {"gte": login_time.isoformat(), "lte": login_time.isoformat()}}},
+                    "_source": False
+                }
+            )
+            return [hit['_id'] for hit in response.get('hits', {}).get('hits', [])]
+        except Exception as e:
+            logger.error(f"Error retrieving records at LoginTime {login_time} from ES: {e}")
+            return []
+
+    def get_resume_point(self):
+        """Return the LoginTime to query from and the Ids already ingested at that time"""
+        if self.checkpoint_store and self.checkpoint['high_water']:
+            return parse_salesforce_datetime(self.checkpoint['high_water']), self.checkpoint['ids_at_high_water']
+        
+        # Get the latest timestamp from Elasticsearch
+        last_sync = self.get_latest_sync_timestamp_from_es()
+        
+        # If no records exist, use fallback
+        if last_sync is None:
+            return self.get_fallback_timestamp(), []
+        
+        # Re-query the latest second, leaving out what is already indexed, so logins sharing it are not lost
+        return last_sync, self.get_ingested_ids_at(last_sync)
+
+    def _since_clause(self, last_sync, seen_ids):
+        """SOQL condition selecting records from the resume point on"""
+        # Format datetime for SOQL query (Salesforce expects UTC)
+        where_clause = f"LoginTime >= {format_soql_datetime(last_sync)}"
+        
+        # Records sharing the high-water LoginTime were ingested already
+        if seen_ids:
+            seen_ids_str = "', '".join(seen_ids)
+            where_clause += f" AND Id NOT IN ('{seen_ids_str}')"
+        return where_clause
+
+    def fetch_incremental_data(self, after=None):
+        """Fetch one page of LoginHistory data since the resume point, or after a (LoginTime, Id) keyset cursor"""
+        try:
+            if after:
+                # Every later page continues strictly after the last record of the previous one
+                after_login_time = format_soql_datetime(parse_salesforce_datetime(after[0]))
+                where_clause = f"LoginTime > {after_login_time} OR (LoginTime = {after_login_time} AND Id > '{after[1]}')"
+                logger.info(f"Fetching next LoginHistory page after {after[0]} / {after[1]}")
             else:
-                # Add a small buffer (1 second) to avoid missing records with the same timestamp
-                last_sync = last_sync + timedelta(seconds=1)
-            
-            # Format datetime for SOQL query (Salesforce expects UTC)
-            last_sync_str = last_sync.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+                last_sync, seen_ids = self.get_resume_point()
+                where_clause = self._since_clause(last_sync, seen_ids)
+                logger.info(f"Fetching LoginHistory records since: {format_soql_datetime(last_sync)}")
             
+            # Sorting by Id within a LoginTime gives the total order keyset pagination needs
             query = f"""
-            SELECT Id, UserId, LoginTime, LoginType, SourceIp, Status, 
-                   Platform, Application, Browser, ApiType, ApiVersion,
-                   ClientVersion, CountryIso, LoginGeoId, LoginUrl,
-                   NetworkId, AuthenticationMethodReference
+            SELECT {LOGINHISTORY_FIELDS}
             FROM LoginHistory 
-            WHERE LoginTime >= {last_sync_str}
-            ORDER BY LoginTime ASC
+            WHERE {where_clause}
+            ORDER BY LoginTime ASC, Id ASC
             LIMIT {self.config.get('batch_size', 2000)}
             """
             
-            logger.info(f"Fetching LoginHistory records since: {last_sync_str}")
-            result = self.sf.query_all(query)
+            result = self.call_salesforce(lambda: self.sf.query_all(query))
             records = result['records']
             
             logger.info(f"Retrieved {len(records)} new LoginHistory records")
@@ -270,26 +313,26 @@ class SalesforceLoginHistoryIngester:
             return 0
             
         try:
-            from elasticsearch.helpers import bulk
-            
-            actions = []
-            for record in records:
-                record.pop('attributes', None)
-                record['ingestion_timestamp'] = datetime.now().isoformat()
-                
-                action = {
-                    "_index": self.config['es_index'],
-                    "_id": record['Id'],
-                    "_source": record
-                }
-                actions.append(action)
+            def generate_actions():
+                for record in records:
+                    record.pop('attributes', None)
+                    record['ingestion_timestamp'] = datetime.now().isoformat()
+                    
+                    yield {
+                        "_index": self.config['es_index'],
+                        "_id": record['Id'],
+                        "_source": record
+                    }
             
-            # Perform bulk insert
-            success, failed = bulk(self.es, actions, chunk_size=500, request_timeout=60)
+            # Stream the actions through the bulk indexer
+            with BULK_INGEST_SECONDS.time(ingester='loginhistory'):
+                stats = self.bulk_indexer.index(generate_actions())
+            observe_bulk_stats('loginhistory', stats)
+            success = stats['success']
             
-            logger.info(f"Bulk ingested {success} records to Elasticsearch")
-            if failed:
-                logger.warning(f"Failed to ingest {len(failed)} records")
+            logger.info(f"Bulk ingested {success} records to Elasticsearch ({summarize_bulk_stats(stats)})")
+            if stats['failed']:
+                logger.warning(f"Failed to ingest {stats['failed']} records")
             
             return success
             
@@ -310,24 +353,313 @@ class SalesforceLoginHistoryIngester:
         except Exception as e:
             logger.warning(f"Could not retrieve index stats: {e}")
 
-    def run_single_sync(self):
-        """Run a single synchronization cycle"""
-        try:
-            # Reconnect to Salesforce if needed (token might expire)
-            if not self.sf or not self.connect_to_salesforce():
-                logger.error("Failed to connect to Salesforce")
-                return False
-            
+    def extract_with_rest_api(self):
+        """Page through new LoginHistory records with the REST query API, indexing each page as it arrives"""
+        if self.config.get('staged_pipeline', False):
+            return self.extract_with_pipeline(self.iter_rest_pages(), ordered=True)
+        
+        total_fetched = 0
+        total_ingested = 0
+        pages = 0
+        
+        rest_pages = self.iter_rest_pages()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='loginhistory') as prefetcher:
             # Fetch incremental data
-            records = self.fetch_incremental_data()
+            records = next(rest_pages, None)
             
-            if records:
+            while records:
+                pages += 1
+                # Fetch the next page while this one is enriched and indexed; None once paging stops
+                next_page = prefetcher.submit(next, rest_pages, None)
+                
                 # Enrich records with user details
                 enriched_records = self.enrich_records_with_user_details(records)
                 
                 # Ingest to Elasticsearch
                 ingested_count = self.bulk_ingest_to_elasticsearch(enriched_records)
-                logger.info(f"Sync completed: {ingested_count} records ingested")
+                total_fetched += len(enriched_records)
+                total_ingested += ingested_count
+                
+                # Only advance past a batch that made it into Elasticsearch in full
+                if ingested_count != len(enriched_records):
+                    logger.warning(f"LoginHistory page {pages} only partly ingested, resuming from it next cycle")
+                    next_page.cancel()
+                    break
+                self.advance_checkpoint(enriched_records)
+                
+                records = next_page.result()
+        rest_pages.close()
+        
+        logger.info(f"Fetched {total_fetched} LoginHistory records in {pages} pages")
+        return total_fetched, total_ingested
+
+    def iter_rest_pages(self):
+        """Yield pages of new LoginHistory records, following the keyset cursor until a short page"""
+        batch_size = self.config.get('batch_size', 2000)
+        max_pages = self.config.get('max_pages_per_cycle')
+        pages = 0
+        
+        records = self.fetch_incremental_data()
+        while records:
+            pages += 1
+            yield records
+            if len(records) < batch_size or (max_pages and pages >= max_pages):
+                break
+            records = self.fetch_incremental_data((records[-1]['LoginTime'], records[-1]['Id']))
+        
+        logger.info(f"Fetched {pages} LoginHistory pages")
+
+    def extract_with_pipeline(self, batches, ordered=True):
+        """Run extract -> enrich -> serialize -> index as stages joined by bounded queues
+        
+        Ordered batches (keyset-paged REST results) advance the checkpoint past each batch once it and
+        every batch before it are fully ingested; unordered bulk results only move it when all are in.
+        """
+        batch_size = self.config.get('batch_size', 2000)
+        checkpoint = self.checkpoint
+        totals, collect = self.bulk_indexer.new_totals()
+        lock = threading.Lock()
+        state = {'fetched': 0, 'ingested': 0, 'failed': False, 'next_seq': 0}
+        completed = {}
+        
+        pipeline = Pipeline('loginhistory')
+        pages = pipeline.queue('pages', max_records=self.config.get('pipeline_page_queue_records', batch_size * 2))
+        enriched = pipeline.queue('enriched', max_records=self.config.get('pipeline_enriched_queue_records', batch_size * 2))
+        chunks = pipeline.queue('chunks', max_bytes=self.config.get('pipeline_chunk_queue_bytes', 32 * 1024 * 1024))
+        
+        def page_done(page):
+            with lock:
+                state['fetched'] += len(page['records'])
+                state['ingested'] += page['ingested']
+                if page['ingested'] != len(page['records']):
+                    # Nothing past a partly ingested batch may be checkpointed, so stop extracting
+                    logger.warning(f"LoginHistory batch {page['seq'] + 1} only partly ingested, resuming from it next cycle")
+                    state['failed'] = True
+                    pipeline.cancel()
+                    return
+                
+                completed[page['seq']] = page['records']
+                while state['next_seq'] in completed:
+                    self.advance_checkpoint(completed.pop(state['next_seq']), save=ordered)
+                    state['next_seq'] += 1
+        
+        def sent(page, attempted, ingested):
+            with lock:
+                page['pending'] -= attempted
+                page['ingested'] += ingested
+                done = page['pending'] == 0
+            if done:
+                page_done(page)
+        
+        def extract(emit):
+            for seq, records in enumerate(batches):
+                page = {'seq': seq, 'records': records, 'pending': len(records), 'ingested': 0}
+                if not emit(page, records=len(records)):
+                    return
+        
+        def enrich(page, emit):
+            self.enrich_records_with_user_details(page['records'])
+            emit(page, records=len(page['records']))
+        
+        def serialize(page, emit):
+            emitted = 0
+            try:
+                def generate_actions():
+                    for record in page['records']:
+                        record.pop('attributes', None)
+                        record['ingestion_timestamp'] = datetime.now().isoformat()
+                        
+                        yield {
+                            "_index": self.config['es_index'],
+                            "_id": record['Id'],
+                            "_source": record
+                        }
+                
+                for chunk, nbytes in self.bulk_indexer.encode_chunks(generate_actions()):
+                    if not emit((page, chunk), records=len(chunk), nbytes=nbytes):
+                        return
+                    emitted += len(chunk)
+            except Exception as e:
+                logger.error(f"Error serializing LoginHistory batch {page['seq'] + 1}: {e}")
+                sent(page, len(page['records']) - emitted, 0)
+        
+        def index(item, emit):
+            page, chunk = item
+            stats = self.bulk_indexer.index_chunk(chunk)
+            with lock:
+                collect(stats)
+            sent(page, stats['docs'], stats['success'])
+        
+        pipeline.stage('extract', extract, outbox=pages)
+        pipeline.stage('enrich', enrich, workers=self.config.get('pipeline_enrich_workers', 1), inbox=pages, outbox=enriched)
+        pipeline.stage('serialize', serialize, workers=self.config.get('pipeline_serialize_workers', 1), inbox=enriched, outbox=chunks)
+        pipeline.stage('index', index, workers=self.config.get('pipeline_index_workers', self.config.get('bulk_thread_count', 1)), inbox=chunks)
+        
+        try:
+            pipeline.run()
+        except Exception:
+            if not ordered:
+                self.checkpoint = checkpoint
+            raise
+        finally:
+            self.last_pipeline_report = pipeline.log_report()
+        
+        if not ordered:
+            # Bulk results are unordered, so the checkpoint is only saved once every batch is indexed
+            if state['failed']:
+                self.checkpoint = checkpoint
+            else:
+                self.save_checkpoint()
+        
+        observe_bulk_stats('loginhistory', totals)
+        logger.info(f"Bulk ingested {totals['success']} records to Elasticsearch ({summarize_bulk_stats(totals)})")
+        if totals['failed']:
+            logger.warning(f"Failed to ingest {totals['failed']} records")
+        return state['fetched'], state['ingested']
+
+    def submit_bulk_query_job(self, query):
+        """Create a Bulk API 2.0 query job and return its Id"""
+        response = self.sf.session.post(
+            f"{self.sf.base_url}jobs/query",
+            headers={'Authorization': f'Bearer {self.sf.session_id}', 'Content-Type': 'application/json'},
+            json={'operation': 'query', 'query': query, 'contentType': 'CSV', 'columnDelimiter': 'COMMA', 'lineEnding': 'LF'}
+        )
+        response.raise_for_status()
+        return response.json()['id']
+
+    def wait_for_bulk_query_job(self, job_id):
+        """Poll a bulk query job until Salesforce has finished it"""
+        poll_seconds = self.config.get('bulk2_poll_seconds', 5)
+        deadline = time.time() + self.config.get('bulk2_timeout_minutes', 60) * 60
+        
+        while True:
+            response = self.call_salesforce(lambda: self.sf.session.get(
+                f"{self.sf.base_url}jobs/query/{job_id}",
+                headers={'Authorization': f'Bearer {self.sf.session_id}'}
+            ))
+            response.raise_for_status()
+            job = response.json()
+            
+            if job['state'] == 'JobComplete':
+                return job
+            if job['state'] in ('Failed', 'Aborted'):
+                raise Exception(f"Bulk query job {job_id} {job['state']}: {job.get('errorMessage', '')}")
+            if time.time() > deadline:
+                # Don't leave the job running in the org
+                self.abort_bulk_query_job(job_id)
+                raise Exception(f"Bulk query job {job_id} still {job['state']} after {self.config.get('bulk2_timeout_minutes', 60)} minutes")
+            
+            time.sleep(poll_seconds)
+            # Back off gently; large jobs take minutes
+            poll_seconds = min(poll_seconds * 1.5, 30)
+
+    def abort_bulk_query_job(self, job_id):
+        """Ask Salesforce to stop a bulk query job; failures are only logged"""
+        try:
+            response = self.call_salesforce(lambda: self.sf.session.patch(
+                f"{self.sf.base_url}jobs/query/{job_id}",
+                headers={'Authorization': f'Bearer {self.sf.session_id}', 'Content-Type': 'application/json'},
+                json={'state': 'Aborted'}
+            ))
+            response.raise_for_status()
+            logger.info(f"Aborted bulk query job {job_id}")
+        except Exception as e:
+            logger.error(f"Could not abort bulk query job {job_id}: {e}")
+
+    def _open_bulk_query_results(self, job_id, locator):
+        """Open a streaming download of one result set of a bulk query job"""
+        params = {'maxRecords': self.config.get('bulk2_max_records', 50000)}
+        if locator:
+            params['locator'] = locator
+        
+        response = self.sf.session.get(
+            f"{self.sf.base_url}jobs/query/{job_id}/results",
+            headers={'Authorization': f'Bearer {self.sf.session_id}', 'Accept-Encoding': 'gzip'},
+            params=params,
+            stream=True
+        )
+        response.raise_for_status()
+        return response
+
+    def iter_bulk_query_results(self, job_id):
+        """Stream the CSV result sets of a completed bulk query job as record batches of batch_size"""
+        batch_size = self.config.get('batch_size', 2000)
+        locator = None
+        
+        while True:
+            response = self.call_salesforce(lambda: self._open_bulk_query_results(job_id, locator))
+            with response:
+                # Read straight off the socket instead of buffering a whole result set
+                response.raw.decode_content = True
+                reader = csv.DictReader(io.TextIOWrapper(response.raw, encoding='utf-8', newline=''))
+                
+                batch = []
+                for row in reader:
+                    # Bulk CSV has no nulls; empty columns are left out like in REST results
+                    batch.append({field: value for field, value in row.items() if value != ''})
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+                
+                locator = response.headers.get('Sforce-Locator')
+            
+            if not locator or locator == 'null':
+                return
+
+    def extract_with_bulk_api(self):
+        """Extract new LoginHistory records with one Bulk API 2.0 query job, indexing its results as they stream in"""
+        last_sync, seen_ids = self.get_resume_point()
+        query = f"SELECT {LOGINHISTORY_FIELDS} FROM LoginHistory WHERE {self._since_clause(last_sync, seen_ids)}"
+        
+        logger.info(f"Submitting Bulk API 2.0 LoginHistory query since {format_soql_datetime(last_sync)}")
+        job_id = self.call_salesforce(lambda: self.submit_bulk_query_job(query))
+        job = self.wait_for_bulk_query_job(job_id)
+        logger.info(f"Bulk query job {job_id} complete with {job.get('numberRecordsProcessed', 0)} records")
+        
+        if self.config.get('staged_pipeline', False):
+            return self.extract_with_pipeline(self.iter_bulk_query_results(job_id), ordered=False)
+        
+        # Bulk results are unordered, so the checkpoint is only saved once the whole job is indexed
+        checkpoint = self.checkpoint
+        total_fetched = 0
+        total_ingested = 0
+        try:
+            for records in self.iter_bulk_query_results(job_id):
+                enriched_records = self.enrich_records_with_user_details(records)
+                ingested_count = self.bulk_ingest_to_elasticsearch(enriched_records)
+                total_fetched += len(enriched_records)
+                total_ingested += ingested_count
+                
+                if ingested_count != len(enriched_records):
+                    logger.warning(f"Bulk query job {job_id} only partly ingested, extracting it again next cycle")
+                    self.checkpoint = checkpoint
+                    return total_fetched, total_ingested
+                self.advance_checkpoint(enriched_records, save=False)
+        except Exception:
+            self.checkpoint = checkpoint
+            raise
+        
+        self.save_checkpoint()
+        logger.info(f"Extracted {total_fetched} LoginHistory records with bulk query job {job_id}")
+        return total_fetched, total_ingested
+
+    def run_single_sync(self):
+        """Run a single synchronization cycle"""
+        try:
+            # Reuses the cached access token; only re-authenticates when it is missing or near expiry
+            if not self.connect_to_salesforce():
+                logger.error("Failed to connect to Salesforce")
+                return False
+            
+            if self.config.get('extraction_mode', 'rest') == 'bulk2':
+                total_fetched, total_ingested = self.extract_with_bulk_api()
+            else:
+                total_fetched, total_ingested = self.extract_with_rest_api()
+            
+            if total_fetched:
+                logger.info(f"Sync completed: {total_ingested} of {total_fetched} records ingested")
                 
                 # Show index stats after ingestion
                 self.get_index_stats()
@@ -343,6 +675,7 @@ class SalesforceLoginHistoryIngester:
     def run_continuous(self):
         """Run continuous ingestion"""
         logger.info("Starting continuous Salesforce LoginHistory ingestion...")
+        start_metrics_server(self.config)
         
         # Initial setup
         if not self.setup_elasticsearch():
@@ -364,6 +697,7 @@ class SalesforceLoginHistoryIngester:
                 
                 while retry_count < max_retries and not success:
                     success = self.run_single_sync()
+                    observe_sync('loginhistory', success)
                     if not success:
                         retry_count += 1
                         if retry_count < max_retries:
@@ -378,6 +712,7 @@ class SalesforceLoginHistoryIngester:
                 
             except KeyboardInterrupt:
                 logger.info("Received interrupt signal. Stopping continuous ingestion...")
+                self.token_manager.close()
                 break
             except Exception as e:
                 logger.error(f"Unexpected error in continuous loop: {e}")
@@ -397,9 +732,43 @@ YOUR_PRIVATE_KEY_CONTENT_HERE
         'es_host': 'http://localhost:9200',
         'es_index': 'salesforce_loginhistory',
         'sync_interval_minutes': 15,        # Sync every 15 minutes
-        'batch_size': 2000,                 # Max records per sync
+        'batch_size': 2000,                 # LoginHistory records per page; pages are fetched until caught up
+        'max_pages_per_cycle': None,        # Optional cap on pages per sync (None drains the whole backlog)
+        'extraction_mode': 'rest',          # 'rest' (keyset-paged queries) or 'bulk2' (Bulk API 2.0 query job for backfills)
+        'bulk2_max_records': 50000,         # Records per Bulk API 2.0 result download
+        'bulk2_poll_seconds': 5,            # Initial interval between bulk job status checks
+        'bulk2_timeout_minutes': 60,        # Give up on a bulk query job after this long
+        'staged_pipeline': False,           # Run extract/enrich/serialize/index as stages joined by bounded queues
+        'pipeline_page_queue_records': 4000,     # Extracted records waiting for enrichment
+        'pipeline_enriched_queue_records': 4000, # Enriched records waiting to be serialized
+        'pipeline_chunk_queue_bytes': 32 * 1024 * 1024,  # Encoded bulk bodies waiting to be sent
+        'pipeline_index_workers': 2,        # Bulk requests in flight from the index stage
         'max_retries': 3,                   # Max retry attempts per sync
-        'initial_lookback_hours': 24        # How far back to look on first run (hours)
+        'initial_lookback_hours': 24,       # How far back to look on first run (hours)
+        'bulk_chunk_size': 500,             # Max documents per bulk request
+        'bulk_max_chunk_bytes': 10 * 1024 * 1024,  # Max bytes per bulk request
+        'bulk_thread_count': 2,             # Bulk requests sent concurrently
+        'bulk_adaptive': True,              # Retry 429s and tune chunk size/concurrency to backpressure
+        'bulk_max_retries': 5,              # Retries for rejected bulk items
+        'bulk_max_thread_count': 4,         # Upper bound for adaptive bulk concurrency
+        'bulk_serializer': 'auto',          # 'orjson', 'json' or 'auto' (orjson when installed)
+        'checkpoint_backend': 'elasticsearch',  # 'file', 'elasticsearch' or None to resume from max(LoginTime)
+        'checkpoint_path': 'salesforce_checkpoints.json',  # Used by the 'file' backend
+        'checkpoint_index': 'salesforce-ingest-checkpoints',  # Used by the 'elasticsearch' backend
+        'token_lifetime_minutes': 110,      # Reuse an access token this long (keep below the org session timeout)
+        'token_refresh_ahead_seconds': 300, # Refresh the token in the background this long before it expires
+        'token_background_refresh': True,   # Refresh ahead in a background thread instead of on the next call
+        'http_pool_size': 10,               # Keep-alive connections per Salesforce host
+        'http_max_retries': 3,              # Retries for connection errors and 5xx responses on GETs
+        'http_connect_timeout_seconds': 10, # Timeout for opening a connection
+        'http_read_timeout_seconds': 300,   # Timeout between bytes received from Salesforce
+        'user_cache_ttl_minutes': 24 * 60,  # How long looked-up User names are reused
+        'user_cache_max_entries': 100000,   # Least recently used users are dropped beyond this
+        'user_cache_path': None,            # Optional JSON file keeping the user cache across restarts
+        'user_lookup_chunk_size': 200,      # User Ids per SOQL IN-list
+        'user_lookup_workers': 4,           # User queries run concurrently
+        'metrics_port': None,               # Serve Prometheus metrics on this port at /metrics with prometheus_client (None disables metrics)
+        'metrics_host': '0.0.0.0'           # Interface the metrics endpoint listens on
     }
     
     # Create and run ingester
@@ -0,0 +1,93 @@
+"""Shared test setup: import the ingester modules from the repository root
+
+elasticsearch, simple_salesforce and requests are only stubbed when they are not installed, so the
+modules can be imported; the tests never reach the stubbed clients. The bulk indexer does call
+expand_action, so the stub splits actions the way elasticsearch.helpers does.
+"""
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+def _installed(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+def _stub(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+class _Stub:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def mount(self, *args, **kwargs):
+        pass
+
+if not _installed('elasticsearch'):
+    # Metadata keys elasticsearch.helpers.expand_action moves into the action line; the underscored
+    # ones it renames, the rest keep their name
+    _RENAMED_METADATA = ('_if_seq_no', '_if_primary_term', '_retry_on_conflict', '_routing', '_version', '_version_type')
+    _KEPT_METADATA = ('_id', '_index', 'pipeline', 'routing', 'if_seq_no', 'if_primary_term', 'retry_on_conflict', 'version', 'version_type')
+
+    def _expand_action(data):
+        """Split one bulk action into its action line and source, as elasticsearch.helpers does"""
+        if isinstance(data, (bytes, str)):
+            return {'index': {}}, data.encode('utf-8') if isinstance(data, str) else data
+        data = dict(data)
+        op_type = data.pop('_op_type', 'index')
+        metadata = {}
+        for key in _RENAMED_METADATA:
+            if key in data:
+                metadata[key[1:]] = data.pop(key)
+        for key in _KEPT_METADATA:
+            if key in data:
+                metadata[key] = data.pop(key)
+        if op_type == 'delete':
+            return {op_type: metadata}, None
+        return {op_type: metadata}, data.get('_source', data)
+    _stub('elasticsearch', Elasticsearch=_Stub, AsyncElasticsearch=_Stub)
+    _stub('elasticsearch.helpers', expand_action=_expand_action)
+
+if not _installed('simple_salesforce'):
+    _stub('simple_salesforce', Salesforce=_Stub)
+
+if not _installed('requests'):
+    _stub('requests', Session=_Stub)
+    _stub('requests.adapters', HTTPAdapter=_Stub)
+    _stub('requests.exceptions', ChunkedEncodingError=IOError, ConnectionError=ConnectionError, Timeout=TimeoutError)
+
+if not _installed('urllib3'):
+    _stub('urllib3')
+    _stub('urllib3.util')
+    _stub('urllib3.util.retry', Retry=_Stub)
+
+class MemoryCheckpointStore:
+    """Checkpoint store keeping states in a dict and remembering every save"""
+    def __init__(self):
+        self.checkpoints = {}
+        self.saves = []
+
+    def load(self, name):
+        return self.checkpoints.get(name)
+
+    def save(self, name, state):
+        self.checkpoints[name] = state
+        self.saves.append((name, state))
+
+@pytest.fixture
+def checkpoint_store():
+    return MemoryCheckpointStore()
@@ -0,0 +1,100 @@
+import json
+import threading
+
+import pytest
+
+from salesforce_bulk_indexer import BulkIndexer
+
+class RejectedRequest(Exception):
+    status_code = 429
+
+class FakeElasticsearch:
+    """Bulk client answering each document with the next of its scripted statuses (201 once they run out)
+
+    request_errors are raised, in order, by the first requests instead of answering them.
+    """
+    def __init__(self, statuses=None, request_errors=()):
+        self.statuses = {doc_id: list(codes) for doc_id, codes in (statuses or {}).items()}
+        self.request_errors = list(request_errors)
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def bulk(self, body, **kwargs):
+        lines = body.decode('utf-8').splitlines()
+        ids = [json.loads(line)['index']['_id'] for line in lines[::2]]
+        with self.lock:
+            self.requests.append(ids)
+            if self.request_errors:
+                raise self.request_errors.pop(0)
+            codes = [self.statuses[doc_id].pop(0) if self.statuses.get(doc_id) else 201 for doc_id in ids]
+        return {'errors': any(code >= 300 for code in codes), 'items': [{'index': _item(code)} for code in codes]}
+
+def _item(status):
+    if status < 300:
+        return {'_index': 'test', 'status': status}
+    error_type = 'es_rejected_execution_exception' if status == 429 else 'mapper_parsing_exception'
+    return {'_index': 'test', 'status': status, 'error': {'type': error_type, 'reason': f'status {status}'}}
+
+def make_indexer(es, **config):
+    config = {'bulk_serializer': 'json', 'bulk_chunk_size': 100, 'bulk_initial_backoff': 0, 'bulk_max_retries': 3, **config}
+    return BulkIndexer(es, config)
+
+def actions(*doc_ids):
+    return [{'_index': 'test', '_id': doc_id, '_source': {'n': doc_id}} for doc_id in doc_ids]
+
+def send(indexer, *doc_ids):
+    chunk, = indexer._chunk_actions(actions(*doc_ids))
+    return indexer._index_chunk(chunk)
+
+def counts(stats, *keys):
+    return tuple(stats[key] for key in keys)
+
+def test_partial_rejections_are_retried_until_they_succeed():
+    es = FakeElasticsearch({'b': [429], 'd': [429]})
+    stats = send(make_indexer(es), 'a', 'b', 'c', 'd')
+    
+    assert es.requests == [['a', 'b', 'c', 'd'], ['b', 'd']]
+    assert counts(stats, 'docs', 'success', 'failed', 'rejected', 'retries') == (4, 4, 0, 2, 2)
+    assert stats['errors'] == []
+
+def test_items_still_rejected_after_the_last_retry_count_as_failed_once():
+    es = FakeElasticsearch({'b': [429], 'c': [429, 429, 429]})
+    stats = send(make_indexer(es, bulk_max_retries=2), 'a', 'b', 'c')
+    
+    assert es.requests == [['a', 'b', 'c'], ['b', 'c'], ['c']]
+    assert counts(stats, 'docs', 'success', 'failed', 'retries') == (3, 2, 1, 3)
+    assert [error['status'] for error in stats['errors']] == [429]
+
+def test_non_retryable_item_errors_are_not_retried_and_stay_reported():
+    es = FakeElasticsearch({'a': [400], 'b': [429]})
+    stats = send(make_indexer(es), 'a', 'b', 'c')
+    
+    assert es.requests == [['a', 'b', 'c'], ['b']]
+    assert counts(stats, 'success', 'failed', 'retries') == (2, 1, 1)
+    assert [(error['status'], error['type']) for error in stats['errors']] == [(400, 'mapper_parsing_exception')]
+
+def test_a_rejected_request_is_sent_again_as_a_whole():
+    es = FakeElasticsearch(request_errors=[RejectedRequest('too many requests')])
+    stats = send(make_indexer(es), 'a', 'b')
+    
+    assert es.requests == [['a', 'b'], ['a', 'b']]
+    assert counts(stats, 'success', 'failed', 'rejected', 'retries') == (2, 0, 2, 2)
+    assert stats['errors'] == []
+
+def test_without_retries_rejections_are_failures():
+    es = FakeElasticsearch({'b': [429]})
+    stats = send(make_indexer(es, bulk_max_retries=0), 'a', 'b')
+    
+    assert es.requests == [['a', 'b']]
+    assert counts(stats, 'success', 'failed', 'rejected', 'retries') == (1, 1, 1, 0)
+
+@pytest.mark.parametrize('thread_count', [1, 3])
+def test_index_totals_add_up_every_chunk_and_retry(thread_count):
+    es = FakeElasticsearch({'c': [429], 'e': [400]})
+    indexer = make_indexer(es, bulk_chunk_size=2, bulk_thread_count=thread_count)
+    totals = indexer.index(actions('a', 'b', 'c', 'd', 'e'))
+    
+    assert sorted(es.requests) == [['a', 'b'], ['c'], ['c', 'd'], ['e']]
+    assert counts(totals, 'success', 'failed', 'rejected', 'retries') == (4, 1, 1, 1)
+    assert len(totals['chunks']) == 3
+    assert [error['status'] for error in totals['errors']] == [400]
@@ -0,0 +1,227 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from salesforce_checkpoint import KeysetFrontier, keyset_clause
+from salesforce_eventlog_ingester import SalesforceEventLogFileIngester
+
+def eventlog_file(log_file_id, day, created_day=None, length=100, sequence=1):
+    return {
+        'Id': log_file_id, 'EventType': 'API', 'LogFile': f'/services/data/v58.0/sobjects/EventLogFile/{log_file_id}/LogFile',
+        'LogDate': f'2026-10-{day:02d}T00:00:00.000+0000', 'CreatedDate': f'2026-10-{created_day or day + 1:02d}T03:00:00.000+0000',
+        'LogFileLength': float(length), 'Sequence': float(sequence)
+    }
+
+class FakeEventLogQueries:
+    """Stands in for _query_eventlog_files, answering discovery, late-file and retry queries from lists"""
+    def __init__(self, files=(), late=(), existing=()):
+        self.files = list(files)
+        self.late = list(late)
+        self.existing = {eventlog_file['Id']: eventlog_file for eventlog_file in existing}
+        self.queries = []
+
+    def __call__(self, where_clause, order_clause, limit=None):
+        self.queries.append(where_clause)
+        if where_clause.startswith('Id IN'):
+            return [eventlog_file for log_file_id, eventlog_file in sorted(self.existing.items()) if f"'{log_file_id}'" in where_clause]
+        return self.late if order_clause.startswith('CreatedDate') else self.files
+
+def make_ingester(checkpoint_store, **config):
+    config = {'client_id': 'client', 'username': 'user@example.com', 'private_key': 'unused', **config}
+    ingester = SalesforceEventLogFileIngester(config)
+    ingester.checkpoint_store = checkpoint_store
+    ingester.load_checkpoint()
+    return ingester
+
+def track(ingester, *eventlog_files):
+    for eventlog_file in eventlog_files:
+        ingester.log_date_frontier.track(eventlog_file['LogDate'], eventlog_file['Id'])
+
+@pytest.fixture
+def ingester(checkpoint_store):
+    return make_ingester(checkpoint_store)
+
+def test_frontier_moves_only_over_a_settled_prefix():
+    frontier = KeysetFrontier()
+    for log_file_id, key in (('a', 1), ('b', 2), ('c', 3)):
+        frontier.track(key, log_file_id)
+    
+    assert not frontier.settle('b')
+    assert frontier.position is None
+    assert frontier.settle('a')
+    assert frontier.position == (2, 'b')
+    assert not frontier.settle('unknown')
+    assert frontier.settle('c')
+    assert frontier.position == (3, 'c')
+
+def test_frontier_reset_forgets_files_still_in_flight():
+    frontier = KeysetFrontier((0, 'start'))
+    frontier.track(1, 'a')
+    frontier.track(2, 'b')
+    frontier.settle('b')
+    frontier.reset()
+    
+    assert not frontier.settle('a')
+    assert frontier.position == (0, 'start')
+
+def test_keyset_clauses():
+    assert keyset_clause('LogDate', '2026-10-01T00:00:00.000+0000', 'a') == \
+        "(LogDate > 2026-10-01T00:00:00.000Z OR (LogDate = 2026-10-01T00:00:00.000Z AND Id > 'a'))"
+    assert keyset_clause('LogDate', '2026-10-01T00:00:00.000+0000', 'a', after=False) == \
+        "(LogDate < 2026-10-01T00:00:00.000Z OR (LogDate = 2026-10-01T00:00:00.000Z AND Id <= 'a'))"
+
+def test_failed_file_goes_on_the_retry_list_and_the_keyset_moves_past_it(ingester, checkpoint_store):
+    a, b, c = eventlog_file('a', 1), eventlog_file('b', 2), eventlog_file('c', 3)
+    track(ingester, a, b, c)
+    
+    ingester.mark_file_processed(c)
+    assert ingester.checkpoint['high_water'] is None
+    ingester.mark_file_failed(b, 'bulk request failed')
+    ingester.mark_file_processed(a)
+    
+    state = checkpoint_store.checkpoints['eventlogfile']
+    assert (state['high_water'], state['high_water_id']) == (c['LogDate'], 'c')
+    assert state['retry'] == {'b': {'LogDate': b['LogDate'], 'attempts': 1}}
+
+def test_retry_list_survives_a_restart_and_empties_once_the_file_is_ingested(ingester, checkpoint_store):
+    a, b = eventlog_file('a', 1), eventlog_file('b', 2)
+    track(ingester, a, b)
+    ingester.mark_file_failed(a, 'download failed')
+    ingester.mark_file_processed(b)
+    
+    restarted = make_ingester(checkpoint_store)
+    restarted._query_eventlog_files = queries = FakeEventLogQueries(existing=[a, b])
+    assert restarted.get_resume_point() == (datetime(2026, 10, 2, tzinfo=timezone.utc), 'b')
+    assert restarted.fetch_retry_eventlog_files() == [a]
+    assert queries.queries == ["Id IN ('a')"]
+    
+    restarted.mark_file_processed(a)
+    assert checkpoint_store.checkpoints['eventlogfile']['retry'] == {}
+
+def test_retries_stop_after_max_file_attempts(checkpoint_store):
+    ingester = make_ingester(checkpoint_store, max_file_attempts=2)
+    a = eventlog_file('a', 1)
+    track(ingester, a)
+    
+    ingester.mark_file_failed(a, 'first')
+    assert ingester.checkpoint['retry']['a']['attempts'] == 1
+    ingester.mark_file_failed(a, 'second')
+    assert ingester.checkpoint['retry'] == {}
+
+def test_files_salesforce_no_longer_returns_leave_the_retry_list(ingester, checkpoint_store):
+    a = eventlog_file('a', 1)
+    track(ingester, a)
+    ingester.mark_file_failed(a, 'download failed')
+    ingester._query_eventlog_files = FakeEventLogQueries()
+    
+    assert ingester.fetch_retry_eventlog_files() == []
+    assert checkpoint_store.checkpoints['eventlogfile']['retry'] == {}
+
+def test_retry_files_are_not_skipped_even_if_the_index_has_them(ingester):
+    a = eventlog_file('a', 1)
+    track(ingester, a)
+    ingester.mark_file_failed(a, 'indexing stopped part way')
+    # As if the warm step had found some of the file's documents
+    ingester.processed_files.add('a', a['LogFileLength'], a['Sequence'], a['LogDate'])
+    ingester._query_eventlog_files = FakeEventLogQueries(existing=[a])
+    
+    assert next(ingester.iter_eventlog_file_waves()) == [a]
+    assert ingester.skip_ingested_files([a]) == [a]
+
+def test_legacy_timestamp_checkpoint_restarts_at_the_start_of_the_lookback_window(checkpoint_store):
+    a = eventlog_file('a', 1)
+    checkpoint_store.checkpoints['eventlogfile'] = {
+        'high_water': '2026-10-02T00:00:00.000+0000',
+        'processed': {'a': {'LogDate': a['LogDate'], 'LogFileLength': 100, 'Sequence': 1}}
+    }
+    ingester = make_ingester(checkpoint_store, checkpoint_lookback_hours=24)
+    
+    assert ingester.checkpoint == {
+        'high_water': '2026-10-01T00:00:00.000Z', 'high_water_id': '',
+        'created_high_water': '2026-10-01T00:00:00.000Z', 'created_high_water_id': '', 'retry': {}
+    }
+    assert ingester.get_resume_point() == (datetime(2026, 10, 1, tzinfo=timezone.utc), '')
+    # Files the old checkpoint listed are skipped; a republished version is not
+    republished = eventlog_file('a', 1, length=200)
+    assert ingester.skip_ingested_files([a, republished, eventlog_file('b', 1)]) == [republished, eventlog_file('b', 1)]
+
+def test_late_files_skip_ingested_and_retried_ones_and_move_the_created_keyset(ingester):
+    ingested, retried, late = eventlog_file('x', 1, created_day=5), eventlog_file('y', 1, created_day=6), eventlog_file('z', 2, created_day=7)
+    ingester.processed_files.add('x', ingested['LogFileLength'], ingested['Sequence'], ingested['LogDate'])
+    track(ingester, retried)
+    ingester.mark_file_failed(retried, 'download failed')
+    ingester._query_eventlog_files = queries = FakeEventLogQueries(late=[ingested, retried, late])
+    
+    position = ('2026-10-03T00:00:00.000+0000', 'w')
+    assert list(ingester._iter_late_eventlog_files(position, batch_size=100, max_waves=1)) == [[late]]
+    assert "LogDate < 2026-10-03T00:00:00.000Z OR (LogDate = 2026-10-03T00:00:00.000Z AND Id <= 'w')" in queries.queries[0]
+    assert ingester.created_frontier.position == (retried['CreatedDate'], 'y')
+    
+    ingester.mark_file_processed(late)
+    assert ingester.created_frontier.position == (late['CreatedDate'], 'z')
+    assert 'y' in ingester.checkpoint['retry']
+
+def test_processed_files_behind_both_keysets_are_pruned(ingester):
+    old, late_candidate, recent = eventlog_file('a', 1, created_day=2), eventlog_file('b', 2, created_day=9), eventlog_file('c', 8)
+    track(ingester, old, late_candidate, recent)
+    ingester.created_frontier = KeysetFrontier(('2026-10-05T00:00:00.000+0000', ''))
+    for eventlog_file_record in (old, late_candidate, recent):
+        ingester.mark_file_processed(eventlog_file_record)
+    ingester.log_date_frontier = KeysetFrontier((late_candidate['LogDate'], 'b'))
+    
+    ingester.prune_processed_files()
+    
+    # 'b' was created after the CreatedDate keyset, so the late-file query can still return it
+    assert sorted(ingester.processed_files.files) == ['b', 'c']
+
+def test_processed_files_without_a_checkpoint_are_pruned_by_age():
+    ingester = make_ingester(None, dedup_lookback_hours=48)
+    now = datetime.now(timezone.utc)
+    ingester.processed_files.add('old', 1, 1, (now - timedelta(hours=72)).isoformat())
+    ingester.processed_files.add('new', 1, 1, (now - timedelta(hours=1)).isoformat())
+    
+    ingester.prune_processed_files()
+    assert list(ingester.processed_files.files) == ['new']
+
+def test_checkpoint_is_saved_without_holding_the_checkpoint_lock(ingester, checkpoint_store):
+    held = []
+    save = checkpoint_store.save
+    checkpoint_store.save = lambda name, state: (held.append(ingester.checkpoint_lock.locked()), save(name, state))
+    a, b = eventlog_file('a', 1), eventlog_file('b', 2)
+    track(ingester, a, b)
+    
+    ingester.mark_file_processed(a)
+    ingester.mark_file_failed(b, 'download failed')
+    
+    assert held == [False, False]
+
+def test_an_older_snapshot_never_replaces_a_newer_one(ingester, checkpoint_store):
+    a, b = eventlog_file('a', 1), eventlog_file('b', 2)
+    track(ingester, a, b)
+    with ingester.checkpoint_lock:
+        ingester.log_date_frontier.settle('a')
+        older = ingester._checkpoint_snapshot()
+        ingester.log_date_frontier.settle('b')
+        newer = ingester._checkpoint_snapshot()
+    
+    ingester._save_checkpoint(newer)
+    ingester._save_checkpoint(older)
+    assert checkpoint_store.checkpoints['eventlogfile']['high_water_id'] == 'b'
+
+def test_warm_step_only_trusts_files_behind_the_keyset_and_off_the_retry_list(ingester):
+    def bucket(log_file_id, day):
+        log_date = datetime(2026, 10, day, tzinfo=timezone.utc)
+        return {'key': {'file': f'{log_file_id}_API'}, 'length': {'value': 100.0}, 'sequence': {'value': 1.0},
+                'log_date': {'value': log_date.timestamp() * 1000}}
+    
+    class FakeElasticsearch:
+        def search(self, index, body):
+            return {'aggregations': {'files': {'buckets': [bucket('a', 1), bucket('b', 2), bucket('c', 2), bucket('d', 3)]}}}
+    
+    ingester.es = FakeElasticsearch()
+    ingester.log_date_frontier = KeysetFrontier(('2026-10-02T00:00:00.000+0000', 'b'))
+    ingester.checkpoint['retry'] = {'a': {'LogDate': '2026-10-01T00:00:00.000+0000', 'attempts': 1}}
+    ingester.warm_processed_files()
+    
+    # 'a' is on the retry list; 'c' and 'd' are after the keyset and may have been cut short
+    assert sorted(ingester.processed_files.files) == ['b']
@@ -0,0 +1,43 @@
+import pytest
+
+from salesforcepump import SalesforceLoginHistoryIngester
+
+class FakeResponse:
+    def __init__(self, body=None):
+        self.body = body or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+class FakeSession:
+    """Bulk API 2.0 endpoints of a query job that never finishes"""
+    def __init__(self):
+        self.patches = []
+
+    def get(self, url, headers=None):
+        return FakeResponse({'id': url.rsplit('/', 1)[-1], 'state': 'InProgress'})
+
+    def patch(self, url, headers=None, json=None):
+        self.patches.append((url, json))
+        return FakeResponse({'state': json['state']})
+
+class FakeSalesforce:
+    session_id = 'session'
+    base_url = 'https://example.my.salesforce.com/services/data/v58.0/'
+
+    def __init__(self):
+        self.session = FakeSession()
+
+def test_bulk_query_job_is_aborted_when_it_times_out():
+    config = {'client_id': 'client', 'username': 'user@example.com', 'private_key': 'unused',
+              'bulk2_timeout_minutes': 0, 'bulk2_poll_seconds': 0}
+    ingester = SalesforceLoginHistoryIngester(config)
+    ingester.sf = FakeSalesforce()
+    
+    with pytest.raises(Exception, match='still InProgress'):
+        ingester.wait_for_bulk_query_job('750job')
+    
+    assert ingester.sf.session.patches == [(f'{FakeSalesforce.base_url}jobs/query/750job', {'state': 'Aborted'})]
@@ -0,0 +1,159 @@
+import re
+
+import pytest
+
+from salesforce_checkpoint import parse_salesforce_datetime
+from salesforcepump import SalesforceLoginHistoryIngester
+
+class FakeSalesforce:
+    """Answers the LoginHistory queries of the ingester from a list of records, the way SOQL would"""
+    session_id = 'session'
+    SINCE = re.compile(r"LoginTime >= (\S+?)(?: AND Id NOT IN \(([^)]*)\))?\s*$")
+    AFTER = re.compile(r"LoginTime > (\S+) OR \(LoginTime = \1 AND Id > '([^']*)'\)\s*$")
+
+    def __init__(self, records):
+        self.records = records
+        self.queries = []
+
+    def query_all(self, query):
+        self.queries.append(query)
+        where = re.search(r"WHERE (.*?)\s+ORDER BY", query, re.S).group(1).strip()
+        limit = int(re.search(r"LIMIT (\d+)", query).group(1))
+        
+        since = self.SINCE.match(where)
+        if since:
+            at = parse_salesforce_datetime(since.group(1))
+            excluded = set(re.findall(r"'([^']*)'", since.group(2) or ''))
+            matches = lambda time, record_id: time >= at and record_id not in excluded
+        else:
+            after = self.AFTER.match(where)
+            at, after_id = parse_salesforce_datetime(after.group(1)), after.group(2)
+            matches = lambda time, record_id: time > at or (time == at and record_id > after_id)
+        
+        found = sorted((record for record in self.records if matches(parse_salesforce_datetime(record['LoginTime']), record['Id'])),
+                       key=lambda record: (parse_salesforce_datetime(record['LoginTime']), record['Id']))
+        return {'records': found[:limit]}
+
+def login(record_id, second):
+    return {'Id': record_id, 'LoginTime': f'2026-10-01T10:00:{second:02d}.000+0000'}
+
+@pytest.fixture
+def ingester(checkpoint_store):
+    config = {'client_id': 'client', 'username': 'user@example.com', 'private_key': 'unused',
+              'es_index': 'loginhistory', 'batch_size': 2}
+    ingester = SalesforceLoginHistoryIngester(config)
+    # Resume from just before the test records rather than asking Elasticsearch
+    checkpoint_store.checkpoints['loginhistory'] = {'high_water': login(None, 0)['LoginTime'], 'ids_at_high_water': []}
+    ingester.checkpoint_store = checkpoint_store
+    ingester.load_checkpoint()
+    return ingester
+
+def ids(records):
+    return [record['Id'] for record in records]
+
+def test_high_water_keeps_every_id_tied_at_it(ingester):
+    ingester.advance_checkpoint([login('a', 1), login('c', 2), login('b', 2)])
+    
+    assert ingester.checkpoint == {'high_water': '2026-10-01T10:00:02.000+0000', 'ids_at_high_water': ['b', 'c']}
+    assert ingester.checkpoint_store.saves[-1] == ('loginhistory', ingester.checkpoint)
+
+def test_later_batch_at_the_same_time_adds_to_the_ties(ingester):
+    ingester.advance_checkpoint([login('a', 2)])
+    ingester.advance_checkpoint([login('b', 1), login('c', 2)])
+    
+    assert ingester.checkpoint['ids_at_high_water'] == ['a', 'c']
+
+def test_later_time_replaces_the_ties(ingester):
+    ingester.advance_checkpoint([login('a', 2), login('b', 2)])
+    ingester.advance_checkpoint([login('c', 3)])
+    
+    assert ingester.checkpoint == {'high_water': '2026-10-01T10:00:03.000+0000', 'ids_at_high_water': ['c']}
+
+def test_resume_query_leaves_out_the_ids_already_at_the_high_water_mark(ingester):
+    ingester.advance_checkpoint([login('a', 2), login('b', 2)])
+    last_sync, seen_ids = ingester.get_resume_point()
+    
+    assert last_sync == parse_salesforce_datetime('2026-10-01T10:00:02.000+0000')
+    assert ingester._since_clause(last_sync, seen_ids) == "LoginTime >= 2026-10-01T10:00:02.000Z AND Id NOT IN ('a', 'b')"
+
+def test_pages_split_inside_a_tie_neither_lose_nor_repeat_records(ingester):
+    records = [login('a', 1), login('b', 2), login('c', 2), login('d', 2), login('e', 3)]
+    ingester.sf = FakeSalesforce(records)
+    
+    pages = [ids(page) for page in ingester.iter_rest_pages()]
+    
+    assert pages == [['a', 'b'], ['c', 'd'], ['e']]
+    assert "LoginTime > 2026-10-01T10:00:02.000Z OR (LoginTime = 2026-10-01T10:00:02.000Z AND Id > 'b')" in ingester.sf.queries[1]
+
+def test_restart_inside_a_tie_picks_up_the_rest_of_it(ingester):
+    records = [login('a', 1), login('b', 2), login('c', 2), login('d', 2), login('e', 3)]
+    ingester.sf = FakeSalesforce(records)
+    first_page = next(ingester.iter_rest_pages())
+    ingester.advance_checkpoint(first_page)
+    
+    restarted = SalesforceLoginHistoryIngester(ingester.config)
+    restarted.checkpoint_store = ingester.checkpoint_store
+    restarted.load_checkpoint()
+    restarted.sf = ingester.sf
+    
+    assert [ids(page) for page in restarted.iter_rest_pages()] == [['c', 'd'], ['e']]
+
+def test_a_new_record_at_the_high_water_time_is_still_fetched(ingester):
+    ingester.sf = FakeSalesforce([login('a', 1), login('b', 2)])
+    for page in ingester.iter_rest_pages():
+        ingester.advance_checkpoint(page)
+    
+    # A login committed late with the same LoginTime as the newest ingested one
+    ingester.sf.records.append(login('c', 2))
+    
+    assert [ids(page) for page in ingester.iter_rest_pages()] == [['c']]
+
+class FakeIndexer:
+    """Stands in for enrichment and bulk indexing, ingesting all of each page unless told otherwise"""
+    def __init__(self, ingester, ingested_counts=()):
+        self.pages = []
+        self.ingested_counts = list(ingested_counts)
+        ingester.enrich_records_with_user_details = lambda records: records
+        ingester.bulk_ingest_to_elasticsearch = self.ingest
+
+    def ingest(self, records):
+        self.pages.append(ids(records))
+        return self.ingested_counts.pop(0) if self.ingested_counts else len(records)
+
+def test_rest_extract_ingests_pages_split_inside_a_tie_once_and_checkpoints_the_tie(ingester):
+    ingester.sf = FakeSalesforce([login('a', 1), login('b', 2), login('c', 2), login('d', 2), login('e', 3), login('f', 3)])
+    indexer = FakeIndexer(ingester)
+    
+    assert ingester.extract_with_rest_api() == (6, 6)
+    assert indexer.pages == [['a', 'b'], ['c', 'd'], ['e', 'f']]
+    assert ingester.checkpoint == {'high_water': '2026-10-01T10:00:03.000+0000', 'ids_at_high_water': ['e', 'f']}
+
+def test_rest_extract_stops_after_a_short_page(ingester):
+    ingester.sf = FakeSalesforce([login('a', 1), login('b', 2), login('c', 2)])
+    indexer = FakeIndexer(ingester)
+    
+    assert ingester.extract_with_rest_api() == (3, 3)
+    assert indexer.pages == [['a', 'b'], ['c']]
+    # The short page ends paging without another query
+    assert len(ingester.sf.queries) == 2
+
+def test_rest_extract_stops_at_max_pages_per_cycle(ingester):
+    ingester.config['max_pages_per_cycle'] = 1
+    ingester.sf = FakeSalesforce([login('a', 1), login('b', 2), login('c', 3)])
+    indexer = FakeIndexer(ingester)
+    
+    assert ingester.extract_with_rest_api() == (2, 2)
+    assert indexer.pages == [['a', 'b']]
+    assert len(ingester.sf.queries) == 1
+
+def test_rest_extract_keeps_the_checkpoint_before_a_partly_ingested_page(ingester):
+    ingester.sf = FakeSalesforce([login('a', 1), login('b', 2), login('c', 2), login('d', 2), login('e', 3)])
+    FakeIndexer(ingester, ingested_counts=[2, 1])
+    
+    assert ingester.extract_with_rest_api() == (4, 3)
+    assert ingester.checkpoint == {'high_water': '2026-10-01T10:00:02.000+0000', 'ids_at_high_water': ['b']}
+    
+    # The next cycle resumes inside the tie, from the first record that was not checkpointed
+    indexer = FakeIndexer(ingester)
+    assert ingester.extract_with_rest_api() == (3, 3)
+    assert indexer.pages == [['c', 'd'], ['e']]
@@ -0,0 +1,171 @@
+import threading
+
+import pytest
+
+from salesforce_pipeline import Pipeline, StageQueue
+
+class WaitSignallingCondition(threading.Condition):
+    """Condition that counts the threads that have started waiting on it"""
+    def __init__(self):
+        super().__init__()
+        self.waits = threading.Semaphore(0)
+
+    def wait(self, timeout=None):
+        # Released with the lock still held, so once it is seen the waiter is registered
+        self.waits.release()
+        return super().wait(timeout)
+
+def watched(queue):
+    queue.condition = WaitSignallingCondition()
+    return queue
+
+def wait_until_blocked(queue):
+    assert queue.condition.waits.acquire(timeout=5), f"nothing blocked on queue {queue.name}"
+
+def in_thread(func, *args):
+    """Start func(*args) in a thread; the returned list receives its result"""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func(*args)), daemon=True)
+    thread.start()
+    return thread, result
+
+def finish(thread):
+    thread.join(5)
+    assert not thread.is_alive()
+
+@pytest.mark.parametrize('bounds, first, second', [
+    ({'max_items': 1}, (1, 0), (1, 0)),
+    ({'max_records': 10}, (6, 0), (5, 0)),
+    ({'max_bytes': 100}, (1, 60), (1, 50)),
+])
+def test_put_blocks_while_the_queue_is_full(bounds, first, second):
+    queue = watched(StageQueue('test', **bounds))
+    assert queue.put('first', *first)
+    
+    thread, result = in_thread(queue.put, 'second', *second)
+    wait_until_blocked(queue)
+    assert result == []
+    
+    assert queue.get() == 'first'
+    finish(thread)
+    assert result == [True]
+    assert queue.get() == 'second'
+
+def test_an_item_larger_than_the_queue_is_let_through_when_it_is_empty():
+    queue = StageQueue('test', max_records=10, max_bytes=100)
+    assert queue.put('huge', records=50, nbytes=1000)
+    
+    snapshot = queue.snapshot()
+    assert (snapshot['depth_records'], snapshot['depth_bytes']) == (50, 1000)
+
+def test_close_lets_consumers_drain_then_returns_none():
+    queue = StageQueue('test')
+    queue.put('a')
+    queue.put('b')
+    queue.close()
+    
+    assert [queue.get(), queue.get(), queue.get()] == ['a', 'b', None]
+
+def test_close_wakes_a_waiting_consumer():
+    queue = watched(StageQueue('test'))
+    thread, result = in_thread(queue.get)
+    wait_until_blocked(queue)
+    
+    queue.close()
+    finish(thread)
+    assert result == [None]
+
+def test_abort_releases_blocked_producers_and_consumers():
+    full = watched(StageQueue('full', max_items=1))
+    full.put('a')
+    producer, put_result = in_thread(full.put, 'b')
+    empty = watched(StageQueue('empty'))
+    consumer, get_result = in_thread(empty.get)
+    wait_until_blocked(full)
+    wait_until_blocked(empty)
+    
+    full.abort()
+    empty.abort()
+    finish(producer)
+    finish(consumer)
+    
+    assert put_result == [False]
+    assert get_result == [None]
+    assert full.put('c') is False
+    assert full.get() is None
+
+def test_abort_discards_every_queued_item_even_if_one_fails():
+    discarded = []
+    
+    def discard(item):
+        if item == 'b':
+            raise OSError('already gone')
+        discarded.append(item)
+    
+    queue = StageQueue('test', discard=discard)
+    for item in 'abc':
+        queue.put(item, records=2, nbytes=10)
+    queue.abort()
+    
+    assert discarded == ['a', 'c']
+    snapshot = queue.snapshot()
+    assert (snapshot['depth_items'], snapshot['depth_records'], snapshot['depth_bytes']) == (0, 0, 0)
+
+def test_pipeline_runs_every_item_through_every_stage():
+    pipeline = Pipeline('test')
+    numbers = pipeline.queue('numbers', max_items=2)
+    squares = pipeline.queue('squares', max_items=2)
+    results = []
+    lock = threading.Lock()
+    
+    def source(emit):
+        for n in range(20):
+            emit(n)
+    
+    def square(n, emit):
+        emit(n * n, nbytes=8)
+    
+    def collect(n, emit):
+        with lock:
+            results.append(n)
+    
+    pipeline.stage('source', source, outbox=numbers)
+    pipeline.stage('square', square, workers=3, inbox=numbers, outbox=squares)
+    pipeline.stage('collect', collect, inbox=squares)
+    pipeline.run()
+    
+    assert sorted(results) == [n * n for n in range(20)]
+    report = pipeline.report()
+    assert report['stages']['square']['items'] == 20
+    assert report['stages']['square']['bytes_out'] == 160
+    assert report['queues']['numbers']['peak_items'] <= 2
+
+def test_stage_failure_cancels_the_pipeline_and_is_raised():
+    pipeline = Pipeline('test')
+    discarded = []
+    items = pipeline.queue('items', max_items=3, discard=discarded.append)
+    emitted = []
+    queue_full = threading.Event()
+    
+    def source(emit):
+        for n in range(1000):
+            if not emit(n):
+                return
+            emitted.append(n)
+            # The failing stage holds item 0, so items 1 to 3 fill the queue
+            if n == 3:
+                queue_full.set()
+    
+    def fail(n, emit):
+        assert queue_full.wait(5)
+        raise ValueError(f'bad item {n}')
+    
+    pipeline.stage('source', source, outbox=items)
+    pipeline.stage('fail', fail, inbox=items)
+    
+    with pytest.raises(ValueError, match='bad item 0'):
+        pipeline.run()
+    
+    assert pipeline.cancelled
+    assert emitted == [0, 1, 2, 3]
+    assert discarded == [1, 2, 3]
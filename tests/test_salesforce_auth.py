@@ -0,0 +1,66 @@
+import pytest
+
+from salesforce_auth import SalesforceClient
+
+class FakeTokenManager:
+    def __init__(self):
+        self.tokens = iter(['token-1', 'token-2'])
+        self.token = None
+        self.invalidated = []
+
+    def get_token(self):
+        if self.token is None:
+            self.token = {'access_token': next(self.tokens), 'instance_url': 'https://example.my.salesforce.com'}
+        return self.token
+
+    def invalidate(self, access_token):
+        self.invalidated.append(access_token)
+        if self.token and self.token['access_token'] == access_token:
+            self.token = None
+
+class ExpiredSession(Exception):
+    status = 401
+
+class Client(SalesforceClient):
+    metrics_ingester = 'test'
+
+    def __init__(self):
+        self.init_salesforce_client({'client_id': 'client', 'username': 'user@example.com'})
+        self.token_manager = FakeTokenManager()
+
+def test_connection_is_reused_while_the_token_is_unchanged():
+    client = Client()
+    assert client.connect_to_salesforce()
+    sf = client.sf
+    assert client.connect_to_salesforce()
+    
+    assert client.sf is sf
+    assert sf.session_id == 'token-1'
+
+def test_rejected_token_is_replaced_and_the_call_retried_once():
+    client = Client()
+    client.connect_to_salesforce()
+    sessions = []
+    
+    def call():
+        sessions.append(client.sf.session_id)
+        if len(sessions) == 1:
+            raise ExpiredSession('INVALID_SESSION_ID')
+        return 'ok'
+    
+    assert client.call_salesforce(call) == 'ok'
+    assert sessions == ['token-1', 'token-2']
+    assert client.token_manager.invalidated == ['token-1']
+
+def test_other_errors_are_not_retried():
+    client = Client()
+    client.connect_to_salesforce()
+    calls = []
+    
+    def call():
+        calls.append(1)
+        raise ValueError('MALFORMED_QUERY')
+    
+    with pytest.raises(ValueError):
+        client.call_salesforce(call)
+    assert len(calls) == 1
@@ -0,0 +1,47 @@
+import pytest
+
+from salesforce_metrics import MetricsRegistry
+
+prometheus_client = pytest.importorskip('prometheus_client')
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    registry.files = registry.counter('test_files_total', 'Files', ('event_type',))
+    registry.lag = registry.gauge('test_last_event_seconds', 'Newest event', ('ingester',))
+    registry.seconds = registry.histogram('test_seconds', 'Durations', buckets=(1.0, 5.0))
+    return registry
+
+def sample(collector_registry, name, **labels):
+    return collector_registry.get_sample_value(name, labels)
+
+def test_nothing_is_recorded_until_enabled(registry):
+    registry.files.inc(event_type='API')
+    with registry.seconds.time():
+        pass
+    collector_registry = registry.bind(prometheus_client)
+    assert sample(collector_registry, 'test_files_total', event_type='API') is None
+    assert sample(collector_registry, 'test_seconds_count') == 0
+
+def test_enabled_metrics_are_exposed(registry):
+    collector_registry = registry.bind(prometheus_client)
+    registry.enabled = True
+    registry.files.inc(3, event_type='Login "SSO"\n')
+    registry.seconds.observe(0.5)
+    registry.seconds.observe(2.0)
+    registry.seconds.observe(60.0)
+    assert sample(collector_registry, 'test_files_total', event_type='Login "SSO"\n') == 3
+    assert sample(collector_registry, 'test_seconds_bucket', le='1.0') == 1
+    assert sample(collector_registry, 'test_seconds_bucket', le='5.0') == 2
+    assert sample(collector_registry, 'test_seconds_bucket', le='+Inf') == 3
+    assert sample(collector_registry, 'test_seconds_sum') == 62.5
+    assert b'event_type="Login \\"SSO\\"\\n"' in prometheus_client.generate_latest(collector_registry)
+
+def test_set_max_never_lowers_the_gauge(registry):
+    collector_registry = registry.bind(prometheus_client)
+    registry.enabled = True
+    registry.lag.set_max(20, ingester='eventlog')
+    registry.lag.set_max(10, ingester='eventlog')
+    registry.lag.set_max(5, ingester='loginhistory')
+    assert sample(collector_registry, 'test_last_event_seconds', ingester='eventlog') == 20
+    assert sample(collector_registry, 'test_last_event_seconds', ingester='loginhistory') == 5